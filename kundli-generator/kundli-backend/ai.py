@@ -0,0 +1,236 @@
+import logging
+import queue
+import threading
+
+import numpy as np
+
+from aspects import ASPECT_RULES, OUTER_PLANET_ASPECTS, aspect_label, aspect_table
+from chart_core import SIGNS
+from inference import InferenceProvider
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'tiiuae/falcon-rw-1b'
+UNAVAILABLE_MESSAGE = 'AI service is currently unavailable. Please check your API key and internet connection.'
+# Generation settings for the text-generation and chat routes
+TEXT_PARAMS = {'max_new_tokens': 150, 'temperature': 0.3, 'top_p': 0.9, 'repetition_penalty': 1.1}
+CHAT_PARAMS = {'max_tokens': 330, 'temperature': 0.2, 'top_p': 0.85}
+
+_PROMPT_ASPECTS = {**ASPECT_RULES, **OUTER_PLANET_ASPECTS}
+
+
+def build_prompt(data: dict) -> str:
+    """Chat-Jyotish prompt from an /api/ai-analysis request body"""
+    question = data.get('question', '')
+    kundli_data = data.get('kundli_data', {})
+    user_name = data.get('user_name', 'friend')
+
+    # Build readable planet placements with houses
+    sign_to_idx = {s: i for i, s in enumerate(SIGNS)}
+    asc_idx = sign_to_idx.get(kundli_data.get('asc_sign', 'Aries'), 0)
+    placement_lines = []
+    aspects_data = []
+    for sign, plist in kundli_data.get('sign_planets', {}).items():
+        house_num = ((sign_to_idx.get(sign, 0) - asc_idx) % 12) + 1
+        for p in plist:
+            status = ', '.join(p.get('status', [])) or 'normal'
+            # Fix Venus in Pisces - it's always exalted
+            if p['name'] == 'Ve' and sign == 'Pisces':
+                status = 'exalted'
+            placement_lines.append(f"{p['name']} – {sign} sign, house {house_num}, {p['deg']}°, status: {status}")
+    casters = [(p['name'], (sign_to_idx.get(sign, 0) - asc_idx) % 12)
+               for sign, plist in kundli_data.get('sign_planets', {}).items() for p in plist]
+    table = aspect_table([name for name, _ in casters], _PROMPT_ASPECTS)
+    for (name, house), offsets in zip(casters, table):
+        for offset in np.flatnonzero(offsets):
+            aspects_data.append(f"{name} {aspect_label(offset)} aspect to House {(house + offset) % 12 + 1}")
+    placements_text = "\n".join(placement_lines)
+    aspects_text = "\n".join(aspects_data) if aspects_data else "None"
+
+    return f""" 
+You are Chat-Jyotish — a sharp, compassionate Vedic astrologer.
+
+Your role is to guide {user_name} using their birth chart with warmth, clarity, and spiritual insight. Speak directly to them using “you” and “your.” Avoid technical jargon unless it's meaningful. Never refer to yourself or the user in the third person.
+
+Your answer must:
+• Stay focused on the chart and the user’s question.
+• Use the provided planetary placements and aspects meaningfully.
+• Highlight the most important 2–3 insights.
+• Be emotionally attuned but concise — no fluff or vague lines.
+• Limit your answer to 180 words (about 3–5 short, clear paragraphs).
+• Do **not** repeat the question or suggest follow-ups.
+
+KUNDLI SNAPSHOT
+---------------
+Ascendant (Lagna): {kundli_data.get('asc_sign')}
+Chart Type        : {kundli_data.get('chart_type')}
+
+Planet Placements:
+{placements_text}
+
+Planetary Aspects:
+{aspects_text}
+
+QUESTION
+--------
+{question}
+
+Give an insightful, direct Vedic astrology interpretation that speaks to {user_name}'s inner life and outer path.
+"""
+
+
+def clean_response(response_text: str) -> str:
+    """Drop conversation tags and anything after a follow-up turn starts"""
+    cleaned_lines = []
+    for line in response_text.split('\n'):
+        line = line.strip()
+        if line and not line.startswith('[') and not line.startswith('[/') and not line.startswith('USER') and not line.startswith('ASS'):
+            cleaned_lines.append(line)
+        if line.startswith('[/') or line.startswith('[USER') or line.startswith('[ASS'):
+            break
+    return '\n'.join(cleaned_lines)
+
+
+_STOP_MARKERS = ('[/', '[USER', '[ASS')
+_DROP_PREFIXES = ('[', 'USER', 'ASS')
+
+
+class StreamCleaner:
+    """clean_response applied incrementally, so text can be relayed while the model is still generating.
+
+    feed() takes raw chunks and returns the cleaned text that is safe to send so far. A line is held back
+    only until its first few characters show whether it is dropped or is a stop marker; `stopped` turns
+    true as soon as a follow-up turn starts. The concatenated output equals clean_response(full text).
+    """
+
+    def __init__(self):
+        self.stopped = False
+        self._line = ''        # current line while undecided
+        self._mode = None      # None undecided, 'emit' or 'drop'
+        self._held_ws = ''     # trailing whitespace of an emitted line, sent only if more text follows
+        self._emitted = False
+
+    def feed(self, chunk: str) -> str:
+        out = []
+        for k, segment in enumerate(chunk.split('\n')):
+            if self.stopped:
+                break
+            if k:
+                out.append(self._end_line())
+            if segment:
+                out.append(self._extend(segment))
+        return ''.join(out)
+
+    def finish(self) -> str:
+        return '' if self.stopped else self._end_line()
+
+    def _extend(self, text: str) -> str:
+        if self._mode == 'drop':
+            return ''
+        if self._mode == 'emit':
+            text = self._held_ws + text
+            body = text.rstrip()
+            self._held_ws = text[len(body):]
+            return body
+        self._line += text
+        head = self._line.lstrip()
+        if head.startswith(_STOP_MARKERS):
+            self.stopped = True
+        elif head.startswith(_DROP_PREFIXES) and not any(m.startswith(head) for m in _STOP_MARKERS):
+            self._mode = 'drop'
+        elif not any(p.startswith(head) for p in _DROP_PREFIXES + _STOP_MARKERS):
+            self._mode = 'emit'
+            return self._open_line() + self._extend(head)
+        return ''  # could still turn into a tag or marker
+
+    def _end_line(self) -> str:
+        out = ''
+        if self._mode is None:
+            head = self._line.strip()
+            if head.startswith(_STOP_MARKERS):
+                self.stopped = True
+            elif head and not head.startswith(_DROP_PREFIXES):
+                out = self._open_line() + head
+        self._line, self._mode, self._held_ws = '', None, ''
+        return out
+
+    def _open_line(self) -> str:
+        prefix = '\n' if self._emitted else ''
+        self._emitted = True
+        return prefix
+
+
+class TextRelay:
+    """Hands streamed text from the worker thread running the model to the request thread relaying it"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self.closed = threading.Event()  # set by the reader when its client goes away
+        self.complete = False  # set once the model finished or reached a stop marker
+
+    def put(self, text: str):
+        self._queue.put(text)
+
+    def finish(self):
+        self._queue.put(None)
+
+    def __iter__(self):
+        while True:
+            text = self._queue.get()
+            if text is None:
+                return
+            yield text
+
+
+def call_model(prompt: str, provider: InferenceProvider):
+    """Run the prompt through the model; None when it is unavailable"""
+    try:
+        response_text = provider.generate(prompt)
+        return clean_response(response_text) if response_text else response_text
+    except Exception as e:
+        log.warning('AI API exception: %s', e)
+        return None
+
+
+def stream_model(prompt: str, relay: TextRelay, provider: InferenceProvider):
+    """Relay cleaned text to `relay` while the model generates; returns the full cleaned text or None.
+
+    Generation is abandoned as soon as a stop marker appears or the reader closes the relay, which closes
+    the upstream connection instead of paying for tokens that would be thrown away.
+    """
+    cleaner = StreamCleaner()
+    sent = []
+    tokens = None
+    try:
+        tokens = provider.stream(prompt)
+        for token in tokens:
+            text = cleaner.feed(token)
+            if text:
+                sent.append(text)
+                relay.put(text)
+            if cleaner.stopped or relay.closed.is_set():
+                break
+        else:
+            text = cleaner.finish()
+            if text:
+                sent.append(text)
+                relay.put(text)
+        relay.complete = not relay.closed.is_set()
+    except Exception as e:
+        log.warning('AI API exception: %s', e)
+        if not sent:
+            return None
+    finally:
+        if tokens is not None:
+            tokens.close()
+    return ''.join(sent)
+
+
+def answer(prompt: str, provider: InferenceProvider, relay: TextRelay = None):
+    """Model answer to a built prompt, or None; streamed into `relay` when given"""
+    if relay is None:
+        return call_model(prompt, provider)
+    try:
+        return stream_model(prompt, relay, provider)
+    finally:
+        relay.finish()
@@ -1,458 +1,794 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g, stream_with_context
 from flask_cors import CORS
-import swisseph as swe
-import datetime, pytz
-import requests
+import numpy as np
 import os
 from dotenv import load_dotenv
-from huggingface_hub import InferenceClient
+import json
+import logging
+import math
+import sqlite3
+import cProfile
+import io
+import pstats
+import itertools
 import time
+from chart_core import (Chart, chart_objects, chart_size, julian_day_to_utc, parse_ayanamsa,
+                        use_ephemeris_store, utc_julian_days)
+from chart_store import ChartStore
+from dataset_store import DatasetStore, chart_slice
+from cache import LRUCache
+from ephemeris_store import EphemerisStore
+from events import EventIndex, parse_kinds
+from ai import CHAT_PARAMS, DEFAULT_MODEL, TEXT_PARAMS, UNAVAILABLE_MESSAGE, TextRelay, answer, build_prompt
+from inference import CircuitBreaker, InferenceProvider
+from ai_cache import ResponseCache, ResponseStore, response_key
+from jobs import JobQueue, QueueFull, RateLimiter
+from matching import MAX_POINTS, pada_info, profile_padas, score, top_matches
+from yogas import YOGAS, chart_arrays, evaluate, render_with_yogas
+from dasha import DASHA_ORDER, MAX_LEVELS, current_dashas, dasha_periods, moon_longitudes, nakshatra_info
+from ephemeris import ephemeris_series, ndjson, parse_bodies, parse_step, parse_time, sample_count, time_or_now
+from metrics import REGISTRY, end_trace, stage, start_trace
+from rectify import parse_request as parse_rectify_request, sweep
+from transit import overlay, overlay_lines, snapshot, store_overlay
+from panchang import panchang, parse_location
+from varga import parse_division
+from wire import (JSON_MIMETYPE, MIN_COMPRESS_BYTES, chart_records, choose_encoding, compress, encode,
+                  response_format)
 
 # Load environment variables from possible env files in priority order
 base_dir = os.path.dirname(__file__)
 for fname in ('yay.env', '.env', 'env.example'):
     load_dotenv(dotenv_path=os.path.join(base_dir, fname), override=False)
 
-# Simple in-memory cooldown to avoid hitting free-tier rate limits
-AI_COOLDOWN_SECONDS = int(os.getenv('AI_COOLDOWN_SECONDS', '30'))  # default 20s
-_last_ai_call_ts = 0.0
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+log = logging.getLogger('kundli')
+
+# AI requests run on a bounded worker pool; AI_WORKERS is the number of concurrent model calls.
+# Each client gets AI_RATE_BURST questions at once, refilled one per AI_COOLDOWN_SECONDS.
+AI_COOLDOWN_SECONDS = int(os.getenv('AI_COOLDOWN_SECONDS', '30'))
+AI_RATE_BURST = int(os.getenv('AI_RATE_BURST', '2'))
+AI_WORKERS = int(os.getenv('AI_WORKERS', '2'))
+AI_QUEUE_MAX = int(os.getenv('AI_QUEUE_MAX', '50'))
+AI_WAIT_SECONDS = float(os.getenv('AI_WAIT_SECONDS', '120'))
+AI_JOB_TTL = float(os.getenv('AI_JOB_TTL', '600'))
+ai_rate_limiter = RateLimiter(rate=1 / AI_COOLDOWN_SECONDS, burst=AI_RATE_BURST)
+
+# One long-lived client for the model (a Hugging Face id or a TGI server URL). Each call has
+# AI_CALL_TIMEOUT seconds, and after AI_BREAKER_FAILURES consecutive upstream failures requests fail
+# fast for AI_BREAKER_RESET seconds.
+ai_provider = InferenceProvider(
+    os.getenv('HF_MODEL', DEFAULT_MODEL),
+    token=os.getenv('HUGGING_FACE_TOKEN'),
+    text_params=TEXT_PARAMS,
+    chat_params=CHAT_PARAMS,
+    timeout=float(os.getenv('AI_CALL_TIMEOUT', '60')),
+    pool_size=AI_WORKERS,
+    breaker=CircuitBreaker(threshold=int(os.getenv('AI_BREAKER_FAILURES', '5')),
+                           reset_after=float(os.getenv('AI_BREAKER_RESET', '30'))),
+)
+if not ai_provider.available:
+    log.warning("Hugging Face token not found. Set HUGGING_FACE_TOKEN in .env")
+
+# Answers keyed on the normalized prompt, model and generation parameters: an in-memory LRU in front of
+# a SQLite file that survives restarts (AI_CACHE_DB='' keeps the memory tier only)
+AI_CACHE_DB = os.getenv('AI_CACHE_DB', os.path.join(base_dir, 'ai_cache.sqlite'))
+ai_cache = ResponseCache(
+    LRUCache(max_entries=int(os.getenv('AI_CACHE_MAX_ENTRIES', '2000')),
+             max_bytes=int(os.getenv('AI_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))),
+    ResponseStore(AI_CACHE_DB, max_bytes=int(os.getenv('AI_CACHE_DISK_MAX_BYTES', str(256 * 1024 * 1024))))
+    if AI_CACHE_DB else None,
+)
+
+def _run_ai_job(job):
+    prompt, key, relay = job
+    with stage('ai_upstream'):
+        result = answer(prompt, ai_provider, relay)
+    if result and (relay is None or relay.complete):
+        ai_cache.put(key, ai_provider.model, result)
+    return result
+
+ai_jobs = JobQueue(_run_ai_job, workers=AI_WORKERS, max_queue=AI_QUEUE_MAX, result_ttl=AI_JOB_TTL)
+
+# Upper bound on births accepted by /api/kundli/batch
+BATCH_MAX_SIZE = int(os.getenv('KUNDLI_BATCH_MAX_SIZE', '5000'))
+MATCH_MAX_PROFILES = int(os.getenv('MATCH_MAX_PROFILES', '200000'))
+
+# Upper bound on samples streamed by one /api/ephemeris request (50 years daily is ~18k)
+EPHEMERIS_MAX_POINTS = int(os.getenv('EPHEMERIS_MAX_POINTS', '1000000'))
+
+# Computed charts keyed on (UTC Julian day, rounded lat/lon, chart_type, ayanamsa, house system)
+CHART_CACHE_LATLON_DECIMALS = int(os.getenv('CHART_CACHE_LATLON_DECIMALS', '4'))
+chart_cache = LRUCache(
+    max_entries=int(os.getenv('CHART_CACHE_MAX_ENTRIES', '10000')),
+    max_bytes=int(os.getenv('CHART_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    ttl=float(os.getenv('CHART_CACHE_TTL', '0')) or None,
+    sizeof=chart_size,
+)
+
+# Transit snapshots (transit.py), one per TRANSIT_BUCKET_MINUTES bucket and ayanamsa, shared by every overlay in it
+TRANSIT_BUCKET_MINUTES = int(os.getenv('TRANSIT_BUCKET_MINUTES', '60'))
+transit_cache = LRUCache(max_entries=int(os.getenv('TRANSIT_CACHE_MAX_ENTRIES', '64')))
+
+# Sunrise/sunset per (location cell, local date) for /api/panchang, and its limits
+sun_cache = LRUCache(max_entries=int(os.getenv('PANCHANG_SUN_CACHE_ENTRIES', '200000')))
+PANCHANG_MAX_LOCATIONS = int(os.getenv('PANCHANG_MAX_LOCATIONS', '20'))
 
 app = Flask(__name__)
-CORS(app)  # Allow requests from your frontend
-
-def calculate_navamsa(positions: dict) -> dict:
-    """Calculate D9 (Navamsa) chart from D1 positions"""
-    navamsa_positions = {}
-    
-    for planet, degree in positions.items():
-        if planet in ['Ra', 'Ke']:  # Rahu/Ketu don't have navamsa
-            navamsa_positions[planet] = degree
-            continue
-            
-        # Navamsa calculation: divide each sign into 9 parts
-        sign_num = int(degree // 30)
-        degree_in_sign = degree % 30
-        
-        # Each navamsa is 3°20' (3.333... degrees)
-        navamsa_num = int(degree_in_sign // 3.333333)
-        
-        # Calculate new position in navamsa
-        # Each sign is divided into 9 parts, each part corresponds to a sign
-        navamsa_signs = [
-            'Aries', 'Taurus', 'Gemini', 'Cancer', 'Leo', 'Virgo',
-            'Libra', 'Scorpio', 'Sagittarius', 'Capricorn', 'Aquarius', 'Pisces'
-        ]
-        
-        # Fire signs: Aries, Leo, Sagittarius (0, 4, 8)
-        # Earth signs: Taurus, Virgo, Capricorn (1, 5, 9)
-        # Air signs: Gemini, Libra, Aquarius (2, 6, 10)
-        # Water signs: Cancer, Scorpio, Pisces (3, 7, 11)
-        
-        element_start = (sign_num % 4) * 3  # 0, 3, 6, 9
-        navamsa_sign_index = element_start + navamsa_num
-        navamsa_sign_index = navamsa_sign_index % 12
-        
-        # Calculate degree within the navamsa sign
-        navamsa_degree = (degree_in_sign % 3.333333) * 9  # Convert to degree in new sign
-        
-        # Convert to absolute degree
-        navamsa_positions[planet] = navamsa_sign_index * 30 + navamsa_degree
-    
-    return navamsa_positions
+CORS(app, expose_headers=['ETag', 'Retry-After', 'Location', 'Server-Timing'])  # Allow requests from your frontend
+
+# Prometheus metrics served at /metrics. Requests sent with "X-Profile: 1" are run under cProfile when
+# PROFILE_REQUESTS=1; the breakdown is logged and, with PROFILE_DIR set, saved as a .prof file.
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS', '0') == '1'
+PROFILE_DIR = os.getenv('PROFILE_DIR', '')
+http_requests = REGISTRY.counter('kundli_http_requests_total', 'HTTP requests by endpoint and status',
+                                 ['endpoint', 'method', 'status'])
+http_seconds = REGISTRY.histogram('kundli_http_request_seconds', 'Time to produce a response, by endpoint',
+                                  ['endpoint'])
+chart_requests = REGISTRY.counter('kundli_chart_requests_total', 'Charts requested, by endpoint and chart type',
+                                  ['endpoint', 'chart_type'])
+ai_outcomes = REGISTRY.counter('kundli_ai_requests_total', 'AI questions by outcome: cached, queued, shared, '
+                               'rate_limited, queue_full or circuit_open', ['outcome'])
+
+
+def _cache_events():
+    values = {}
+    for name, stats in [('charts', chart_cache.stats()), ('transits', transit_cache.stats()),
+                        ('sunrise', sun_cache.stats()), *(('ai_' + k, v) for k, v in ai_cache.stats().items())]:
+        for event in ('hits', 'misses', 'evictions', 'expirations'):
+            if event in stats:
+                values[(name, event)] = stats[event]
+    return values
+
+
+def _cache_sizes():
+    stats = [('charts', chart_cache.stats()), ('transits', transit_cache.stats()), ('sunrise', sun_cache.stats()),
+             *(('ai_' + k, v) for k, v in ai_cache.stats().items())]
+    return {(name, unit): s[unit] for name, s in stats for unit in ('entries', 'bytes')}
+
+
+def _ai_queue():
+    stats = ai_jobs.stats()
+    return {(k,): stats[k] for k in ('queue_depth', 'running')}
+
+
+def _ai_jobs_done():
+    stats = ai_jobs.stats()
+    return {(k,): stats[k] for k in ('completed', 'failed', 'rejected', 'shared')}
+
+
+REGISTRY.collected('kundli_cache_events_total', 'Cache lookups and removals', _cache_events,
+                   ['cache', 'event'], kind='counter')
+REGISTRY.collected('kundli_cache_size', 'Cache entries and approximate bytes', _cache_sizes, ['cache', 'unit'])
+REGISTRY.collected('kundli_ai_queue', 'AI jobs waiting and running', _ai_queue, ['state'])
+REGISTRY.collected('kundli_ai_jobs_total', 'AI jobs by result', _ai_jobs_done, ['result'], kind='counter')
+REGISTRY.collected('kundli_ai_circuit_open', '1 while the model circuit breaker is open',
+                   lambda: {(): int(ai_provider.breaker.state == 'open')})
+
+
+def _chart_type_label(value) -> str:
+    try:
+        return f'D{parse_division(value)}'
+    except (ValueError, TypeError):
+        return 'invalid'
+
+
+def _count_chart_types(endpoint: str, births: list):
+    for birth in births:
+        birth = birth if isinstance(birth, dict) else {}
+        extra = birth.get('charts') if isinstance(birth.get('charts'), list) else []
+        for chart_type in [birth.get('chart_type', 'regular'), *extra]:
+            chart_requests.inc(endpoint=endpoint, chart_type=_chart_type_label(chart_type))
+
+
+@app.before_request
+def _start_request():
+    g.started = time.perf_counter()
+    g.trace = start_trace()
+    g.profiler = None
+    if PROFILE_REQUESTS and request.headers.get('X-Profile') == '1':
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _compress(resp):
+    """gzip or brotli for buffered responses when the client accepts it; streams are left alone"""
+    if resp.status_code != 200 or resp.is_streamed or resp.direct_passthrough or 'Content-Encoding' in resp.headers:
+        return
+    data = resp.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return
+    resp.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return
+    with stage('compression'):
+        resp.set_data(compress(data, encoding))
+    resp.headers['Content-Encoding'] = encoding
+    etag, weak = resp.get_etag()
+    if etag and not weak:
+        resp.set_etag(etag, weak=True)  # same content, different bytes; If-None-Match still matches weakly
+
+
+@app.after_request
+def _finish_request(resp):
+    _compress(resp)
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    elapsed = time.perf_counter() - g.started
+    http_seconds.observe(elapsed, endpoint=endpoint)
+    http_requests.inc(endpoint=endpoint, method=request.method, status=resp.status_code)
+    totals = {}
+    for name, seconds in g.trace:
+        totals[name] = totals.get(name, 0.0) + seconds
+    timings = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in totals.items()]
+    resp.headers['Server-Timing'] = ', '.join(timings + [f'total;dur={elapsed * 1000:.2f}'])
+    end_trace()
+    if g.profiler is not None:
+        g.profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(g.profiler, stream=out).sort_stats('cumulative').print_stats(40)
+        log.info('profile of %s %s (%.1f ms)\n%s', request.method, request.path, elapsed * 1000, out.getvalue())
+        if PROFILE_DIR:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint.strip('/').replace('/', '_') or 'root'}.prof"
+            g.profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+    return resp
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+# Precomputed ephemeris (see ephemeris_store.py), memory-mapped when the file exists; swisseph otherwise
+EPHEMERIS_STORE_PATH = os.getenv('EPHEMERIS_STORE', os.path.join(base_dir, 'ephemeris.bin'))
+if os.path.exists(EPHEMERIS_STORE_PATH):
+    try:
+        use_ephemeris_store(EphemerisStore(EPHEMERIS_STORE_PATH))
+    except (OSError, ValueError) as e:
+        log.warning("Ephemeris store not loaded, using swisseph: %s", e)
+
+# Event index (see events.py), opened when the table has been built
+EVENTS_DB_PATH = os.getenv('EVENTS_DB', os.path.join(base_dir, 'events.sqlite'))
+event_index = None
+if os.path.exists(EVENTS_DB_PATH):
+    try:
+        event_index = EventIndex(EVENTS_DB_PATH)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        log.warning("Event index not loaded: %s", e)
+
+# Stored charts for population queries (see chart_store.py); CHART_STORE_DB='' turns the store off
+CHART_STORE_DB = os.getenv('CHART_STORE_DB', os.path.join(base_dir, 'charts.sqlite'))
+chart_store = None
+if CHART_STORE_DB:
+    try:
+        chart_store = ChartStore(CHART_STORE_DB)
+    except (OSError, sqlite3.Error) as e:
+        log.warning("Chart store not opened: %s", e)
+
+# Interpretation corpus, parsed at startup and reloaded when the file changes
+dataset_store = DatasetStore(os.path.join(base_dir, '..', 'dataset.json'))
+
+@app.route('/api/dataset', methods=['GET'])
+def dataset():
+    """Full dataset.json, cacheable by ETag; ?v=<version> URLs never change and are cached for a year"""
+    _, body, version = dataset_store.snapshot()
+    resp = Response(body, mimetype='application/json')
+    resp.set_etag(version)
+    if request.args.get('v') == version:
+        resp.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Dataset-Version'] = version
+    return resp.make_conditional(request)
+
+def _binary_charts(births: list, mimetype: str, single: bool = False):
+    """Charts as packed records or MessagePack (see wire.py), computed without the JSON rendering"""
+    if mimetype is None:
+        return jsonify({'error': f'cannot answer in any accepted format (available: {JSON_MIMETYPE}, '
+                                 'application/vnd.kundli.packed, application/msgpack)'}), 406
+    records, errors = chart_records(births)
+    if single and errors:
+        return jsonify({'error': errors[0]}), 400
+    if single and births[0].get('ref') is not None and chart_store is not None:
+        _store_records(str(births[0]['ref']), births[0], records)
+    with stage('serialization'):
+        body = encode(records, errors, mimetype)
+    return Response(body, mimetype=mimetype)
 
 @app.route('/api/kundli', methods=['POST'])
 def kundli():
     data = request.json
-    # Extract birth details
-    birth_date = data['date']         # 'YYYY-MM-DD'
-    birth_time = data['time']         # 'HH:MM'
-    birth_lat  = float(data['lat'])
-    birth_lon  = float(data['lon'])
-    birth_tz   = float(data['tz'])    # e.g. 5.5
-    chart_type = data.get('chart_type', 'regular')  # 'regular' or 'd9'
-    
-    # Load dataset
-    import json
-    import os
-    dataset_path = os.path.join(os.path.dirname(__file__), '..', 'dataset.json')
+    _count_chart_types('/api/kundli', [data])
+    mimetype = response_format(request.accept_mimetypes)
+    if mimetype != JSON_MIMETYPE:
+        return _binary_charts([data], mimetype, single=True)
+
+    charts = chart_objects([data], cache=chart_cache, latlon_decimals=CHART_CACHE_LATLON_DECIMALS)
+    chart = render_with_yogas(charts)[0]
+    if 'error' in chart:
+        return jsonify(chart), 400
+    if data.get('ref') is not None and chart_store is not None:
+        _store_chart(str(data['ref']), data, charts[0])
+
+    # Interpretations: the slices this chart uses (default), or only the version for
+    # clients that keep their own copy of /api/dataset
+    with stage('dataset'):
+        corpus, _, version = dataset_store.snapshot()
+        chart['dataset_version'] = version
+        if data.get('dataset', 'slice') != 'version':
+            chart['dataset'] = chart_slice(corpus, chart)
+
+    # Return as JSON
+    with stage('serialization'):
+        return jsonify(chart)
+
+def _store_chart(ref: str, data: dict, charts: dict):
+    """Keep the D1 chart of a /api/kundli request under its 'ref': one it computed, or else from the chart cache"""
+    d1 = charts['chart'] if charts['chart'].division == 1 else charts.get('charts', {}).get('D1')
+    if d1 is None:
+        d1 = chart_objects([dict(data, chart_type='regular', charts=[])], cache=chart_cache,
+                           latlon_decimals=CHART_CACHE_LATLON_DECIMALS)[0].get('chart')
     try:
-        with open(dataset_path, 'r', encoding='utf-8') as f:
-            dataset = json.load(f)
-    except Exception as e:
-        print(f"Error loading dataset: {e}")
-        dataset = {}
-
-    # Convert to UTC
-    y, m, d = map(int, birth_date.split('-'))
-    hour, minute = map(int, birth_time.split(':'))
-    dt = datetime.datetime(y, m, d, hour, minute)
-    dt_utc = dt - datetime.timedelta(hours=birth_tz)
-    jd = swe.julday(dt_utc.year, dt_utc.month, dt_utc.day,
-                    dt_utc.hour + dt_utc.minute/60)
-
-    # Calculate planets (now including Uranus, Neptune, Pluto)
-    planets = {
-        'Su': swe.SUN, 'Mo': swe.MOON, 'Ma': swe.MARS,
-        'Me': swe.MERCURY, 'Ju': swe.JUPITER, 'Ve': swe.VENUS,
-        'Sa': swe.SATURN, 'Ra': swe.MEAN_NODE,
-        'Ur': swe.URANUS, 'Ne': swe.NEPTUNE, 'Pl': swe.PLUTO
-    }
-    ayanamsa = swe.get_ayanamsa(jd)
-    positions = {}
-    speeds = {}
-    for name, pl in planets.items():
-        lon, lat, dist, speed_long, speed_lat, speed_dist = swe.calc_ut(jd, pl)[0]
-        lon = (lon - ayanamsa) % 360
-        positions[name] = lon
-        speeds[name] = speed_long
-    positions['Ke'] = (positions['Ra'] + 180) % 360
-    speeds['Ke'] = 0
-
-    # If D9 chart requested, calculate navamsa positions
-    if chart_type == 'd9':
-        positions = calculate_navamsa(positions)
-
-    # Calculate ascendant
-    if chart_type == 'regular':
-        # For D1, calculate actual ascendant
-        cusps, ascmc = swe.houses(jd, birth_lat, birth_lon, b'P')
-        asc_lon = (ascmc[0] - ayanamsa) % 360
-    else:
-        # For D9, calculate navamsa ascendant from D1 ascendant
-        cusps, ascmc = swe.houses(jd, birth_lat, birth_lon, b'P')
-        d1_asc = (ascmc[0] - ayanamsa) % 360
-        # Convert D1 ascendant to D9
-        asc_sign_num = int(d1_asc // 30)
-        asc_deg_in_sign = d1_asc % 30
-        asc_navamsa_num = int(asc_deg_in_sign // 3.333333)
-        
-        # Calculate D9 ascendant sign
-        element_start = (asc_sign_num % 4) * 3  # 0, 3, 6, 9
-        d9_asc_sign_index = element_start + asc_navamsa_num
-        d9_asc_sign_index = d9_asc_sign_index % 12
-        
-        # Calculate degree within the D9 ascendant sign
-        d9_asc_degree = (asc_deg_in_sign % 3.333333) * 9
-        
-        # Convert to absolute degree
-        asc_lon = d9_asc_sign_index * 30 + d9_asc_degree
-
-    # Sign info
-    signs = ['Aries','Taurus','Gemini','Cancer','Leo','Virgo','Libra','Scorpio',
-             'Sagittarius','Capricorn','Aquarius','Pisces']
-    def zodiac_sign(deg): return signs[int(deg//30)]
-
-    # Exaltation/Debility info
-    exaltation_debilitation = {
-        'Su': [('Aries', 10), ('Libra', 10)],
-        'Mo': [('Taurus', 3), ('Scorpio', 3)],
-        'Ma': [('Capricorn', 28), ('Cancer', 28)],
-        'Me': [('Virgo', 15), ('Pisces', 15)],
-        'Ju': [('Cancer', 5), ('Capricorn', 5)],
-        'Ve': [('Pisces', 27), ('Virgo', 27)],
-        'Sa': [('Libra', 20), ('Aries', 20)],
-    }
-
-    # Combustion orbits (approximate, in degrees)
-    combust_orbits = {
-        'Mo': 12, 'Ma': 17, 'Me': 14, 'Ju': 11, 'Ve': 10, 'Sa': 15
-    }
-
-    # Sun degree for combustion
-    sun_deg = positions['Su']
-
-    # Build sign_planets with details
-    sign_planets = {sign: [] for sign in signs}
-    for name, deg in positions.items():
-        sign = zodiac_sign(deg)
-        deg_in_sign = deg % 30
-        status = []
-        # Exaltation/Debility
-        if name in exaltation_debilitation:
-            exalt_sign, exalt_deg = exaltation_debilitation[name][0]
-            debil_sign, debil_deg = exaltation_debilitation[name][1]
-            if sign == exalt_sign:
-                status.append("exalted")
-                if abs(deg_in_sign - exalt_deg) <= 5:
-                    status.append("peak")
-            elif sign == debil_sign:
-                status.append("debilitated")
-                if abs(deg_in_sign - debil_deg) <= 5:
-                    status.append("peak")
-        # Combustion
-        if name != 'Su' and name in combust_orbits:
-            diff = abs((deg - sun_deg + 180) % 360 - 180)
-            if diff < combust_orbits[name]:
-                status.append("combust")
-        # Retrograde
-        if speeds.get(name, 0) < 0:
-            status.append("retrograde")
-        sign_planets[sign].append({
-            'name': name,
-            'deg': round(deg_in_sign, 1),
-            'sign': sign,
-            'status': status
-        })
-
-    # House descriptions
-    house_descriptions = {
-        1: "Self, personality, appearance, health, vitality",
-        2: "Wealth, family, speech, face, right eye, food habits",
-        3: "Siblings, courage, short journeys, communication, hands",
-        4: "Mother, home, property, vehicles, comfort, happiness",
-        5: "Children, intelligence, creativity, romance, speculation",
-        6: "Enemies, diseases, debts, obstacles, service, pets",
-        7: "Spouse, marriage, partnerships, business, foreign travel",
-        8: "Longevity, death, transformation, occult, inheritance",
-        9: "Father, guru, religion, higher education, fortune",
-        10: "Career, profession, authority, government, reputation",
-        11: "Income, gains, elder siblings, friends, social circle",
-        12: "Expenses, losses, foreign lands, spirituality, sleep"
-    }
-
-    # Calculate house strengths and colors
-    house_strengths = {}
-    
-    # Calculate aspects for strength analysis
-    def get_aspects_to_house(target_house):
-        aspects_to_house = []
-        for sign, plist in sign_planets.items():
-            house_num = ((signs.index(sign) - signs.index(zodiac_sign(asc_lon))) % 12) + 1
-            for p in plist:
-                planet = p['name']
-                # Get aspects for this planet
-                if planet in ['Su', 'Mo', 'Ma', 'Me', 'Ju', 'Ve', 'Sa', 'Ra', 'Ke']:
-                    aspect_rules = {
-                        'Su': [6], 'Mo': [6], 'Ma': [3, 6, 7], 'Me': [6], 'Ju': [4, 6, 8], 'Ve': [6],
-                        'Sa': [2, 6, 9], 'Ra': [4, 6, 8], 'Ke': [4, 6, 8]
-                    }
-                    
-                    for offset in aspect_rules.get(planet, []):
-                        target_house_num = ((house_num + offset - 1) % 12) + 1
-                        if target_house_num == target_house:
-                            # Determine aspect nature
-                            if planet in ['Ju', 'Ve', 'Mo']:
-                                aspect_nature = 'benefic'
-                            elif planet in ['Ma', 'Sa', 'Ra', 'Ke']:
-                                aspect_nature = 'malefic'
-                            else:
-                                aspect_nature = 'neutral'
-                            aspects_to_house.append({'planet': planet, 'nature': aspect_nature})
-        return aspects_to_house
-    
-    for house_num in range(1, 13):
-        house_sign = signs[(house_num - 1) % 12]
-        house_planets = sign_planets.get(house_sign, [])
-        aspects_to_house = get_aspects_to_house(house_num)
-        
-        # Calculate strength based on planets and aspects
-        strength = 0
-        total_influence = 0
-        
-        # Analyze planets in the house
-        for planet in house_planets:
-            planet_name = planet['name']
-            is_exalted = 'exalted' in planet.get('status', [])
-            is_debilitated = 'debilitated' in planet.get('status', [])
-            is_combust = 'combust' in planet.get('status', [])
-            is_retrograde = 'retrograde' in planet.get('status', [])
-            
-            # Base strength based on planet nature
-            if planet_name in ['Ju', 'Ve', 'Mo']:  # Benefics
-                planet_strength = 1.5 if is_exalted else -0.5 if is_debilitated else 0.8
-            elif planet_name in ['Ma', 'Sa', 'Ra', 'Ke']:  # Malefics
-                planet_strength = 0.5 if is_exalted else -1.5 if is_debilitated else -0.8
-            else:  # Neutral (Sun, Mercury)
-                planet_strength = 1.0 if is_exalted else -1.0 if is_debilitated else 0.2
-            
-            # Adjust for combustion and retrograde
-            if is_combust:
-                planet_strength *= 0.5
-            if is_retrograde:
-                planet_strength *= 0.8
-            
-            strength += planet_strength
-            total_influence += 1
-        
-        # Analyze aspects to the house
-        for aspect in aspects_to_house:
-            aspect_strength = 0.3 if aspect['nature'] == 'benefic' else -0.3 if aspect['nature'] == 'malefic' else 0
-            strength += aspect_strength
-            total_influence += 1
-        
-        # Normalize strength
-        avg_strength = strength / total_influence if total_influence > 0 else 0
-        
-        # Debug: Print strength values
-        print(f"House {house_num} ({house_sign}): strength={strength}, total_influence={total_influence}, avg_strength={avg_strength:.3f}")
-        
-        # Adjust thresholds to be more realistic
-        if avg_strength >= 0.2:  # Lowered from 0.5
-            house_strengths[house_num] = {'strength': 'strong', 'color': '#90EE90'}
-        elif avg_strength <= -0.2:  # Lowered from -0.5
-            house_strengths[house_num] = {'strength': 'weak', 'color': '#FFB6C1'}
+        if d1 is not None:
+            chart_store.put_charts([ref], [d1], [parse_ayanamsa(data.get('ayanamsa'))])
+    except sqlite3.Error as e:
+        log.warning("Chart %r not stored: %s", ref, e)
+
+def _store_records(ref: str, data: dict, records):
+    """Keep the D1 record of a binary /api/kundli answer under its 'ref', computing it if the request skipped D1"""
+    d1 = records[records['division'] == 1][:1]
+    try:
+        if len(d1):
+            chart_store.put([ref], d1, [parse_ayanamsa(data.get('ayanamsa'))])
         else:
-            house_strengths[house_num] = {'strength': 'neutral', 'color': '#FFD700'}
+            chart_store.put_births([ref], [data])
+    except sqlite3.Error as e:
+        log.warning("Chart %r not stored: %s", ref, e)
 
-    # Return as JSON
-    return jsonify({
-        'sign_planets': sign_planets,
-        'positions': positions,
-        'asc_sign': zodiac_sign(asc_lon),
-        'house_descriptions': house_descriptions,
-        'house_strengths': house_strengths,
-        'dataset': dataset
-    })
+@app.route('/api/kundli/batch', methods=['POST'])
+def kundli_batch():
+    """Compute many charts in one request; failed items carry an 'error' instead of failing the batch"""
+    data = request.json
+    births = data.get('births') if isinstance(data, dict) else data
+    if not isinstance(births, list):
+        return jsonify({'error': "expected a JSON list of births or {'births': [...]}"}), 400
+    if len(births) > BATCH_MAX_SIZE:
+        return jsonify({'error': f'batch too large ({len(births)} > {BATCH_MAX_SIZE})'}), 413
+    _count_chart_types('/api/kundli/batch', births)
+    mimetype = response_format(request.accept_mimetypes)
+    if mimetype != JSON_MIMETYPE:
+        return _binary_charts(births, mimetype)
+    charts = render_with_yogas(chart_objects(births, cache=chart_cache, latlon_decimals=CHART_CACHE_LATLON_DECIMALS))
+    with stage('serialization'):
+        return jsonify({'charts': charts, 'errors': sum(1 for c in charts if 'error' in c)})
+
+@app.route('/api/yogas/scan', methods=['POST'])
+def yoga_scan():
+    """Indices of the births whose chart has the given yoga(s), evaluated over all charts in one pass"""
+    data = request.json or {}
+    names = data.get('yoga') or data.get('yogas') or list(YOGAS)
+    names = [names] if isinstance(names, str) else names
+    unknown = [n for n in names if n not in YOGAS]
+    if unknown:
+        return jsonify({'error': f'unknown yoga(s) {unknown}; expected any of {list(YOGAS)}'}), 400
+    births = data.get('births')
+    if not isinstance(births, list):
+        return jsonify({'error': "expected {'yoga': ..., 'births': [...]}"}), 400
+    if len(births) > BATCH_MAX_SIZE:
+        return jsonify({'error': f'batch too large ({len(births)} > {BATCH_MAX_SIZE})'}), 413
+    charts = chart_objects(births, cache=chart_cache, latlon_decimals=CHART_CACHE_LATLON_DECIMALS)
+    rows = [i for i, c in enumerate(charts) if 'error' not in c]
+    records = Chart.records([charts[i]['chart'] for i in rows])
+    hits = (evaluate(records['lon'], (records['asc'] // 30).astype(int) % 12, names) if rows
+            else {n: ([], []) for n in names})
+    matches = {n: [rows[k] for k in np.flatnonzero(hit)] for n, (hit, _) in hits.items()}
+    return jsonify({'matches': matches, 'counts': {n: len(m) for n, m in matches.items()},
+                    'scanned': len(rows), 'errors': len(births) - len(rows)})
+
+@app.route('/api/charts', methods=['POST'])
+def charts_store():
+    """Compute and store the D1 charts of {'charts': [{'ref': ..., <birth>}, ...]}, replacing earlier ones"""
+    if chart_store is None:
+        return jsonify({'error': 'chart store is disabled'}), 503
+    data = request.json or {}
+    items = data.get('charts') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return jsonify({'error': "expected {'charts': [{'ref': ..., 'date': ..., ...}, ...]}"}), 400
+    if len(items) > BATCH_MAX_SIZE:
+        return jsonify({'error': f'batch too large ({len(items)} > {BATCH_MAX_SIZE})'}), 413
+    if not all(isinstance(item, dict) and item.get('ref') is not None for item in items):
+        return jsonify({'error': "every chart needs a 'ref'"}), 400
+    result = chart_store.put_births([str(item['ref']) for item in items], items)
+    return jsonify({'stored': result['stored'],
+                    'errors': {str(i): msg for i, msg in sorted(result['errors'].items())}})
+
+@app.route('/api/charts/<ref>', methods=['DELETE'])
+def charts_delete(ref):
+    if chart_store is None:
+        return jsonify({'error': 'chart store is disabled'}), 503
+    if not chart_store.delete(ref):
+        return jsonify({'error': f'no chart stored for {ref!r}'}), 404
+    return jsonify({'deleted': ref})
+
+@app.route('/api/charts/query', methods=['POST'])
+def charts_query():
+    """Stored charts matching every condition of {'where': [...]} (see chart_store.parse_conditions)"""
+    if chart_store is None:
+        return jsonify({'error': 'chart store is disabled'}), 503
+    data = request.json or {}
+    try:
+        offset = int(data.get('offset', 0))
+        limit = int(data.get('limit', 100))
+        if offset < 0 or not 0 <= limit <= 1000:
+            raise ValueError('offset must be >= 0 and limit 0-1000')
+        with stage('chart_query'):
+            return jsonify(chart_store.query(data.get('where'), offset, limit))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+def _transit_time(value) -> float:
+    """UT Julian day of an 'at' parameter (UTC, default now)"""
+    return float(utc_julian_days(time_or_now(value)))
+
+@app.route('/api/transits', methods=['GET'])
+def transits():
+    """The cached transit chart of the bucket holding ?at= (UTC, default now)"""
+    try:
+        snap = snapshot(_transit_time(request.args.get('at')), parse_ayanamsa(request.args.get('ayanamsa')),
+                        TRANSIT_BUCKET_MINUTES, transit_cache)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({**snap.describe(), 'bucket_minutes': TRANSIT_BUCKET_MINUTES})
+
+@app.route('/api/transits/overlay', methods=['POST'])
+def transit_overlay():
+    """Transits at 'at' over natal charts, streamed as NDJSON: the given 'charts' or else every stored chart"""
+    data = request.json or {}
+    try:
+        jd = _transit_time(data.get('at'))
+        charts = data.get('charts')
+        if charts is not None:
+            if not isinstance(charts, list):
+                raise ValueError("charts must be a list of {'ref', 'asc_sign', 'positions'}")
+            if len(charts) > BATCH_MAX_SIZE:
+                return jsonify({'error': f'batch too large ({len(charts)} > {BATCH_MAX_SIZE})'}), 413
+            lons, asc = chart_arrays(charts)
+            snap = snapshot(jd, parse_ayanamsa(data.get('ayanamsa')), TRANSIT_BUCKET_MINUTES, transit_cache)
+            lines = overlay_lines([c.get('ref', i) for i, c in enumerate(charts)], overlay(snap, lons, asc))
+        elif chart_store is None:
+            return jsonify({'error': 'chart store is disabled; send the natal charts as charts'}), 503
+        else:
+            lines = store_overlay(chart_store, jd, data.get('where'), TRANSIT_BUCKET_MINUTES, transit_cache)
+            lines = itertools.chain([next(lines, '')], lines)  # invalid 'where' conditions fail here, not mid-stream
+    except (KeyError, ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error': f'invalid overlay request: {e!r}'}), 400
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+def _panchang_window(data: dict):
+    """(first local date, days) from 'year', 'start' + 'days' or 'date' (default today, UTC)"""
+    if data.get('year') is not None:
+        start = np.datetime64(f"{int(data['year']):04d}-01-01", 'D')
+        return start, int((np.datetime64(f"{int(data['year']) + 1:04d}-01-01", 'D') - start).astype(int))
+    if data.get('start'):
+        return np.datetime64(data['start'], 'D'), int(data.get('days', 1))
+    return np.datetime64(data.get('date') or 'today', 'D'), 1
+
+@app.route('/api/panchang', methods=['POST'])
+def panchang_table():
+    """Daily panchang (tithi, nakshatra, yoga, karana, vara) for a location, or for each of 'locations'"""
+    data = request.json or {}
+    try:
+        start, days = _panchang_window(data)
+        sid_mode = parse_ayanamsa(data.get('ayanamsa'))
+        locations = data.get('locations')
+        if locations is None:
+            with stage('panchang'):
+                return jsonify({'days': panchang(*parse_location(data), start, days, sid_mode, sun_cache)})
+        if not isinstance(locations, list):
+            raise ValueError('locations must be a list of {lat, lon, tz}')
+        if len(locations) > PANCHANG_MAX_LOCATIONS:
+            return jsonify({'error': f'too many locations ({len(locations)} > {PANCHANG_MAX_LOCATIONS}); '
+                                     'use panchang.py for large lists'}), 413
+        with stage('panchang'):
+            return jsonify({'locations': [{**place, 'days': panchang(*parse_location(place), start, days, sid_mode,
+                                                                     sun_cache)} for place in locations]})
+    except (KeyError, ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error': f'invalid panchang request: {e!r}'}), 400
+
+@app.route('/api/rectify', methods=['POST'])
+def rectify():
+    """Ascendant, D9 ascendant, Moon sign and nakshatra segments, with exact boundaries, over a window of birth times"""
+    data = request.json or {}
+    try:
+        window = parse_rectify_request(data)
+        with stage('rectify'):
+            return jsonify(sweep(window, steps=bool(data.get('steps'))))
+    except (KeyError, ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error': f'invalid rectification request: {e!r}'}), 400
+
+@app.route('/api/ephemeris', methods=['GET'])
+def ephemeris():
+    """Stream sidereal longitudes/speeds from start to end every step as NDJSON, one line per sample"""
+    try:
+        start = parse_time(request.args['start'])
+        end = parse_time(request.args['end'])
+        step = parse_step(request.args.get('step', '1d'))
+        bodies = parse_bodies(request.args.get('planets', ''))
+        count = sample_count(start, end, step)
+    except KeyError as e:
+        return jsonify({'error': f'missing parameter {e.args[0]!r}'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if count > EPHEMERIS_MAX_POINTS:
+        return jsonify({'error': f'too many samples ({count} > {EPHEMERIS_MAX_POINTS}); use a larger step'}), 413
+    rows = ephemeris_series(start, end, step, bodies)
+    resp = Response(stream_with_context(ndjson(rows)), mimetype='application/x-ndjson')
+    resp.headers['X-Sample-Count'] = str(count)
+    return resp
+
+@app.route('/api/events', methods=['GET'])
+def events():
+    """Ingresses, nakshatra changes, stations and combustion windows between start and end"""
+    if event_index is None:
+        return jsonify({'error': 'event index not built (run python events.py build)'}), 503
+    try:
+        start = float(utc_julian_days(parse_time(request.args['start'])))
+        end = float(utc_julian_days(parse_time(request.args['end'])))
+        planets = parse_bodies(request.args.get('planets', '')) if request.args.get('planets') else None
+        kinds = parse_kinds(request.args.get('types', ''))
+        limit = min(int(request.args.get('limit', '1000')), 100000)
+    except KeyError as e:
+        return jsonify({'error': f'missing parameter {e.args[0]!r}'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'events': event_index.query(start, end, planets, kinds, limit)})
+
+@app.route('/api/events/next', methods=['GET'])
+def next_event():
+    """The first event of one type for one planet after a time (default now), e.g. the next Saturn ingress"""
+    if event_index is None:
+        return jsonify({'error': 'event index not built (run python events.py build)'}), 503
+    try:
+        planet = parse_bodies(request.args['planet'])
+        kinds = parse_kinds(request.args.get('type', 'ingress'))
+        after_jd = float(utc_julian_days(time_or_now(request.args.get('after'))))
+    except KeyError as e:
+        return jsonify({'error': f'missing parameter {e.args[0]!r}'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if len(planet) != 1 or len(kinds) != 1:
+        return jsonify({'error': 'give exactly one planet and one type'}), 400
+    return jsonify({'event': event_index.next(planet[0], kinds[0], after_jd)})
+
+def _parse_levels(value, default=3) -> int:
+    levels = int(value if value is not None else default)
+    if not 1 <= levels <= MAX_LEVELS:
+        raise ValueError(f'levels must be between 1 and {MAX_LEVELS}')
+    return levels
+
+@app.route('/api/dasha', methods=['POST'])
+def dasha():
+    """Vimshottari periods from the natal Moon, nested to `levels` and limited to an optional start/end range"""
+    data = request.json
+    try:
+        levels = _parse_levels(data.get('levels'))
+        start = float(utc_julian_days(parse_time(data['start']))) if data.get('start') else None
+        end = float(utc_julian_days(parse_time(data['end']))) if data.get('end') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if levels > 3 and (start is None or end is None):
+        return jsonify({'error': 'levels deeper than 3 need a start/end range'}), 400
+    moon, jd, errors = moon_longitudes([data])
+    if errors:
+        return jsonify({'error': errors[0]}), 400
+    result = nakshatra_info(moon[0], jd[0])
+    result['periods'] = list(dasha_periods(moon[0], jd[0], levels, start, end))
+    return jsonify(result)
+
+@app.route('/api/dasha/current', methods=['POST'])
+def dasha_current():
+    """Running dasha at one instant (default now) for many charts in one vectorized pass"""
+    data = request.json
+    births = data.get('births') if isinstance(data, dict) else None
+    if not isinstance(births, list):
+        return jsonify({'error': "expected {'births': [...]}"}), 400
+    if len(births) > BATCH_MAX_SIZE:
+        return jsonify({'error': f'batch too large ({len(births)} > {BATCH_MAX_SIZE})'}), 413
+    try:
+        levels = _parse_levels(data.get('levels'))
+        at = time_or_now(data.get('at'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    moon, jd, errors = moon_longitudes(births)
+    ok = np.array([i not in errors for i in range(len(births))], dtype=bool)
+    lords, start, end = current_dashas(moon[ok], jd[ok], float(utc_julian_days(at)), levels)
+    starts = np.datetime_as_string(julian_day_to_utc(start), unit='m')
+    ends = np.datetime_as_string(julian_day_to_utc(end), unit='m')
+    results = []
+    row = 0
+    for i in range(len(births)):
+        if i in errors:
+            results.append({'error': errors[i]})
+            continue
+        results.append({'lords': [DASHA_ORDER[k] for k in lords[row]], 'start': starts[row] + 'Z', 'end': ends[row] + 'Z'})
+        row += 1
+    return jsonify({'at': str(at) + 'Z', 'dashas': results})
+
+@app.route('/api/match', methods=['POST'])
+def match():
+    """Ashtakoota score of one couple from {groom, bride}, each birth data or {moon_lon}"""
+    data = request.json or {}
+    padas, errors = profile_padas([data.get('groom'), data.get('bride')])
+    if errors:
+        return jsonify({'error': '; '.join(f"{('groom', 'bride')[i]}: {e}" for i, e in errors.items())}), 400
+    groom, bride = int(padas[0]), int(padas[1])
+    return jsonify({'groom': pada_info(groom), 'bride': pada_info(bride), **score(groom, bride)})
+
+@app.route('/api/match/top', methods=['POST'])
+def match_top():
+    """The k best Ashtakoota matches for one profile among many candidates"""
+    data = request.json or {}
+    candidates = data.get('candidates')
+    if not isinstance(candidates, list):
+        return jsonify({'error': "expected {'profile': ..., 'role': 'groom'|'bride', 'candidates': [...]}"}), 400
+    if len(candidates) > MATCH_MAX_PROFILES:
+        return jsonify({'error': f'too many candidates ({len(candidates)} > {MATCH_MAX_PROFILES})'}), 413
+    role = data.get('role', 'groom')
+    if role not in ('groom', 'bride'):
+        return jsonify({'error': "role must be 'groom' or 'bride'"}), 400
+    try:
+        k = int(data.get('k', 10))
+        min_points = float(data.get('min_points', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'k and min_points must be numbers'}), 400
+    profile, errors = profile_padas([data.get('profile')])
+    if errors:
+        return jsonify({'error': f'profile: {errors[0]}'}), 400
+    padas, errors = profile_padas(candidates)
+    ok = np.array([i not in errors for i in range(len(candidates))], dtype=bool)
+    rows = np.flatnonzero(ok)
+    pada = int(profile[0])
+    idx, points = top_matches(pada, padas[rows], k, as_groom=role == 'groom', min_points=min_points)
+    matches = []
+    for i, total in zip(rows[idx], points):
+        couple = (pada, int(padas[i])) if role == 'groom' else (int(padas[i]), pada)
+        matches.append({'index': int(i), 'total': float(total), **pada_info(int(padas[i])),
+                        'kootas': score(*couple)['kootas']})
+    return jsonify({'profile': pada_info(pada), 'max': MAX_POINTS, 'matches': matches,
+                    'scanned': len(rows), 'errors': len(errors)})
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({'charts': chart_cache.stats(), 'transits': transit_cache.stats(), 'sunrise': sun_cache.stats(),
+                    'ai': ai_cache.stats()})
+
+def _client_key() -> str:
+    return request.remote_addr or 'unknown'
+
+def _retry_later(retry_after: float, message: str, status: int = 429):
+    wait_sec = max(1, math.ceil(retry_after))
+    resp = jsonify({'response': message.format(wait_sec=wait_sec), 'cooldown': wait_sec})
+    resp.status_code = status
+    resp.headers['Retry-After'] = str(wait_sec)
+    return resp
+
+def _submit_ai_job(relay=None):
+    """Answer from the cache, or check the model's circuit, rate-limit the caller and queue the question.
+
+    Returns (cached text, None, None), (None, job, None) or (None, None, error response). Identical
+    questions already in flight share one job, so they cost a single model call. A job streaming to a
+    client is not shared: it stops when that client leaves, and whoever joined it would get the part
+    generated so far.
+    """
+    with stage('ai_prompt'):
+        prompt = build_prompt(request.json or {})
+    key = response_key(prompt, ai_provider.model, {'text': TEXT_PARAMS, 'chat': CHAT_PARAMS})
+    cached = ai_cache.get(key)
+    if cached is not None:
+        ai_outcomes.inc(outcome='cached')
+        return cached, None, None
+    down = ai_provider.breaker.retry_after()
+    if down:
+        ai_outcomes.inc(outcome='circuit_open')
+        return None, None, _retry_later(down, 'The AI service is temporarily unavailable. Please try again in {wait_sec}s.', 503)
+    wait = ai_rate_limiter.check(_client_key())
+    if wait:
+        ai_outcomes.inc(outcome='rate_limited')
+        return None, None, _retry_later(wait, 'Please wait {wait_sec}s before asking another question.')
+    try:
+        job = ai_jobs.submit((prompt, key, relay), key=key, joinable=relay is None)
+    except QueueFull as e:
+        ai_outcomes.inc(outcome='queue_full')
+        return None, None, _retry_later(e.retry_after, 'The AI service is busy. Please try again in {wait_sec}s.')
+    ai_outcomes.inc(outcome='shared' if job.get('shared') else 'queued')
+    return None, job, None
+
+def _ai_job_response(job: dict) -> dict:
+    body = {'job_id': job['id'], 'status': job['status'], 'elapsed': job['elapsed']}
+    if job['status'] in ('done', 'failed'):
+        body['response'] = job.get('result') or UNAVAILABLE_MESSAGE
+    return body
 
 @app.route('/api/ai-analysis', methods=['POST'])
 def ai_analysis():
-    global _last_ai_call_ts
-    # Simple cooldown check
-    now_ts = time.time()
-    if now_ts - _last_ai_call_ts < AI_COOLDOWN_SECONDS:
-        wait_sec = int(AI_COOLDOWN_SECONDS - (now_ts - _last_ai_call_ts))
-        return jsonify({'response': f'Please wait {wait_sec}s before asking another question.', 'cooldown': wait_sec})
-    _last_ai_call_ts = now_ts
-
-    data = request.json
-    question = data.get('question', '')
-    kundli_data = data.get('kundli_data', {})
-    
-    # Hugging Face AI API call
-    def call_ai_api():
-        """Call the Hugging Face text-generation inference API"""
+    """Submit and wait: queues the question and answers when it finishes (202 with a job id past AI_WAIT_SECONDS)"""
+    cached, job, error = _submit_ai_job()
+    if error:
+        return error
+    if cached is not None:
+        return jsonify({'response': cached, 'cached': True})
+    job = ai_jobs.get(job['id'], wait=AI_WAIT_SECONDS)
+    if job is None:  # expired, or dropped with the worker's queue
+        return jsonify({'error': 'the job was lost before it finished; please ask again'}), 503
+    body = _ai_job_response(job)
+    return jsonify(body), 200 if 'response' in body else 202
+
+@app.route('/api/ai-analysis/jobs', methods=['POST'])
+def ai_analysis_submit():
+    cached, job, error = _submit_ai_job()
+    if error:
+        return error
+    if cached is not None:
+        return jsonify({'status': 'done', 'response': cached, 'cached': True})
+    resp = jsonify(_ai_job_response(job))
+    resp.status_code = 202
+    resp.headers['Location'] = f"/api/ai-analysis/jobs/{job['id']}"
+    return resp
+
+@app.route('/api/ai-analysis/jobs/<job_id>', methods=['GET'])
+def ai_analysis_poll(job_id):
+    """Job status; ?wait=N long-polls up to N seconds (at most AI_WAIT_SECONDS) for the result"""
+    try:
+        wait = min(float(request.args.get('wait', 0)), AI_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    job = ai_jobs.get(job_id, wait=wait)
+    if job is None:
+        return jsonify({'error': 'unknown or expired job'}), 404
+    return jsonify(_ai_job_response(job))
+
+def _sse(data: dict, event: str = None) -> str:
+    return (f'event: {event}\n' if event else '') + f'data: {json.dumps(data)}\n\n'
+
+@app.route('/api/ai-analysis/stream', methods=['POST'])
+def ai_analysis_stream():
+    """The same analysis relayed as server-sent events while the model generates.
+
+    Each `data` event carries a {"text": ...} piece of the cleaned answer; a final `done` event carries the
+    whole response. Generation stops at the first follow-up marker or when the client disconnects.
+    """
+    relay = TextRelay()
+    cached, job, error = _submit_ai_job(relay)
+    if error:
+        return error
+
+    def events():
+        if cached is not None:
+            yield _sse({'text': cached})
+            yield _sse({'response': cached, 'cached': True}, 'done')
+            return
         try:
-            hf_token = os.getenv('HUGGING_FACE_TOKEN')
-            model_name = os.getenv('HF_MODEL', 'tiiuae/falcon-rw-1b')
-
-            if not hf_token:
-                print("Hugging Face token not found. Set HUGGING_FACE_TOKEN in .env")
-                return None
-
-            client = InferenceClient(model_name, token=hf_token)
-
-            user_name = data.get('user_name', 'friend')
-
-            # Build readable planet placements with houses
-            signs_list = ['Aries','Taurus','Gemini','Cancer','Leo','Virgo','Libra','Scorpio','Sagittarius','Capricorn','Aquarius','Pisces']
-            sign_to_idx = {s: i for i, s in enumerate(signs_list)}
-            asc_idx = sign_to_idx.get(kundli_data.get('asc_sign', 'Aries'), 0)
-            placement_lines = []
-            for sign, plist in kundli_data.get('sign_planets', {}).items():
-                house_num = ((sign_to_idx.get(sign, 0) - asc_idx) % 12) + 1
-                for p in plist:
-                    status = ', '.join(p.get('status', [])) or 'normal'
-                    # Fix Venus in Pisces - it's always exalted
-                    if p['name'] == 'Ve' and sign == 'Pisces':
-                        status = 'exalted'
-                    placement_lines.append(f"{p['name']} – {sign} sign, house {house_num}, {p['deg']}°, status: {status}")
-            placements_text = "\n".join(placement_lines)
-
-            # Build aspects data
-            aspects_data = []
-            for sign, plist in kundli_data.get('sign_planets', {}).items():
-                house_num = ((sign_to_idx.get(sign, 0) - asc_idx) % 12) + 1
-                for p in plist:
-                    planet = p['name']
-                    # Get aspects for this planet
-                    if planet in ['Su', 'Mo', 'Ma', 'Me', 'Ju', 'Ve', 'Sa', 'Ra', 'Ke', 'Ur', 'Ne', 'Pl']:
-                        aspect_rules = {
-                            'Su': [6], 'Mo': [6], 'Ma': [3, 6, 7], 'Me': [6], 'Ju': [4, 6, 8], 'Ve': [6],
-                            'Sa': [2, 6, 9], 'Ra': [4, 6, 8], 'Ke': [4, 6, 8], 'Ur': [6], 'Ne': [6], 'Pl': [6]
-                        }
-                        aspect_labels = {2: '3rd', 3: '4th', 4: '5th', 6: '7th', 7: '8th', 8: '9th', 9: '10th'}
-                        
-                        for offset in aspect_rules.get(planet, []):
-                            target_house = ((house_num + offset - 1) % 12) + 1
-                            aspect_type = aspect_labels.get(offset, f'{offset}th')
-                            aspects_data.append(f"{planet} {aspect_type} aspect to House {target_house}")
-
-            aspects_text = "\n".join(aspects_data) if aspects_data else "None"
-
-            prompt = f""" 
-You are Chat-Jyotish — a sharp, compassionate Vedic astrologer.
-
-Your role is to guide {user_name} using their birth chart with warmth, clarity, and spiritual insight. Speak directly to them using “you” and “your.” Avoid technical jargon unless it's meaningful. Never refer to yourself or the user in the third person.
-
-Your answer must:
-• Stay focused on the chart and the user’s question.
-• Use the provided planetary placements and aspects meaningfully.
-• Highlight the most important 2–3 insights.
-• Be emotionally attuned but concise — no fluff or vague lines.
-• Limit your answer to 180 words (about 3–5 short, clear paragraphs).
-• Do **not** repeat the question or suggest follow-ups.
-
-KUNDLI SNAPSHOT
----------------
-Ascendant (Lagna): {kundli_data.get('asc_sign')}
-Chart Type        : {kundli_data.get('chart_type')}
-
-Planet Placements:
-{placements_text}
-
-Planetary Aspects:
-{aspects_text}
-
-QUESTION
---------
-{question}
-
-Give an insightful, direct Vedic astrology interpretation that speaks to {user_name}'s inner life and outer path.
-"""
-
-            try:
-                response_text = client.text_generation(
-                    prompt=prompt,
-                    max_new_tokens=150,
-                    temperature=0.3,
-                    top_p=0.9,
-                    repetition_penalty=1.1
-                )
-            except Exception as gen_err:
-                # Fallback for models that use the conversational/chat task
-                print(f"text_generation failed: {gen_err}. Trying chat_completion...")
-                print(f"Model: {model_name}")
-                print(f"Error details: {str(gen_err)}")
-                try:
-                    chat_resp = client.chat_completion(
-                        messages=[{"role": "user", "content": prompt}],
-                        max_tokens=330,
-                        temperature=0.2,
-                        top_p=0.85
-                    )
-                    # chat_completion returns an object with .choices[0].message.content
-                    response_text = getattr(chat_resp.choices[0].message, 'content', str(chat_resp))
-                except Exception as chat_err:
-                    print(f"chat_completion also failed: {chat_err}")
-                    print(f"Chat error details: {str(chat_err)}")
-                    return None
-            # Clean up the response to remove unwanted content
-            if response_text:
-                # Remove any conversation tags or follow-up content
-                lines = response_text.split('\n')
-                cleaned_lines = []
-                for line in lines:
-                    line = line.strip()
-                    if line and not line.startswith('[') and not line.startswith('[/') and not line.startswith('USER') and not line.startswith('ASS'):
-                        cleaned_lines.append(line)
-                    if line.startswith('[/') or line.startswith('[USER') or line.startswith('[ASS'):
-                        break
-                
-                response_text = '\n'.join(cleaned_lines)
-                
-               
-            return response_text
-        except Exception as e:
-            print(f"AI API exception: {e}")
-            return None
-
-  
-    # Call AI API
-    ai_response = call_ai_api()
-    if ai_response:
-        return jsonify({'response': ai_response})
-    else:
-        return jsonify({'response': 'AI service is currently unavailable. Please check your API key and internet connection.'})
+            yield _sse({'job_id': job['id'], 'status': 'queued'}, 'queued')
+            if not job.get('shared'):
+                for text in relay:
+                    yield _sse({'text': text})
+            # A shared job streams to the request that started it; the others get the answer in one piece
+            final = ai_jobs.get(job['id'], wait=AI_WAIT_SECONDS)
+            if final is None:  # expired, or dropped with the worker's queue
+                yield _sse({'error': 'the job was lost before it finished; please ask again'}, 'error')
+                return
+            if job.get('shared') and final.get('result'):
+                yield _sse({'text': final['result']})
+            yield _sse({'response': final.get('result') or UNAVAILABLE_MESSAGE}, 'done')
+        finally:
+            relay.closed.set()
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/ai-analysis/stats', methods=['GET'])
+def ai_analysis_stats():
+    return jsonify({**ai_jobs.stats(), 'rate_limited': ai_rate_limiter.limited, 'model': ai_provider.stats()})
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,77 @@
+"""Vedic (graha drishti) aspects as array operations over whole charts.
+
+A body aspects the houses at its offsets counted from its own house (offset 6 is the 7th-house aspect).
+For many charts at once, house_aspects gives a [..., body, house] matrix and planet_aspects a
+[..., body, body] matrix. With an orb, planet_aspects requires the aspect to be within that many
+degrees instead of only sign to sign.
+"""
+import numpy as np
+
+# Vedic aspects as house offsets (7th aspect == offset 6)
+ASPECT_RULES = {
+    'Su': [6], 'Mo': [6], 'Ma': [3, 6, 7], 'Me': [6], 'Ju': [4, 6, 8], 'Ve': [6],
+    'Sa': [2, 6, 9], 'Ra': [4, 6, 8], 'Ke': [4, 6, 8]
+}
+# The AI prompt also lists the outer planets' 7th aspect
+OUTER_PLANET_ASPECTS = {'Ur': [6], 'Ne': [6], 'Pl': [6]}
+ASPECT_LABELS = {2: '3rd', 3: '4th', 4: '5th', 6: '7th', 7: '8th', 8: '9th', 9: '10th'}
+
+
+def aspect_label(offset: int) -> str:
+    return ASPECT_LABELS.get(offset, f'{offset}th')
+
+
+def aspect_table(bodies, rules=ASPECT_RULES) -> np.ndarray:
+    """[body, offset] mask of the houses each body aspects; bodies without rules aspect nothing"""
+    table = np.zeros((len(bodies), 12), dtype=bool)
+    for j, name in enumerate(bodies):
+        table[j, rules.get(name, [])] = True
+    return table
+
+
+def house_aspects(planet_house: np.ndarray, table: np.ndarray) -> np.ndarray:
+    """[..., body, house]: whether each body aspects each house, from 0-based houses [..., body]"""
+    offsets = (np.arange(12) - planet_house[..., None]) % 12
+    return np.take_along_axis(np.broadcast_to(table, offsets.shape), offsets, axis=-1)
+
+
+def planet_aspects(lons: np.ndarray, table: np.ndarray, orb: float = None) -> np.ndarray:
+    """[..., from body, to body]: whether each body aspects each other body.
+
+    Without an orb this is sign to sign. With one, the target must lie within `orb` degrees of the
+    exact aspect point (the caster's longitude plus offset * 30).
+    """
+    lons = np.asarray(lons, dtype=float)
+    if orb is None:
+        signs = (lons // 30).astype(int) % 12
+        hits = house_aspects(signs, table)  # [..., from, sign]
+        targets = np.broadcast_to(signs[..., None, :], hits.shape[:-1] + signs.shape[-1:])
+        result = np.take_along_axis(hits, targets, axis=-1)
+    else:
+        result = aspect_deviation(lons, table) <= orb
+    n = lons.shape[-1]
+    result[..., np.arange(n), np.arange(n)] = False
+    return result
+
+
+def aspect_deviation(lons: np.ndarray, table: np.ndarray) -> np.ndarray:
+    """[..., from, to]: degrees between each target and the nearest exact aspect point of each caster (inf if none)"""
+    lons = np.asarray(lons, dtype=float)
+    gap = (lons[..., None, :] - lons[..., :, None]) % 360           # [..., from, to]
+    offsets = np.arange(12) * 30.0
+    dev = np.abs((gap[..., None] - offsets + 180) % 360 - 180)       # [..., from, to, offset]
+    dev = np.where(table[:, None, :], dev, np.inf)
+    return dev.min(axis=-1)
+
+
+def conjunctions(lons: np.ndarray, orb: float = None) -> np.ndarray:
+    """[..., body, body]: bodies in the same sign (or within `orb` degrees), excluding each body with itself"""
+    lons = np.asarray(lons, dtype=float)
+    if orb is None:
+        signs = (lons // 30).astype(int) % 12
+        result = signs[..., :, None] == signs[..., None, :]
+    else:
+        result = np.abs((lons[..., :, None] - lons[..., None, :] + 180) % 360 - 180) <= orb
+    n = lons.shape[-1]
+    result[..., np.arange(n), np.arange(n)] = False
+    return result
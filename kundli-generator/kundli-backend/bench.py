@@ -0,0 +1,272 @@
+"""Benchmarks for the chart pipeline and the AI path, with a stored baseline to compare against.
+
+    python bench.py --out bench_results.json
+    python bench.py --baseline bench_baseline.json --threshold 0.15
+    python bench.py --only chart_single_d1,batch_d9 --quick
+
+Births come from a seeded generator (--seed), so every run charts the same moments and places. Each benchmark
+is timed like timeit: a warmup sample, then --repeat samples of a fixed number of operations, reported as
+seconds per item (median, min, p95) and items per second. Benchmarks that make single charts draw fresh births
+for every call, so the chart cache never answers them. The AI benchmarks run against stub_model.py on a local
+port, which measures our side of the call (prompt, HTTP, response cleaning) rather than the model.
+
+Results are written as JSON. With --baseline, each benchmark's median per item is compared with the baseline's
+and the run exits 1 if any is slower by more than --threshold (a fraction). Baselines are only comparable on
+the same machine; record one from the main branch with --out before comparing a change against it.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from chart_core import Chart, chart_objects, compute_charts, use_ephemeris_store
+from yogas import record_yogas, render_with_yogas
+
+RESULTS_VERSION = 1
+CHART_TYPES = {'d1': 'regular', 'd9': 'd9'}
+
+
+def births(seed: int, chart_type: str = 'regular', charts=None):
+    """Endless reproducible birth dicts (the /api/kundli request shape) over 1900-2090 and latitudes +-60"""
+    rng = random.Random(seed)
+    while True:
+        birth = {'date': f'{rng.randint(1900, 2090)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+                 'time': f'{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}',
+                 'lat': round(rng.uniform(-60, 60), 4), 'lon': round(rng.uniform(-180, 180), 4),
+                 'tz': rng.choice([-5, 0, 1, 5.5, 8, 10]), 'chart_type': chart_type}
+        if charts:
+            birth['charts'] = charts
+        yield birth
+
+
+def measure(op, number: int, repeat: int, items: int = 1) -> dict:
+    """Time `repeat` samples of `number` calls of op() after one warmup sample; seconds are per item"""
+    samples = []
+    for i in range(repeat + 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = (time.perf_counter() - start) / (number * items)
+        if i:
+            samples.append(elapsed)
+    median = float(np.median(samples))
+    return {'median': median, 'min': min(samples), 'p95': float(np.percentile(samples, 95)),
+            'items_per_second': round(1 / median, 1) if median else None, 'samples': repeat,
+            'items_per_sample': number * items}
+
+
+# Each benchmark takes the run options and returns its measurement, plus any extra numbers it reports
+
+def bench_chart_single(division: str):
+    def bench(opts):
+        source = births(opts.seed, CHART_TYPES[division])
+        return measure(lambda: compute_charts([next(source)]), opts.number, opts.repeat)
+    return bench
+
+
+def bench_batch(division: str):
+    def bench(opts):
+        batch = list(itertools.islice(births(opts.seed, CHART_TYPES[division]), opts.batch))
+        return measure(lambda: compute_charts(batch), 1, opts.repeat, items=len(batch))
+    return bench
+
+
+def bench_batch_d1_d9(opts):
+    """Both charts of every birth from one ephemeris pass, as the frontend's D1/D9 toggle asks for them"""
+    batch = list(itertools.islice(births(opts.seed, 'regular', charts=['D1', 'D9']), opts.batch))
+    return measure(lambda: compute_charts(batch), 1, opts.repeat, items=len(batch))
+
+
+def bench_yogas(opts):
+    charts = chart_objects(list(itertools.islice(births(opts.seed), opts.batch)))
+    records = Chart.records([c['chart'] for c in charts])
+    return measure(lambda: record_yogas(records), 1, opts.repeat, items=len(records))
+
+
+def bench_serialize(opts):
+    """JSON encoding of annotated charts, the way Flask's jsonify writes them (compact, sorted keys)"""
+    charts = render_with_yogas(chart_objects(list(itertools.islice(births(opts.seed), opts.batch))))
+    encode = lambda: json.dumps({'charts': charts, 'errors': 0}, separators=(',', ':'), sort_keys=True)
+    result = measure(encode, 1, opts.repeat, items=len(charts))
+    result['bytes_per_chart'] = round(len(encode().encode()) / len(charts))
+    return result
+
+
+def bench_packed(opts):
+    """Birth data to packed records (wire.py): the binary path's batch_d1 + yogas + serialize_json"""
+    from wire import chart_records, encode_packed
+    batch = list(itertools.islice(births(opts.seed), opts.batch))
+    encode = lambda: encode_packed(*chart_records(batch))
+    result = measure(encode, 1, opts.repeat, items=len(batch))
+    result['bytes_per_chart'] = round(len(encode()) / len(batch))
+    return result
+
+
+def bench_api_kundli(opts):
+    """POST /api/kundli through the Flask test client: chart, yogas, dataset slice and serialization"""
+    import app
+    client = app.app.test_client()
+    source = births(opts.seed)
+
+    def op():
+        resp = client.post('/api/kundli', json=next(source))
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    return measure(op, opts.number, opts.repeat)
+
+
+def _prompt_requests(opts, n: int) -> list:
+    charts = compute_charts(list(itertools.islice(births(opts.seed), n)))
+    return [{'question': 'What does my chart say about my career?', 'user_name': 'Asha',
+             'kundli_data': {'asc_sign': c['asc_sign'], 'chart_type': 'D1', 'sign_planets': c['sign_planets'],
+                             'house_descriptions': c['house_descriptions']}} for c in charts]
+
+
+def bench_ai_prompt(opts):
+    from ai import build_prompt
+    requests = itertools.cycle(_prompt_requests(opts, 100))
+    return measure(lambda: build_prompt(next(requests)), opts.number, opts.repeat)
+
+
+def bench_ai_answer_stub(opts):
+    """build_prompt() and answer() against a local stub model with no delay: our overhead per question"""
+    from ai import TEXT_PARAMS, CHAT_PARAMS, answer, build_prompt
+    from inference import InferenceProvider
+    from stub_model import serve
+    stub = serve()
+    try:
+        provider = InferenceProvider(f'http://127.0.0.1:{stub.server_port}', text_params=TEXT_PARAMS,
+                                     chat_params=CHAT_PARAMS)
+        requests = itertools.cycle(_prompt_requests(opts, 20))
+
+        def op():
+            assert answer(build_prompt(next(requests)), provider), 'stub model gave no answer'
+        return measure(op, max(1, opts.number // 5), opts.repeat)
+    finally:
+        stub.shutdown()
+        stub.server_close()
+
+
+BENCHMARKS = {
+    'chart_single_d1': bench_chart_single('d1'),
+    'chart_single_d9': bench_chart_single('d9'),
+    'batch_d1': bench_batch('d1'),
+    'batch_d9': bench_batch('d9'),
+    'batch_d1_d9': bench_batch_d1_d9,
+    'yogas': bench_yogas,
+    'serialize_json': bench_serialize,
+    'packed': bench_packed,
+    'api_kundli': bench_api_kundli,
+    'ai_prompt': bench_ai_prompt,
+    'ai_answer_stub': bench_ai_answer_stub,
+}
+
+
+def _commit() -> str:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=10,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def machine() -> dict:
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count()}
+
+
+def run(names, opts, log=sys.stderr) -> dict:
+    results = {}
+    for name in names:
+        started = time.perf_counter()
+        results[name] = BENCHMARKS[name](opts)
+        if log:
+            r = results[name]
+            print(f"{name:<16} {r['median'] * 1000:10.4f} ms/item  {r['items_per_second']:>10} items/s  "
+                  f"({time.perf_counter() - started:.1f}s)", file=log)
+    return {'version': RESULTS_VERSION, 'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'commit': _commit(), 'machine': machine(),
+            'options': {'seed': opts.seed, 'number': opts.number, 'repeat': opts.repeat, 'batch': opts.batch,
+                        'ephemeris': bool(opts.ephemeris)},
+            'benchmarks': results}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Rows (name, baseline median, current median, ratio, regressed) for benchmarks present in both"""
+    rows = []
+    for name, result in current['benchmarks'].items():
+        base = baseline.get('benchmarks', {}).get(name)
+        if not base:
+            continue
+        ratio = result['median'] / base['median'] if base['median'] else float('inf')
+        rows.append((name, base['median'], result['median'], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the chart pipeline and AI path')
+    parser.add_argument('--only', default='', help=f"comma-separated benchmarks (default all: {', '.join(BENCHMARKS)})")
+    parser.add_argument('--out', default='bench_results.json', help='where to write the results JSON')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='fail when a median is this fraction slower than the baseline (default 0.10)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--number', type=int, default=200, help='calls per sample for per-call benchmarks')
+    parser.add_argument('--repeat', type=int, default=7, help='timed samples per benchmark')
+    parser.add_argument('--batch', type=int, default=1000, help='births per batch for batch benchmarks')
+    parser.add_argument('--quick', action='store_true', help='fewer, smaller samples for a fast smoke run')
+    parser.add_argument('--ephemeris', help='precomputed ephemeris file to read positions from')
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.number, args.repeat, args.batch = 20, 3, 200
+    names = [n for n in args.only.split(',') if n] or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f'bench: cannot read baseline: {e}', file=sys.stderr)
+            return 2
+    if args.ephemeris:
+        from ephemeris_store import EphemerisStore
+        use_ephemeris_store(EphemerisStore(args.ephemeris))
+
+    results = run(names, args)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results -> {args.out}', file=sys.stderr)
+    if baseline is None:
+        return 0
+
+    if baseline.get('machine') != results['machine']:
+        print('bench: warning: the baseline was recorded on a different machine or environment', file=sys.stderr)
+    if baseline.get('options') != results['options']:
+        print('bench: warning: the baseline used different options', file=sys.stderr)
+    rows = compare(results, baseline, args.threshold)
+    print(f"\n{'benchmark':<16} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for name, base, current, ratio, regressed in rows:
+        print(f"{name:<16} {base * 1000:12.4f} {current * 1000:12.4f} {ratio - 1:+8.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}: "
+              f"{', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Offline bulk charting: births in, charts out, spread across a process pool.
+
+    python bulk.py births.csv --out charts.jsonl --workers 8
+    python bulk.py births.jsonl --out charts/ --format parquet --charts D1,D9 --resume
+
+Input is CSV (a header row with date, time, lat, lon, tz and optionally chart_type) or JSONL (one birth object
+per line, the /api/kundli request shape). It is read as a stream and cut into chunks of --chunk births. Each chunk
+goes through chart_objects() and render_with_yogas() in a worker process, the same path as /api/kundli/batch, so
+the charts are identical to the API's. Results are written in input order as they complete. JSONL output has
+one chart (or {"error": ...}) per line. Parquet output is a directory with one part file per chunk and requires
+pyarrow.
+
+After every written chunk, <out>.checkpoint records how many births are done. --resume continues from there:
+it drops any output past the checkpoint and skips births already written.
+"""
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import deque
+
+from chart_core import chart_objects, use_ephemeris_store
+from yogas import render_with_yogas
+
+CHECKPOINT_VERSION = 1
+
+
+def read_births(path: str, skip: int = 0):
+    """Birth dicts from a CSV or JSONL file, lazily, starting after the first `skip`"""
+    with open(path, newline='') as f:
+        if path.endswith(('.jsonl', '.ndjson', '.json')):
+            rows = (json.loads(line) if line.strip() else {} for line in f)
+        else:
+            # Empty cells count as missing, so an empty chart_type falls back to the default
+            rows = ({k: v for k, v in row.items() if v not in ('', None)} for row in csv.DictReader(f))
+        yield from itertools.islice(rows, skip, None)
+
+
+def chunked(rows, size: int):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(ephemeris_path):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is handled by the parent, which stops the pool
+    if ephemeris_path:
+        from ephemeris_store import EphemerisStore
+        use_ephemeris_store(EphemerisStore(ephemeris_path))
+
+
+def chart_chunk(births: list, charts=None) -> list:
+    """JSON text of each birth's chart, as /api/kundli/batch would return it"""
+    if charts:
+        births = [dict(b, charts=charts) if isinstance(b, dict) else b for b in births]
+    return [json.dumps(c, sort_keys=True) for c in render_with_yogas(chart_objects(births))]
+
+
+class JsonlWriter:
+    def __init__(self, path: str, resume_bytes=None):
+        self.path = path
+        self.f = open(path, 'r+b' if resume_bytes is not None else 'wb')
+        if resume_bytes is not None:
+            self.f.truncate(resume_bytes)
+            self.f.seek(resume_bytes)
+
+    def write(self, first: int, lines: list):
+        self.f.write(''.join(line + '\n' for line in lines).encode())
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def position(self) -> int:
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetWriter:
+    """One part file per chunk, named by the index of its first birth, with columns index, asc_sign, error
+    and chart (the JSON text)"""
+
+    def __init__(self, path: str, resume_bytes=None):
+        try:
+            import pyarrow  # noqa: F401  (fail before any work is done)
+        except ImportError:
+            raise ImportError('parquet output needs pyarrow (pip install pyarrow)') from None
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def write(self, first: int, lines: list):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        charts = [json.loads(line) for line in lines]
+        table = pa.table({
+            'index': pa.array(range(first, first + len(lines)), pa.int64()),
+            'asc_sign': [c.get('asc_sign') for c in charts],
+            'error': [c.get('error') for c in charts],
+            'chart': lines,
+        })
+        tmp = os.path.join(self.path, f'.part-{first:012d}.parquet')
+        pq.write_table(table, tmp)
+        os.replace(tmp, os.path.join(self.path, f'part-{first:012d}.parquet'))
+
+    def position(self) -> int:
+        return 0
+
+    def close(self):
+        pass
+
+
+def load_checkpoint(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, state: dict):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def run(src: str, out: str, fmt: str = 'jsonl', workers: int = None, chunk: int = 500, charts=None,
+        resume: bool = False, ephemeris: str = None, progress_every: float = 5.0, log=sys.stderr) -> dict:
+    """Chart every birth in src into out; returns the final progress counters"""
+    workers = workers or os.cpu_count() or 1
+    checkpoint_path = out.rstrip('/') + '.checkpoint'
+    state = load_checkpoint(checkpoint_path) if resume else None
+    if state and (state.get('input') != os.path.abspath(src) or state.get('format') != fmt):
+        raise ValueError(f'{checkpoint_path} belongs to {state.get("input")} ({state.get("format")}), not {src}')
+    done = state['done'] if state else 0
+    errors = state.get('errors', 0) if state else 0
+    writer = (ParquetWriter if fmt == 'parquet' else JsonlWriter)(out, state['bytes'] if state else None)
+
+    started = time.monotonic()
+    last_report = started
+    written = 0
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(ephemeris,))
+    try:
+        # Up to two chunks per worker in flight; results are collected in submission (input) order
+        pending = deque()
+        chunks = chunked(read_births(src, done), chunk)
+        for births in itertools.chain(chunks, [None]):
+            if births is not None:
+                pending.append(pool.apply_async(chart_chunk, (births, charts)))
+                if len(pending) < 2 * workers:
+                    continue
+            while pending and (births is None or len(pending) >= 2 * workers):
+                lines = pending.popleft().get()
+                writer.write(done, lines)
+                done += len(lines)
+                written += len(lines)
+                errors += sum(line.startswith('{"error"') for line in lines)
+                save_checkpoint(checkpoint_path, {'version': CHECKPOINT_VERSION, 'input': os.path.abspath(src),
+                                                  'format': fmt, 'done': done, 'errors': errors,
+                                                  'bytes': writer.position()})
+                now = time.monotonic()
+                if log and now - last_report >= progress_every:
+                    last_report = now
+                    print(f'{done} charts ({errors} errors), {written / (now - started):.0f} charts/s', file=log)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        writer.close()
+    elapsed = time.monotonic() - started
+    stats = {'done': done, 'written': written, 'errors': errors, 'seconds': round(elapsed, 2),
+             'charts_per_second': round(written / elapsed, 1) if elapsed else 0.0}
+    if log:
+        print(f"{written} charts written in {elapsed:.1f}s ({stats['charts_per_second']} charts/s, "
+              f"{done} total, {errors} errors) -> {out}", file=log)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute charts for a CSV or JSONL file of births')
+    parser.add_argument('input', help='CSV with a header row, or JSONL (.jsonl/.ndjson)')
+    parser.add_argument('--out', required=True, help='JSONL file, or a directory for parquet')
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes (default: all cores)')
+    parser.add_argument('--chunk', type=int, default=500, help='births per work unit')
+    parser.add_argument('--charts', default='', help="divisional charts for every birth, e.g. 'D1,D9'")
+    parser.add_argument('--ephemeris', help='precomputed ephemeris file to read positions from')
+    parser.add_argument('--resume', action='store_true', help='continue from <out>.checkpoint')
+    parser.add_argument('--progress-every', type=float, default=5.0, help='seconds between progress lines')
+    args = parser.parse_args(argv)
+    charts = [c for c in args.charts.split(',') if c] or None
+    try:
+        run(args.input, args.out, args.format, args.workers, args.chunk, charts, args.resume, args.ephemeris,
+            args.progress_every)
+    except (OSError, ValueError, ImportError) as e:
+        print(f'bulk: {e}', file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print('bulk: interrupted; run again with --resume to continue', file=sys.stderr)
+        return 130
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,578 @@
+import sys
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import swisseph as swe
+
+from aspects import ASPECT_RULES, aspect_table, house_aspects
+from metrics import stage
+from varga import parse_division, varga_longitudes
+
+# Sign info
+SIGNS = ['Aries','Taurus','Gemini','Cancer','Leo','Virgo','Libra','Scorpio',
+         'Sagittarius','Capricorn','Aquarius','Pisces']
+
+NAKSHATRAS = ['Ashwini', 'Bharani', 'Krittika', 'Rohini', 'Mrigashira', 'Ardra', 'Punarvasu', 'Pushya', 'Ashlesha',
+              'Magha', 'Purva Phalguni', 'Uttara Phalguni', 'Hasta', 'Chitra', 'Swati', 'Vishakha', 'Anuradha',
+              'Jyeshtha', 'Mula', 'Purva Ashadha', 'Uttara Ashadha', 'Shravana', 'Dhanishta', 'Shatabhisha',
+              'Purva Bhadrapada', 'Uttara Bhadrapada', 'Revati']
+NAKSHATRA_SPAN = 360 / 27  # 13°20'
+
+# Planets computed by swisseph (Ketu is derived from Rahu)
+PLANETS = {
+    'Su': swe.SUN, 'Mo': swe.MOON, 'Ma': swe.MARS,
+    'Me': swe.MERCURY, 'Ju': swe.JUPITER, 'Ve': swe.VENUS,
+    'Sa': swe.SATURN, 'Ra': swe.MEAN_NODE,
+    'Ur': swe.URANUS, 'Ne': swe.NEPTUNE, 'Pl': swe.PLUTO
+}
+# Column order of every per-planet array below
+BODIES = list(PLANETS) + ['Ke']
+BODY_INDEX = {name: i for i, name in enumerate(BODIES)}
+PLANET_FULL_NAMES = {
+    'Su': 'Sun', 'Mo': 'Moon', 'Ma': 'Mars', 'Me': 'Mercury', 'Ju': 'Jupiter', 'Ve': 'Venus',
+    'Sa': 'Saturn', 'Ra': 'Rahu', 'Ke': 'Ketu', 'Ur': 'Uranus', 'Ne': 'Neptune', 'Pl': 'Pluto'
+}
+
+# Chart settings. Both are part of the chart cache key, so charts computed under other settings never collide
+HOUSE_SYSTEM = b'P'  # Placidus
+SID_MODE = swe.SIDM_FAGAN_BRADLEY  # swisseph's default sidereal mode, which get_ayanamsa() uses unless set
+# Ayanamsas a request may choose with 'ayanamsa'; SID_MODE is the default
+AYANAMSAS = {
+    'fagan_bradley': swe.SIDM_FAGAN_BRADLEY, 'lahiri': swe.SIDM_LAHIRI, 'raman': swe.SIDM_RAMAN,
+    'krishnamurti': swe.SIDM_KRISHNAMURTI, 'yukteshwar': swe.SIDM_YUKTESHWAR, 'true_chitra': swe.SIDM_TRUE_CITRA,
+}
+
+# Exaltation/Debility info
+EXALTATION_DEBILITATION = {
+    'Su': [('Aries', 10), ('Libra', 10)],
+    'Mo': [('Taurus', 3), ('Scorpio', 3)],
+    'Ma': [('Capricorn', 28), ('Cancer', 28)],
+    'Me': [('Virgo', 15), ('Pisces', 15)],
+    'Ju': [('Cancer', 5), ('Capricorn', 5)],
+    'Ve': [('Pisces', 27), ('Virgo', 27)],
+    'Sa': [('Libra', 20), ('Aries', 20)],
+}
+
+# Sign lords (traditional rulership)
+SIGN_RULERS = {
+    'Aries': 'Ma', 'Taurus': 'Ve', 'Gemini': 'Me', 'Cancer': 'Mo',
+    'Leo': 'Su', 'Virgo': 'Me', 'Libra': 'Ve', 'Scorpio': 'Ma',
+    'Sagittarius': 'Ju', 'Capricorn': 'Sa', 'Aquarius': 'Sa', 'Pisces': 'Ju'
+}
+
+# Natural friendship between planets
+PLANET_FRIENDS = {
+    'Su': {'friends': ['Mo', 'Ma', 'Ju'], 'enemies': ['Sa', 'Ve'], 'neutral': ['Me']},
+    'Mo': {'friends': ['Su', 'Me'], 'enemies': ['Ra', 'Ke'], 'neutral': ['Ma', 'Ju', 'Ve', 'Sa']},
+    'Ma': {'friends': ['Su', 'Mo', 'Ju'], 'enemies': ['Me'], 'neutral': ['Ve', 'Sa']},
+    'Me': {'friends': ['Su', 'Ve'], 'enemies': ['Mo'], 'neutral': ['Ma', 'Ju', 'Sa']},
+    'Ju': {'friends': ['Su', 'Mo', 'Ma'], 'enemies': ['Ve', 'Me'], 'neutral': ['Sa']},
+    'Ve': {'friends': ['Me', 'Sa'], 'enemies': ['Su', 'Mo'], 'neutral': ['Ma', 'Ju']},
+    'Sa': {'friends': ['Me', 'Ve'], 'enemies': ['Su', 'Mo'], 'neutral': ['Ma', 'Ju']},
+    'Ra': {'friends': [], 'enemies': [], 'neutral': []},
+    'Ke': {'friends': [], 'enemies': [], 'neutral': []},
+}
+
+# Combustion orbits (approximate, in degrees)
+COMBUST_ORBITS = {
+    'Mo': 12, 'Ma': 17, 'Me': 14, 'Ju': 11, 'Ve': 10, 'Sa': 15
+}
+
+BENEFICS = ['Ju', 'Ve', 'Mo']
+MALEFICS = ['Ma', 'Sa', 'Ra', 'Ke']
+
+# House descriptions
+HOUSE_DESCRIPTIONS = {
+    1: "Self, personality, appearance, health, vitality",
+    2: "Wealth, family, speech, face, right eye, food habits",
+    3: "Siblings, courage, short journeys, communication, hands",
+    4: "Mother, home, property, vehicles, comfort, happiness",
+    5: "Children, intelligence, creativity, romance, speculation",
+    6: "Enemies, diseases, debts, obstacles, service, pets",
+    7: "Spouse, marriage, partnerships, business, foreign travel",
+    8: "Longevity, death, transformation, occult, inheritance",
+    9: "Father, guru, religion, higher education, fortune",
+    10: "Career, profession, authority, government, reputation",
+    11: "Income, gains, elder siblings, friends, social circle",
+    12: "Expenses, losses, foreign lands, spirituality, sleep"
+}
+
+# Planet status bitflags
+EXALTED = 1
+DEBILITATED = 2
+PEAK = 4
+COMBUST = 8
+RETROGRADE = 16
+STATUS_FLAGS = [('exalted', EXALTED), ('debilitated', DEBILITATED), ('peak', PEAK),
+                ('combust', COMBUST), ('retrograde', RETROGRADE)]
+
+# Per-body lookup tables built once from the dicts above (-1 / 0 == not applicable)
+_EXALT_SIGN = np.array([SIGNS.index(EXALTATION_DEBILITATION[b][0][0]) if b in EXALTATION_DEBILITATION else -1 for b in BODIES])
+_EXALT_DEG = np.array([EXALTATION_DEBILITATION[b][0][1] if b in EXALTATION_DEBILITATION else 0 for b in BODIES], dtype=float)
+_DEBIL_SIGN = np.array([SIGNS.index(EXALTATION_DEBILITATION[b][1][0]) if b in EXALTATION_DEBILITATION else -1 for b in BODIES])
+_DEBIL_DEG = np.array([EXALTATION_DEBILITATION[b][1][1] if b in EXALTATION_DEBILITATION else 0 for b in BODIES], dtype=float)
+_COMBUST_ORBIT = np.array([COMBUST_ORBITS.get(b, 0) if b != 'Su' else 0 for b in BODIES], dtype=float)
+
+# Planet strength in a house: (normal, exalted, debilitated)
+_STRENGTH_TABLE = {'benefic': (0.8, 1.5, -0.5), 'malefic': (-0.8, 0.5, -1.5), 'neutral': (0.2, 1.0, -1.0)}
+
+
+def planet_nature(name: str) -> str:
+    if name in BENEFICS:
+        return 'benefic'
+    if name in MALEFICS:
+        return 'malefic'
+    return 'neutral'
+
+
+_BASE_STRENGTH = np.array([[_STRENGTH_TABLE[planet_nature(b)][k] for b in BODIES] for k in range(3)])
+# aspect mask [body, house offset] and aspect strength per body
+_ASPECT_MASK = aspect_table(BODIES, ASPECT_RULES)
+_ASPECT_STRENGTH = np.array([0.3 if planet_nature(b) == 'benefic' else -0.3 if planet_nature(b) == 'malefic' else 0
+                             for b in BODIES], dtype=float)
+
+_J1970 = 2440587.5  # Julian day of 1970-01-01T00:00 UTC
+
+
+def zodiac_sign(deg): return SIGNS[int(deg // 30) % 12]
+
+
+def parse_ayanamsa(name) -> int:
+    """'lahiri' / 'Lahiri' -> swisseph sidereal mode; None means SID_MODE"""
+    if name is None:
+        return SID_MODE
+    try:
+        return AYANAMSAS[str(name).lower()]
+    except KeyError:
+        raise ValueError(f"unknown ayanamsa '{name}' (supported: {', '.join(AYANAMSAS)})") from None
+
+
+def parse_clock(text: str) -> int:
+    """Minutes after midnight from local 'HH:MM'"""
+    hour, minute = map(int, text.split(':'))
+    if not 0 <= hour < 24:
+        raise ValueError('hour must be in 0..23')
+    if not 0 <= minute < 60:
+        raise ValueError('minute must be in 0..59')
+    return hour * 60 + minute
+
+
+def parse_birth(data: dict) -> dict:
+    """Validate one birth record from a request body"""
+    y, m, d = map(int, data['date'].split('-'))       # 'YYYY-MM-DD'
+    division = parse_division(data.get('chart_type', 'regular'))  # 'regular' (D1), 'd9', 'D10', ...
+    # Extra divisional charts computed from the same ephemeris, e.g. charts=['D9', 'D10']
+    charts = data.get('charts') or []
+    if not isinstance(charts, list):
+        raise ValueError("charts must be a list like ['D9', 'D10']")
+    charts = list(dict.fromkeys(parse_division(c) for c in charts))
+    return {
+        'date': np.datetime64(f'{y:04d}-{m:02d}-{d:02d}', 'D'),
+        'minutes': parse_clock(data['time']),
+        'lat': float(data['lat']),
+        'lon': float(data['lon']),
+        'tz': float(data['tz']),  # e.g. 5.5
+        'division': division,
+        'charts': charts,
+        'sid_mode': parse_ayanamsa(data.get('ayanamsa')),
+    }
+
+
+def julian_days(dates: np.ndarray, minutes: np.ndarray, tz_hours: np.ndarray) -> np.ndarray:
+    """UT Julian days for local dates/minutes, truncated to the whole UTC minute like swe.julday(h + m/60)"""
+    days = (dates - np.datetime64('1970-01-01', 'D')).astype(np.int64)
+    utc_minutes = np.floor(days * 1440 + minutes - tz_hours * 60)
+    return _J1970 + utc_minutes / 1440
+
+
+def utc_julian_days(times: np.ndarray) -> np.ndarray:
+    """UT Julian days for an array of UTC datetime64 values"""
+    minutes = (np.asarray(times, dtype='datetime64[s]') - np.datetime64('1970-01-01T00:00', 's')) / np.timedelta64(60, 's')
+    return _J1970 + minutes / 1440
+
+
+# Optional precomputed ephemeris (ephemeris_store.EphemerisStore); None computes everything live
+_ephemeris_store = None
+
+
+def use_ephemeris_store(store):
+    """Answer position queries from store (interpolated) instead of live swisseph; None switches back"""
+    global _ephemeris_store
+    _ephemeris_store = store
+
+
+def julian_day_to_utc(jds) -> np.ndarray:
+    """datetime64[s] UTC for Julian days (inverse of utc_julian_days)"""
+    seconds = np.round((np.asarray(jds, dtype=float) - _J1970) * 86400).astype(np.int64)
+    return np.datetime64('1970-01-01T00:00:00', 's') + seconds.astype('timedelta64[s]')
+
+
+# swisseph keeps the sidereal mode as library state: process-wide, or per thread when built with thread-local
+# storage. Every call that depends on it runs inside swiss_session(), which holds this lock and sets the mode
+# on entry, so the result is the same under either build. Setting it costs far less than one position.
+_swe_lock = threading.RLock()
+# Rows computed per hold of the lock. Batches release it between chunks, so a single chart in another thread
+# waits for one chunk (about 15 ms) rather than for the whole batch.
+SWISS_CHUNK_ROWS = 32
+
+
+@contextmanager
+def swiss_session(sid_mode: int = SID_MODE):
+    """Exclusive use of swisseph with the given sidereal mode for the duration of the block"""
+    with _swe_lock:
+        swe.set_sid_mode(sid_mode)
+        yield
+
+
+def swiss_ayanamsa(jds: np.ndarray, sid_mode: int = SID_MODE) -> np.ndarray:
+    out = []
+    for first in range(0, len(jds), SWISS_CHUNK_ROWS):
+        with swiss_session(sid_mode):
+            out.extend(swe.get_ayanamsa(jd) for jd in jds[first:first + SWISS_CHUNK_ROWS])
+    return np.array(out, dtype=float)
+
+
+def sidereal_positions(jds: np.ndarray, bodies=BODIES, sid_mode: int = SID_MODE):
+    """Sidereal positions from the precomputed ephemeris store when one is loaded, else from swisseph.
+
+    Same return value as swiss_positions().
+    """
+    if _ephemeris_store is not None:
+        return _ephemeris_store.sidereal_positions(jds, bodies, sid_mode)
+    return swiss_positions(jds, bodies, sid_mode)
+
+
+def swiss_positions(jds: np.ndarray, bodies=BODIES, sid_mode: int = SID_MODE):
+    """Sidereal longitudes and speeds for bodies (default BODIES), plus the ayanamsa, for each Julian day, from swisseph.
+
+    Returns (lons[N, len(bodies)], speeds[N, len(bodies)], ayanamsa[N], errors) where errors maps row -> message.
+    Ketu is derived from Rahu and, as in the charts, reported with zero speed.
+    """
+    calc = [b for b in bodies if b != 'Ke']
+    if 'Ke' in bodies and 'Ra' not in calc:
+        calc.append('Ra')
+    col = {b: j for j, b in enumerate(calc)}
+    n = len(jds)
+    raw_lons = np.zeros((n, len(calc)))
+    raw_speeds = np.zeros((n, len(calc)))
+    ayanamsa = np.zeros(n)
+    errors = {}
+    for first in range(0, n, SWISS_CHUNK_ROWS):
+        with swiss_session(sid_mode):
+            for i in range(first, min(first + SWISS_CHUNK_ROWS, n)):
+                jd = jds[i]
+                try:
+                    ayanamsa[i] = swe.get_ayanamsa(jd)
+                    for j, name in enumerate(calc):
+                        res = swe.calc_ut(jd, PLANETS[name])[0]
+                        raw_lons[i, j] = res[0]
+                        raw_speeds[i, j] = res[3]
+                except swe.Error as e:
+                    errors[i] = str(e)
+    raw_lons = (raw_lons - ayanamsa[:, None]) % 360
+    lons = np.zeros((n, len(bodies)))
+    speeds = np.zeros((n, len(bodies)))
+    for j, name in enumerate(bodies):
+        if name == 'Ke':
+            lons[:, j] = (raw_lons[:, col['Ra']] + 180) % 360
+        else:
+            lons[:, j] = raw_lons[:, col[name]]
+            speeds[:, j] = raw_speeds[:, col[name]]
+    return lons, speeds, ayanamsa, errors
+
+
+def ascendants(jds: np.ndarray, lats: np.ndarray, lons: np.ndarray, ayanamsa: np.ndarray) -> np.ndarray:
+    """Sidereal ascendant longitude (Placidus) for each row.
+
+    The house system is an argument of each swisseph call rather than global state, so this needs no session.
+    """
+    asc = np.array([swe.houses(jd, lat, lon, HOUSE_SYSTEM)[1][0] for jd, lat, lon in zip(jds, lats, lons)], dtype=float)
+    return (asc - ayanamsa) % 360
+
+
+def classify_status(lons: np.ndarray, speeds: np.ndarray) -> np.ndarray:
+    """Status bitflags (EXALTED, DEBILITATED, PEAK, COMBUST, RETROGRADE) per planet"""
+    sign_idx = (lons // 30).astype(int) % 12
+    deg_in_sign = lons % 30
+    exalted = sign_idx == _EXALT_SIGN
+    debilitated = ~exalted & (sign_idx == _DEBIL_SIGN)
+    peak = (exalted & (np.abs(deg_in_sign - _EXALT_DEG) <= 5)) | (debilitated & (np.abs(deg_in_sign - _DEBIL_DEG) <= 5))
+    sun_deg = lons[..., BODY_INDEX['Su'], None]
+    diff = np.abs((lons - sun_deg + 180) % 360 - 180)
+    combust = diff < _COMBUST_ORBIT
+    retrograde = speeds < 0
+    return (exalted * EXALTED | debilitated * DEBILITATED | peak * PEAK
+            | combust * COMBUST | retrograde * RETROGRADE).astype(np.uint8)
+
+
+def house_strength_scores(lons: np.ndarray, flags: np.ndarray, asc: np.ndarray) -> np.ndarray:
+    """Average strength per house [N, 12] from occupying planets and aspects.
+
+    House n's occupants are the planets in the n-th zodiac sign, while aspects are cast from houses counted
+    from the ascendant. Contributions are summed in the same order as the original per-house loop
+    (occupants in BODIES order, then aspects by casting sign and BODIES order) so results are bit-identical.
+    """
+    n = len(lons)
+    sign_idx = (lons // 30).astype(int) % 12
+    asc_idx = (asc // 30).astype(int) % 12
+    houses = np.arange(12)
+
+    base = _BASE_STRENGTH[0] * np.ones_like(lons)
+    base = np.where(flags & EXALTED, _BASE_STRENGTH[1], base)
+    base = np.where(flags & DEBILITATED, _BASE_STRENGTH[2], base)
+    base = np.where(flags & COMBUST, base * 0.5, base)
+    base = np.where(flags & RETROGRADE, base * 0.8, base)
+
+    strength = np.zeros((n, 12))
+    influence = np.zeros((n, 12), dtype=int)
+    for j in range(len(BODIES)):
+        occupied = sign_idx[:, j, None] == houses
+        strength = np.where(occupied, strength + base[:, j, None], strength)
+        influence += occupied
+
+    # hits[n, j, h]: body j (in house planet_house[n, j]) aspects house h
+    planet_house = (sign_idx - asc_idx[:, None]) % 12
+    hits = house_aspects(planet_house, _ASPECT_MASK)
+    order = np.argsort(sign_idx, axis=1, kind='stable')
+    rows = np.arange(n)
+    for k in range(len(BODIES)):
+        j = order[:, k]
+        hit = hits[rows, j]
+        strength = np.where(hit, strength + _ASPECT_STRENGTH[j][:, None], strength)
+        influence += hit
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(influence > 0, strength / np.maximum(influence, 1), 0.0)
+
+
+def strength_label(avg_strength: float) -> dict:
+    if avg_strength >= 0.2:
+        return {'strength': 'strong', 'color': '#90EE90'}
+    elif avg_strength <= -0.2:
+        return {'strength': 'weak', 'color': '#FFB6C1'}
+    return {'strength': 'neutral', 'color': '#FFD700'}
+
+
+def status_names(flags: int) -> list:
+    return [name for name, bit in STATUS_FLAGS if flags & bit]
+
+
+_STATUS_NAMES = [tuple(status_names(bits)) for bits in range(256)]  # status names for every uint8 of flags
+
+
+def render_chart(lons: np.ndarray, flags: np.ndarray, asc: float, strengths: np.ndarray) -> dict:
+    """JSON shape returned by /api/kundli for one computed chart"""
+    sign_planets = {sign: [] for sign in SIGNS}
+    positions = {}
+    for name, deg, bits in zip(BODIES, np.asarray(lons, dtype=float).tolist(), np.asarray(flags).tolist()):
+        sign = SIGNS[int(deg // 30) % 12]
+        positions[name] = deg
+        sign_planets[sign].append({
+            'name': name,
+            'deg': round(deg % 30, 1),
+            'sign': sign,
+            'status': list(_STATUS_NAMES[bits])
+        })
+    return {
+        'sign_planets': sign_planets,
+        'positions': positions,
+        'asc_sign': zodiac_sign(float(asc)),
+        'house_descriptions': HOUSE_DESCRIPTIONS,
+        'house_strengths': {h + 1: strength_label(x) for h, x in enumerate(np.asarray(strengths).tolist())},
+    }
+
+
+# One divisional chart as a fixed-size record, and a batch of charts as an array of them
+CHART_DTYPE = np.dtype([
+    ('division', 'u1'),                  # 1 for D1, 9 for D9, ...
+    ('asc', '<f8'),                      # sidereal ascendant longitude in this division
+    ('lon', '<f8', (len(BODIES),)),      # sidereal longitudes in BODIES order
+    ('speed', '<f8', (len(BODIES),)),    # degrees per day (of the D1 body in every division)
+    ('sign', 'u1', (len(BODIES),)),      # 0 = Aries
+    ('house', 'u1', (len(BODIES),)),     # 1-12, whole sign from the ascendant
+    ('flags', 'u1', (len(BODIES),)),     # status bits, see STATUS_FLAGS
+    ('strength', '<f8', (12,)),          # average strength per house, houses 1-12 by sign from Aries
+])
+
+
+def division_records(points: np.ndarray, speeds: np.ndarray, n: int) -> np.ndarray:
+    """CHART_DTYPE records of the D-n charts of birth_points() rows"""
+    v_lons, v_asc, flags, strengths = division_arrays(points, speeds, n)
+    sign = (v_lons // 30).astype(int) % 12
+    rec = np.zeros(len(v_lons), CHART_DTYPE)
+    rec['division'] = n
+    rec['asc'] = v_asc
+    rec['lon'] = v_lons
+    rec['speed'] = speeds
+    rec['sign'] = sign
+    rec['house'] = (sign - (v_asc // 30).astype(int)[:, None] % 12) % 12 + 1
+    rec['flags'] = flags
+    rec['strength'] = strengths
+    return rec
+
+
+class Chart:
+    """One computed divisional chart, held as a single CHART_DTYPE record.
+
+    This is what the chart cache keeps and what the store and yoga scans read; the /api/kundli dict is
+    rendered from it only when a response needs one.
+    """
+    __slots__ = ('record',)
+
+    def __init__(self, record):
+        self.record = np.array(record, dtype=CHART_DTYPE)  # a copy, so a cached chart never holds on to its batch
+
+    division = property(lambda self: int(self.record['division']))
+    asc = property(lambda self: float(self.record['asc']))
+    asc_sign = property(lambda self: int(self.record['asc'] // 30) % 12)
+    lon = property(lambda self: self.record['lon'])
+    speed = property(lambda self: self.record['speed'])
+    sign = property(lambda self: self.record['sign'])
+    house = property(lambda self: self.record['house'])
+    flags = property(lambda self: self.record['flags'])
+    strength = property(lambda self: self.record['strength'])
+
+    def status(self, body: str) -> list:
+        return status_names(int(self.record['flags'][BODY_INDEX[body]]))
+
+    def render(self) -> dict:
+        return render_chart(self.record['lon'], self.record['flags'], self.asc, self.record['strength'])
+
+    @classmethod
+    def from_records(cls, records: np.ndarray) -> list:
+        return [cls(rec) for rec in records]
+
+    @staticmethod
+    def records(charts: list) -> np.ndarray:
+        """The charts as one CHART_DTYPE array"""
+        return np.stack([c.record for c in charts]) if charts else np.zeros(0, CHART_DTYPE)
+
+
+def chart_size(chart: Chart) -> int:
+    """Memory cost of a cached Chart, for LRUCache(sizeof=...)"""
+    return sys.getsizeof(chart) + sys.getsizeof(chart.record)
+
+
+def chart_cache_key(jd: float, birth: dict, division: int, latlon_decimals: int = 4) -> tuple:
+    """Cache key for one divisional chart: UTC Julian day, rounded location, division and chart settings"""
+    return (float(jd), round(birth['lat'], latlon_decimals), round(birth['lon'], latlon_decimals),
+            f'D{division}', birth['sid_mode'], HOUSE_SYSTEM)
+
+
+def birth_points(jds: np.ndarray, births: list):
+    """(points[N, BODIES + ascendant], speeds[N, BODIES], errors) for parsed births at their Julian days.
+
+    Rows listed in errors (row -> message) are zero. There is one ephemeris pass per sidereal mode, and
+    nearly every batch has a single one.
+    """
+    lons = np.zeros((len(jds), len(BODIES)))
+    speeds = np.zeros((len(jds), len(BODIES)))
+    ayanamsa = np.zeros(len(jds))
+    errors = {}
+    modes = np.array([x['sid_mode'] for x in births])
+    for mode in np.unique(modes):
+        sel = np.flatnonzero(modes == mode)
+        with stage('ephemeris'):
+            lons[sel], speeds[sel], ayanamsa[sel], mode_errors = sidereal_positions(jds[sel], sid_mode=int(mode))
+        errors.update({int(sel[k]): msg for k, msg in mode_errors.items()})
+    ok = np.array([k not in errors for k in range(len(jds))], dtype=bool)
+    asc = np.zeros(len(jds))
+    with stage('houses'):
+        asc[ok] = ascendants(jds[ok], np.array([x['lat'] for x in births])[ok],
+                             np.array([x['lon'] for x in births])[ok], ayanamsa[ok])
+    # Planets and the ascendant go through the varga engine together as one array
+    return np.concatenate([lons, asc[:, None]], axis=1), speeds, errors
+
+
+def division_arrays(points: np.ndarray, speeds: np.ndarray, n: int):
+    """(lons[N, BODIES], asc[N], status flags[N, BODIES], house strengths[N, 12]) of the D-n chart"""
+    with stage('varga'):
+        v = varga_longitudes(points, n)
+    v_lons, v_asc = v[:, :-1], v[:, -1]
+    with stage('status'):
+        flags = classify_status(v_lons, speeds)
+    with stage('strength'):
+        strengths = house_strength_scores(v_lons, flags, v_asc)
+    return v_lons, v_asc, flags, strengths
+
+
+def chart_objects(items: list, cache=None, latlon_decimals: int = 4) -> list:
+    """Compute charts for a list of birth dicts in one vectorized pass, as Chart objects.
+
+    Returns one entry per input, in order: {'chart': Chart for its chart_type, 'charts': {'D9': Chart, ...}}
+    ('charts' only when the birth lists extra divisions), or {'error': message} for items that failed.
+    Every division of a birth comes from one ephemeris computation. With an LRUCache, each divisional
+    chart is cached under chart_cache_key(), and births whose charts are all cached make no swisseph calls.
+    """
+    results = [None] * len(items)
+    births = []
+    for i, item in enumerate(items):
+        try:
+            births.append((i, parse_birth(item)))
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            results[i] = {'error': f'invalid birth data: {e!r}'}
+    if not births:
+        return results
+
+    idx = [i for i, _ in births]
+    b = [birth for _, birth in births]
+    jds = julian_days(np.array([x['date'] for x in b]), np.array([x['minutes'] for x in b]),
+                      np.array([x['tz'] for x in b]))
+
+    # Divisional charts per birth, and the ones still to compute
+    wanted = [list(dict.fromkeys([x['division']] + x['charts'])) for x in b]
+    charts = [{} for _ in b]
+    todo = [[] for _ in b]
+    for row, x in enumerate(b):
+        for n in wanted[row]:
+            chart = cache.get(chart_cache_key(jds[row], x, n, latlon_decimals)) if cache is not None else None
+            if chart is None:
+                todo[row].append(n)
+            else:
+                charts[row][n] = chart
+
+    rows = np.array([row for row in range(len(b)) if todo[row]], dtype=int)
+    if len(rows):
+        points, speeds, errors = birth_points(jds[rows], [b[row] for row in rows])
+        for k, msg in errors.items():
+            results[idx[rows[k]]] = {'error': msg}
+        ok = np.array([k not in errors for k in range(len(rows))], dtype=bool)
+        rows, points, speeds = rows[ok], points[ok], speeds[ok]
+        for n in sorted({n for row in rows for n in todo[row]}):
+            sel = np.array([n in todo[row] for row in rows], dtype=bool)
+            records = division_records(points[sel], speeds[sel], n)
+            for row, chart in zip(rows[sel], Chart.from_records(records)):
+                if cache is not None:
+                    cache.put(chart_cache_key(jds[row], b[row], n, latlon_decimals), chart)
+                charts[row][n] = chart
+
+    for row, x in enumerate(b):
+        if results[idx[row]] is not None:
+            continue  # ephemeris error
+        result = {'chart': charts[row][x['division']]}
+        if x['charts']:
+            result['charts'] = {f'D{n}': charts[row][n] for n in x['charts']}
+        results[idx[row]] = result
+    return results
+
+
+def render_objects(results: list) -> list:
+    """chart_objects() results as /api/kundli dicts: the chart of each chart_type, with its divisional charts
+    under result['charts'], and errors as they are
+    """
+    out = list(results)
+    with stage('render'):
+        for i, r in enumerate(results):
+            if 'error' in r:
+                continue
+            result = r['chart'].render()
+            if 'charts' in r:
+                result['charts'] = {name: c.render() for name, c in r['charts'].items()}
+            out[i] = result
+    return out
+
+
+def compute_charts(items: list, cache=None, latlon_decimals: int = 4) -> list:
+    """render_objects(chart_objects(...)): one /api/kundli dict or {'error': message} per birth dict"""
+    return render_objects(chart_objects(items, cache, latlon_decimals))
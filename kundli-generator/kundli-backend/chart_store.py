@@ -0,0 +1,395 @@
+"""Persistent store of computed D1 charts with bitmap indexes for population queries.
+
+    python chart_store.py import births.csv --db charts.sqlite --ref-column user_id
+
+Charts live in a SQLite table, one row per ref (the caller's id for the person), holding the longitudes, signs,
+houses, status flags, house strengths and yogas as packed arrays. Every write takes the next sequence number,
+and each process keeps a ChartIndex that it brings up to date from the rows written since it last looked. So
+all workers of a server see each other's charts, and a restart rebuilds the index from the table. House
+strengths stay in the table only; no query reads them, so the index leaves them out.
+
+The index has a bitmap (one bit per chart) for every (planet, sign), (planet, house), (planet, status) and
+yoga. A query ANDs the bitmaps of its conditions, which for a million charts touches a few hundred kilobytes,
+and then reads the refs of only the page of matches it returns.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+from chart_core import BODIES, BODY_INDEX, PLANET_FULL_NAMES, SIGNS, STATUS_FLAGS, Chart, parse_ayanamsa
+from yogas import YOGAS, yoga_bits
+
+SCHEMA = '''
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS charts (
+    id INTEGER PRIMARY KEY,
+    ref TEXT NOT NULL UNIQUE,
+    seq INTEGER NOT NULL,           -- bumped on every write, so readers can catch up
+    deleted INTEGER NOT NULL DEFAULT 0,
+    stored REAL NOT NULL,
+    sid_mode INTEGER NOT NULL,
+    asc_sign INTEGER NOT NULL,      -- 0 = Aries
+    lon BLOB NOT NULL,              -- float64[12] sidereal longitudes in BODIES order
+    sign BLOB NOT NULL,             -- uint8[12] 0 = Aries
+    house BLOB NOT NULL,            -- uint8[12] 1-12, whole sign from the ascendant
+    flags BLOB NOT NULL,            -- uint8[12] status bits (chart_core.STATUS_FLAGS)
+    strength BLOB NOT NULL,         -- float32[12] house strengths, as in house_strengths
+    yogas INTEGER NOT NULL          -- bit k set when the k-th yoga of yogas.YOGAS is present
+);
+CREATE INDEX IF NOT EXISTS charts_seq ON charts (seq);
+'''
+_NB = len(BODIES)
+# Rows read from SQLite per index update when catching up, which bounds the memory a rebuild needs
+REFRESH_ROWS = 100_000
+_STATUS = {name: k for k, (name, _) in enumerate(STATUS_FLAGS)}
+_STATUS_BITS = np.array([bit for _, bit in STATUS_FLAGS], dtype=np.uint8)
+_YOGA_NAMES = list(YOGAS)
+_PLANET_CODES = {**{b.lower(): b for b in BODIES}, **{name.lower(): b for b, name in PLANET_FULL_NAMES.items()}}
+_SIGN_INDEX = {s.lower(): k for k, s in enumerate(SIGNS)}
+_ONE = np.uint64(1)
+
+
+def _popcount(words: np.ndarray) -> int:
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(words).sum())
+    return int(np.unpackbits(words.view(np.uint8)).sum())
+
+
+def derived(records: np.ndarray) -> dict:
+    """Everything stored for chart records (chart_core.CHART_DTYPE or wire.RECORD_DTYPE), strengths as computed.
+
+    Yogas come from the records' own 'yogas' bits when they carry them (wire records), otherwise they are
+    evaluated here.
+    """
+    lons = records['lon'].astype(float)
+    asc_sign = (records['asc'] // 30).astype(int) % 12
+    sign = (lons // 30).astype(np.uint8) % 12
+    yogas = records['yogas'] if 'yogas' in records.dtype.names else yoga_bits(lons, asc_sign)
+    return {'lon': lons.astype('<f8'), 'sign': sign,
+            'house': ((sign.astype(int) - asc_sign[:, None]) % 12 + 1).astype(np.uint8),
+            'flags': records['flags'].astype(np.uint8), 'asc': asc_sign.astype(np.uint8),
+            'yogas': yogas.astype(np.uint16), 'strength': records['strength'].astype('<f4')}
+
+
+class ChartIndex:
+    """Chart columns and bitmaps in memory, addressed by position (row id - 1)"""
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = 0
+        self.size = 0
+        self._grow(capacity)
+
+    def _grow(self, capacity: int):
+        capacity = -(-capacity // 64) * 64  # whole 64-bit words of bitmap
+        words = capacity // 64
+
+        def widen(old, shape, dtype):
+            new = np.zeros(shape, dtype=dtype)
+            if old is not None:
+                new[tuple(slice(0, n) for n in old.shape)] = old
+            return new
+
+        get = lambda name: getattr(self, name, None)
+        self.lon = widen(get('lon'), (capacity, _NB), '<f8')
+        self.sign = widen(get('sign'), (capacity, _NB), np.uint8)
+        self.house = widen(get('house'), (capacity, _NB), np.uint8)
+        self.flags = widen(get('flags'), (capacity, _NB), np.uint8)
+        self.asc = widen(get('asc'), (capacity,), np.uint8)
+        self.sid_mode = widen(get('sid_mode'), (capacity,), np.int32)
+        self.yogas = widen(get('yogas'), (capacity,), np.uint16)
+        self.alive = widen(get('alive'), (capacity,), bool)
+        self.sign_bits = widen(get('sign_bits'), (_NB, 12, words), np.uint64)
+        self.house_bits = widen(get('house_bits'), (_NB, 12, words), np.uint64)
+        self.status_bits = widen(get('status_bits'), (_NB, len(STATUS_FLAGS), words), np.uint64)
+        self.yoga_bits = widen(get('yoga_bits'), (len(_YOGA_NAMES), words), np.uint64)
+        self.alive_bits = widen(get('alive_bits'), (words,), np.uint64)
+        self.capacity = capacity
+
+    def _mark(self, pos: np.ndarray, on: bool):
+        """Set (or clear) the bits of the charts at pos for their current column values"""
+        word = pos >> 6
+        mask = _ONE << (pos & 63).astype(np.uint64)
+        op, m = (np.bitwise_or, mask) if on else (np.bitwise_and, ~mask)
+        for j in range(_NB):
+            op.at(self.sign_bits[j], (self.sign[pos, j], word), m)
+            op.at(self.house_bits[j], (self.house[pos, j] - 1, word), m)
+            for k, bit in enumerate(_STATUS_BITS):
+                sel = (self.flags[pos, j] & bit) != 0
+                op.at(self.status_bits[j, k], word[sel], m[sel])
+        for k in range(len(_YOGA_NAMES)):
+            sel = (self.yogas[pos] >> k & 1) != 0
+            op.at(self.yoga_bits[k], word[sel], m[sel])
+        op.at(self.alive_bits, word, m)
+
+    def update(self, pos: np.ndarray, alive: np.ndarray, columns: dict):
+        """Write charts at positions; rows with alive False are removed from the bitmaps"""
+        if len(pos) and pos.max() >= self.capacity:
+            self._grow(max(2 * self.capacity, int(pos.max()) + 1))
+        was = pos[self.alive[pos]]
+        if len(was):
+            self._mark(was, False)
+        for name, values in columns.items():
+            getattr(self, name)[pos] = values
+        self.alive[pos] = alive
+        if alive.any():
+            self._mark(pos[alive], True)
+        if len(pos):
+            self.size = max(self.size, int(pos.max()) + 1)
+
+    def select(self, conditions: list) -> np.ndarray:
+        """Bitmap of the live charts matching every condition (see parse_conditions)"""
+        bits = self.alive_bits.copy()
+        for cond in conditions:
+            match = self.alive_bits.copy()
+            j = cond.get('planet')
+            if 'sign' in cond:
+                match &= self.sign_bits[j, cond['sign']]
+            if 'house' in cond:
+                match &= self.house_bits[j, cond['house'] - 1]
+            for k in cond.get('status', []):
+                match &= self.status_bits[j, k]
+            if 'yoga' in cond:
+                match &= self.yoga_bits[cond['yoga']]
+            bits &= ~match if cond.get('not') else match
+        return bits
+
+    def positions(self, bits: np.ndarray, offset: int = 0, limit: int = 100) -> np.ndarray:
+        """Positions of set bits, in row order, from the offset-th match"""
+        found = []
+        wanted = offset + limit
+        # A block of words at a time, so the first pages do not expand the whole bitmap
+        for start in range(0, len(bits), 8192):
+            block = bits[start:start + 8192]
+            if block.any():
+                found.append(np.flatnonzero(np.unpackbits(block.view(np.uint8), bitorder='little')) + start * 64)
+                wanted -= len(found[-1])
+                if wanted <= 0:
+                    break
+        hits = np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+        return hits[offset:offset + limit]
+
+    @staticmethod
+    def count(bits: np.ndarray) -> int:
+        return _popcount(bits)
+
+
+def parse_conditions(where) -> list:
+    """[{planet, sign, house, status, not}, {yoga, not}, ...] with names resolved to indexes.
+
+    A condition on a planet needs at least one of sign (name), house (1-12) and status (a name or a list,
+    all required). A yoga condition names one of yogas.YOGAS. 'not': true negates the condition.
+    """
+    if not isinstance(where, list) or not where:
+        raise ValueError("'where' must be a non-empty list of conditions")
+    parsed = []
+    for cond in where:
+        if not isinstance(cond, dict):
+            raise ValueError(f'a condition must be an object, not {cond!r}')
+        out = {'not': bool(cond.get('not'))}
+        if 'yoga' in cond:
+            if cond['yoga'] not in YOGAS:
+                raise ValueError(f"unknown yoga {cond['yoga']!r}; expected any of {_YOGA_NAMES}")
+            out['yoga'] = _YOGA_NAMES.index(cond['yoga'])
+        if 'planet' in cond:
+            planet = _PLANET_CODES.get(str(cond['planet']).lower())
+            if planet is None:
+                raise ValueError(f"unknown planet {cond['planet']!r}")
+            out['planet'] = BODY_INDEX[planet]
+            if 'sign' in cond:
+                if str(cond['sign']).lower() not in _SIGN_INDEX:
+                    raise ValueError(f"unknown sign {cond['sign']!r}")
+                out['sign'] = _SIGN_INDEX[str(cond['sign']).lower()]
+            if 'house' in cond:
+                if not isinstance(cond['house'], int) or not 1 <= cond['house'] <= 12:
+                    raise ValueError(f"house must be 1-12, not {cond['house']!r}")
+                out['house'] = cond['house']
+            statuses = cond.get('status', [])
+            statuses = [statuses] if isinstance(statuses, str) else statuses
+            unknown = [s for s in statuses if s not in _STATUS]
+            if unknown:
+                raise ValueError(f'unknown status {unknown}; expected any of {list(_STATUS)}')
+            out['status'] = [_STATUS[s] for s in statuses]
+            if not ('sign' in out or 'house' in out or out['status']):
+                raise ValueError('a planet condition needs a sign, house or status')
+        elif 'yoga' not in out:
+            raise ValueError(f'a condition needs a planet or a yoga: {cond!r}')
+        parsed.append(out)
+    return parsed
+
+
+class ChartStore:
+    """Charts in a SQLite file plus this process's ChartIndex over them; safe to share between threads"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+        self.index = ChartIndex()
+        self._seq = 0  # last sequence number applied to the index
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._forget_connections)
+
+    def _forget_connections(self):
+        self._local = threading.local()  # SQLite connections must not be used across fork()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def put(self, refs: list, records: np.ndarray, sid_modes) -> int:
+        """Store (or replace) the D1 chart records of refs; returns how many were written"""
+        if not len(refs):
+            return 0
+        cols = derived(records)
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM charts').fetchone()[0]
+            conn.executemany(
+                'INSERT INTO charts (ref, seq, deleted, stored, sid_mode, asc_sign, lon, sign, house, flags, strength, '
+                'yogas) VALUES (?, ?, 0, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (ref) DO UPDATE SET seq = excluded.seq, '
+                'deleted = 0, stored = excluded.stored, sid_mode = excluded.sid_mode, asc_sign = excluded.asc_sign, '
+                'lon = excluded.lon, sign = excluded.sign, house = excluded.house, flags = excluded.flags, '
+                'strength = excluded.strength, yogas = excluded.yogas',
+                [(str(ref), seq + 1 + k, now, int(mode), int(cols['asc'][k]), cols['lon'][k].tobytes(),
+                  cols['sign'][k].tobytes(), cols['house'][k].tobytes(), cols['flags'][k].tobytes(),
+                  cols['strength'][k].tobytes(), int(cols['yogas'][k]))
+                 for k, (ref, mode) in enumerate(zip(refs, sid_modes))])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return len(refs)
+
+    def put_charts(self, refs: list, charts: list, sid_modes) -> int:
+        """Store D1 Chart objects (chart_objects() results)"""
+        return self.put(refs, Chart.records(charts), sid_modes)
+
+    def put_births(self, refs: list, births: list) -> dict:
+        """Compute and store the D1 chart of each birth; returns {'stored': n, 'errors': {i: message}}"""
+        from wire import chart_records
+        records, errors = chart_records([dict(b, chart_type='regular', charts=[]) if isinstance(b, dict) else b
+                                         for b in births])
+        keep = records['index']
+        modes = [parse_ayanamsa(births[i].get('ayanamsa')) for i in keep]
+        stored = self.put([refs[i] for i in keep], records, modes)
+        return {'stored': stored, 'errors': errors}
+
+    def delete(self, ref: str) -> bool:
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM charts').fetchone()[0]
+            changed = conn.execute('UPDATE charts SET deleted = 1, seq = ? WHERE ref = ? AND NOT deleted',
+                                   (seq + 1, str(ref))).rowcount
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return bool(changed)
+
+    def refresh(self):
+        """Apply rows written since the last refresh, by this or any other process"""
+        blob = lambda values, dtype, width: np.frombuffer(b''.join(values), dtype=dtype).reshape(-1, width)
+        with self._lock:
+            cursor = self._conn().execute(
+                'SELECT id, seq, deleted, sid_mode, asc_sign, lon, sign, house, flags, yogas FROM charts '
+                'WHERE seq > ? ORDER BY seq', (self._seq,))
+            while True:
+                rows = cursor.fetchmany(REFRESH_ROWS)
+                if not rows:
+                    return
+                ids, seqs, deleted, sid_mode, asc, lon, sign, house, flags, yogas = zip(*rows)
+                self.index.update(np.array(ids, dtype=np.int64) - 1, ~np.array(deleted, dtype=bool), {
+                    'sid_mode': np.array(sid_mode, dtype=np.int32), 'asc': np.array(asc, dtype=np.uint8), 'lon': blob(lon, '<f8', _NB),
+                    'sign': blob(sign, np.uint8, _NB), 'house': blob(house, np.uint8, _NB),
+                    'flags': blob(flags, np.uint8, _NB), 'yogas': np.array(yogas, dtype=np.uint16)})
+                self._seq = seqs[-1]
+
+    def query(self, where, offset: int = 0, limit: int = 100) -> dict:
+        """{'total', 'count', 'matches': [{'ref', 'asc_sign', 'positions'}]} for conditions (parse_conditions)"""
+        conditions = parse_conditions(where)
+        self.refresh()
+        with self._lock:
+            bits = self.index.select(conditions)
+            count = self.index.count(bits)
+            total = self.index.count(self.index.alive_bits)
+            pos = self.index.positions(bits, offset, limit)
+            lon = self.index.lon[pos].copy()
+            asc = self.index.asc[pos].copy()
+        refs = self.refs(pos)
+        matches = [{'ref': refs[k], 'asc_sign': SIGNS[asc[k]],
+                    'positions': {b: float(lon[k, j]) for j, b in enumerate(BODIES)}} for k in range(len(pos))]
+        return {'total': total, 'count': count, 'matches': matches}
+
+    def refs(self, pos: np.ndarray) -> list:
+        """Refs of the charts at index positions, in the same order"""
+        if not len(pos):
+            return []
+        ids = pos.astype(np.int64) + 1
+        conn = self._conn()
+        if ids.max() - ids.min() < 4 * len(ids):  # dense, as in a scan: one range read
+            found = dict(conn.execute('SELECT id, ref FROM charts WHERE id BETWEEN ? AND ?',
+                                      (int(ids.min()), int(ids.max()))).fetchall())
+        else:
+            found = {}
+            for k in range(0, len(ids), 500):
+                part = [int(i) for i in ids[k:k + 500]]
+                found.update(conn.execute(f"SELECT id, ref FROM charts WHERE id IN ({','.join('?' * len(part))})",
+                                          part).fetchall())
+        return [found.get(int(i)) for i in ids]
+
+    def scan(self, where=None, chunk: int = 20000):
+        """(refs, lons[n, BODIES], asc_sign[n], sid_mode[n]) for every live chart (or those matching where), in chunks"""
+        conditions = parse_conditions(where) if where else []
+        self.refresh()
+        with self._lock:
+            bits = self.index.select(conditions)
+            pos = np.flatnonzero(np.unpackbits(bits.view(np.uint8), bitorder='little'))
+        for start in range(0, len(pos), chunk):
+            part = pos[start:start + chunk]
+            with self._lock:
+                lons, asc, modes = self.index.lon[part].copy(), self.index.asc[part].copy(), self.index.sid_mode[part].copy()
+            yield self.refs(part), lons, asc, modes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load births into the chart store')
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help='compute and store the D1 chart of every birth in a CSV or JSONL file')
+    imp.add_argument('input', help='CSV with a header row, or JSONL (.jsonl/.ndjson)')
+    imp.add_argument('--db', default='charts.sqlite')
+    imp.add_argument('--ref-column', default='ref', help='column holding each person\'s id (default: row number)')
+    imp.add_argument('--chunk', type=int, default=2000, help='births per transaction')
+    args = parser.parse_args(argv)
+
+    from bulk import chunked, read_births
+    store = ChartStore(args.db)
+    stored = errors = 0
+    started = time.monotonic()
+    try:
+        for n, chunk in enumerate(chunked(read_births(args.input), args.chunk)):
+            refs = [b.get(args.ref_column, str(n * args.chunk + i)) if isinstance(b, dict) else str(n * args.chunk + i)
+                    for i, b in enumerate(chunk)]
+            result = store.put_births(refs, chunk)
+            stored += result['stored']
+            errors += len(result['errors'])
+    except (OSError, ValueError) as e:
+        print(f'chart_store: {e}', file=sys.stderr)
+        return 1
+    print(f'{stored} charts stored ({errors} errors) in {time.monotonic() - started:.1f}s -> {args.db}',
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""Fixtures for the tests: a stub model (stub_model.py) and the Flask app pointed at it"""
+import os
+import time
+
+import pytest
+
+import stub_model
+
+
+@pytest.fixture(scope='session')
+def model_server():
+    server = stub_model.serve()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def stub(model_server):
+    """The shared stub with default behaviour and fresh counters"""
+    model_server.delay = 0.0
+    model_server.fail_rate = 0.0
+    model_server.task = 'both'
+    model_server.token_delay = 0.0
+    model_server.requests = 0
+    model_server.tokens_sent = 0
+    model_server.paths.clear()
+    return model_server
+
+
+@pytest.fixture(scope='session')
+def app_module(model_server):
+    os.environ.update({'HF_MODEL': model_server.url, 'AI_CACHE_DB': '', 'CHART_STORE_DB': ''})
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module, stub, monkeypatch):
+    """Test client with its own provider, answer cache, rate limiter and job queue"""
+    from cache import LRUCache
+    from ai_cache import ResponseCache
+    from inference import CircuitBreaker, InferenceProvider
+    from jobs import JobQueue, RateLimiter
+    monkeypatch.setattr(app_module, 'ai_provider', InferenceProvider(stub.url, timeout=10, breaker=CircuitBreaker()))
+    monkeypatch.setattr(app_module, 'ai_cache', ResponseCache(LRUCache()))
+    monkeypatch.setattr(app_module, 'ai_rate_limiter', RateLimiter(rate=100, burst=100))
+    monkeypatch.setattr(app_module, 'ai_jobs', JobQueue(app_module._run_ai_job, workers=2, max_queue=10))
+    yield app_module.app.test_client()
+    # Jobs a test left behind would reach the stub during the next test
+    jobs = app_module.ai_jobs
+    deadline = time.monotonic() + 10
+    while (jobs.stats()['queue_depth'] or jobs.running) and time.monotonic() < deadline:
+        time.sleep(0.01)
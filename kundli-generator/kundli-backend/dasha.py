@@ -0,0 +1,147 @@
+import numpy as np
+
+from chart_core import (NAKSHATRA_SPAN, NAKSHATRAS, julian_day_to_utc, julian_days, parse_ayanamsa, parse_clock,
+                        sidereal_positions)
+
+# Vimshottari order and period lengths in years (120 in total)
+DASHA_ORDER = ['Ke', 'Ve', 'Su', 'Mo', 'Ma', 'Ra', 'Ju', 'Sa', 'Me']
+DASHA_YEARS = {'Ke': 7, 'Ve': 20, 'Su': 6, 'Mo': 10, 'Ma': 7, 'Ra': 18, 'Ju': 16, 'Sa': 19, 'Me': 17}
+DASHA_TOTAL_YEARS = 120
+YEAR_DAYS = 365.25
+LEVEL_NAMES = ['mahadasha', 'antardasha', 'pratyantardasha', 'sookshma', 'prana']
+MAX_LEVELS = len(LEVEL_NAMES)
+
+_YEARS = np.array([DASHA_YEARS[lord] for lord in DASHA_ORDER], dtype=float)
+# _CUM[i, k]: years from the start of lord i's period to the start of the k-th lord after it (k = 0..9)
+_CUM = np.array([np.concatenate([[0], np.cumsum(np.roll(_YEARS, -i))]) for i in range(9)])
+
+
+def moon_dasha_start(moon_lon, birth_jd):
+    """Starting lord index and the Julian day its mahadasha began, from the natal Moon (arrays or scalars).
+
+    The Moon's nakshatra lord rules at birth; the part of the nakshatra already traversed is the part of
+    that mahadasha already elapsed.
+    """
+    moon_lon = np.asarray(moon_lon, dtype=float)
+    nak = (moon_lon // NAKSHATRA_SPAN).astype(int) % 27
+    traversed = (moon_lon % NAKSHATRA_SPAN) / NAKSHATRA_SPAN
+    lord = nak % 9
+    return lord, np.asarray(birth_jd, dtype=float) - traversed * _YEARS[lord] * YEAR_DAYS
+
+
+def _sub_periods(lord: int, start_jd: float, length_days: float):
+    """The 9 sub-periods of a period, starting with its own lord: (lord, start_jd, end_jd)"""
+    for k in range(9):
+        sub = (lord + k) % 9
+        yield sub, start_jd + _CUM[lord, k] / DASHA_TOTAL_YEARS * length_days, \
+            start_jd + _CUM[lord, k + 1] / DASHA_TOTAL_YEARS * length_days
+
+
+def dasha_periods(moon_lon: float, birth_jd: float, levels: int = 3, start_jd: float = None, end_jd: float = None):
+    """Yield nested Vimshottari periods as dicts, expanding only periods that overlap [start_jd, end_jd).
+
+    Without a range this is the 120-year cycle that starts with the birth mahadasha; a range past it
+    continues into the next cycle. Deeper levels are generated on demand, so asking for five levels over
+    one year touches a few dozen periods instead of the ~59k that exist in a full cycle.
+    """
+    lord, first_jd = moon_dasha_start(moon_lon, birth_jd)
+    lord, first_jd = int(lord), float(first_jd)
+    cycle_days = DASHA_TOTAL_YEARS * YEAR_DAYS
+    start_jd = first_jd if start_jd is None else start_jd
+    end_jd = first_jd + cycle_days if end_jd is None else end_jd
+
+    def expand(lord, start, length, level):
+        for sub, sub_start, sub_end in _sub_periods(lord, start, length):
+            if sub_end <= start_jd or sub_start >= end_jd:
+                continue
+            period = _period_dict(sub, sub_start, sub_end, level)
+            if level + 1 < levels:
+                period['periods'] = list(expand(sub, sub_start, sub_end - sub_start, level + 1))
+            yield period
+
+    first_cycle = max(int(np.floor((start_jd - first_jd) / cycle_days)), 0)
+    last_cycle = int(np.ceil((end_jd - first_jd) / cycle_days))
+    for c in range(first_cycle, last_cycle):
+        yield from expand(lord, first_jd + c * cycle_days, cycle_days, 0)
+
+
+def _period_dict(lord: int, start_jd: float, end_jd: float, level: int) -> dict:
+    return {
+        'lord': DASHA_ORDER[lord],
+        'level': LEVEL_NAMES[level],
+        'start': str(julian_day_to_utc(start_jd))[:16] + 'Z',
+        'end': str(julian_day_to_utc(end_jd))[:16] + 'Z',
+    }
+
+
+def current_dashas(moon_lon: np.ndarray, birth_jd: np.ndarray, at_jd, levels: int = 3):
+    """Running period at at_jd for many charts at once.
+
+    Returns (lords[N, levels] as DASHA_ORDER indices, start_jd[N], end_jd[N]) with the bounds of the
+    deepest level. Every level is a table gather over all charts, with no per-chart Python loop.
+    """
+    lord, first_jd = moon_dasha_start(moon_lon, birth_jd)
+    n = len(lord)
+    cycle_days = DASHA_TOTAL_YEARS * YEAR_DAYS
+    at_jd = np.broadcast_to(np.asarray(at_jd, dtype=float), (n,))
+    # position inside the current 120-year cycle, in years (dates before birth fall in the previous cycle)
+    start = first_jd + np.floor((at_jd - first_jd) / cycle_days) * cycle_days
+    length = np.full(n, cycle_days)
+    lords = np.zeros((n, levels), dtype=int)
+    for level in range(levels):
+        fraction = (at_jd - start) / length * DASHA_TOTAL_YEARS
+        k = np.clip((fraction[:, None] >= _CUM[lord, 1:]).sum(axis=1), 0, 8)
+        sub = (lord + k) % 9
+        start = start + _CUM[lord, k] / DASHA_TOTAL_YEARS * length
+        length = _YEARS[sub] / DASHA_TOTAL_YEARS * length
+        lords[:, level] = sub
+        lord = sub
+    return lords, start, start + length
+
+
+def moon_longitudes(items: list):
+    """(moon_lon[N], birth_jd[N], errors) for births given as {date, time, tz[, ayanamsa]} or {moon_lon, birth_jd}"""
+    n = len(items)
+    moon = np.full(n, np.nan)
+    jd = np.full(n, np.nan)
+    errors = {}
+    need = []
+    dates, minutes, tzs, modes = [], [], [], []
+    for i, item in enumerate(items):
+        try:
+            if 'moon_lon' in item:
+                moon[i] = float(item['moon_lon']) % 360
+                jd[i] = float(item['birth_jd'])
+                continue
+            y, m, d = map(int, item['date'].split('-'))
+            date = np.datetime64(f'{y:04d}-{m:02d}-{d:02d}', 'D')
+            parsed = (date, parse_clock(item['time']), float(item['tz']), parse_ayanamsa(item.get('ayanamsa')))
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            errors[i] = f'invalid birth data: {e!r}'
+            continue
+        for column, value in zip((dates, minutes, tzs, modes), parsed):
+            column.append(value)
+        need.append(i)
+    if need:
+        need = np.array(need)
+        jd[need] = julian_days(np.array(dates), np.array(minutes), np.array(tzs))
+        modes = np.array(modes)
+        # One ephemeris pass per sidereal mode, as in chart_core.birth_points()
+        for mode in np.unique(modes):
+            rows = need[modes == mode]
+            lons, _, _, calc_errors = sidereal_positions(jd[rows], ['Mo'], int(mode))
+            moon[rows] = lons[:, 0]
+            errors.update({int(rows[k]): msg for k, msg in calc_errors.items()})
+    return moon, jd, errors
+
+
+def nakshatra_info(moon_lon: float, birth_jd: float) -> dict:
+    """Birth nakshatra, its dasha lord and the balance of that mahadasha at birth"""
+    lord, first_jd = moon_dasha_start(moon_lon, birth_jd)
+    lord = int(lord)
+    elapsed_years = (birth_jd - float(first_jd)) / YEAR_DAYS
+    return {
+        'moon_nakshatra': NAKSHATRAS[int(moon_lon // NAKSHATRA_SPAN) % 27],
+        'birth_dasha_lord': DASHA_ORDER[lord],
+        'balance_years': round(DASHA_YEARS[DASHA_ORDER[lord]] - elapsed_years, 4),
+    }
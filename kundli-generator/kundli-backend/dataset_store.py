@@ -0,0 +1,79 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from chart_core import PLANET_FULL_NAMES, SIGNS
+from metrics import stage
+
+log = logging.getLogger(__name__)
+
+
+class DatasetStore:
+    """dataset.json parsed once and re-read only when the file's mtime changes.
+
+    Readers get an immutable (data, raw bytes, version) snapshot, so a reload never
+    exposes a half-updated dataset to a request in flight.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._snapshot = ({}, b'{}', hashlib.sha256(b'{}').hexdigest()[:16])
+        self.refresh()
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            log.error('Error loading dataset: %s', e)
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                with stage('dataset_load'), open(self.path, 'rb') as f:
+                    raw = f.read()
+                    data = json.loads(raw)
+            except (OSError, ValueError) as e:
+                # Keep serving the last good dataset until the file changes again
+                log.error('Error loading dataset: %s', e)
+            else:
+                self._snapshot = (data, raw, hashlib.sha256(raw).hexdigest()[:16])
+            self._mtime = mtime
+
+    def snapshot(self):
+        """Current (data, raw_json_bytes, version), reloading first if the file changed"""
+        self.refresh()
+        return self._snapshot
+
+
+def chart_slice(dataset: dict, chart: dict) -> dict:
+    """The parts of the dataset a computed chart needs.
+
+    Houses are numbered from the ascendant like the UI does; each keeps its 'about'
+    text plus only the interpretations of planets actually placed there.
+    """
+    asc_idx = SIGNS.index(chart['asc_sign'])
+    houses = dataset.get('houses', {})
+    aspects = dataset.get('aspects', {})
+    present = set()
+    sliced_houses = {}
+    for h in range(1, 13):
+        house = houses.get(str(h))
+        if house is None:
+            continue
+        sign = SIGNS[(asc_idx + h - 1) % 12]
+        names = [PLANET_FULL_NAMES[p['name']] for p in chart['sign_planets'][sign]]
+        present.update(names)
+        interpretations = house.get('planets', {})
+        sliced_houses[str(h)] = dict(house, planets={n: interpretations[n] for n in names if n in interpretations})
+    return {
+        'houses': sliced_houses,
+        'aspects': {n: a for n, a in aspects.items() if n in present},
+        'yogas': dataset.get('yogas', {}),
+    }
@@ -0,0 +1,92 @@
+import json
+import re
+
+import numpy as np
+
+from chart_core import BODIES, SIGNS, sidereal_positions, utc_julian_days
+
+_STEP_UNITS = {'m': 1, 'h': 60, 'd': 1440}
+
+
+def parse_time(value: str) -> np.datetime64:
+    """UTC instant from 'YYYY-MM-DD' or 'YYYY-MM-DDTHH:MM[:SS]' (a trailing 'Z' is allowed)"""
+    try:
+        return np.datetime64(value.rstrip('Z'), 'm')
+    except (ValueError, AttributeError):
+        raise ValueError(f"invalid time '{value}' (expected YYYY-MM-DD or YYYY-MM-DDTHH:MM)") from None
+
+
+def time_or_now(value) -> np.datetime64:
+    """parse_time(value), or the current UTC minute when value is empty"""
+    return parse_time(value) if value else np.datetime64('now', 'm')
+
+
+def parse_step(value: str) -> int:
+    """Step in whole minutes from '1d', '6h', '30m' (a bare number means days)"""
+    match = re.fullmatch(r'\s*(\d+)\s*([mhd]?)\s*', str(value))
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"invalid step '{value}' (expected e.g. 1d, 6h, 30m)")
+    return int(match.group(1)) * _STEP_UNITS[match.group(2) or 'd']
+
+
+def parse_bodies(value) -> list:
+    """'Su,Mo' or ['Su', 'Mo'] -> bodies in BODIES order; empty means all"""
+    names = value.split(',') if isinstance(value, str) else list(value or [])
+    names = [n.strip() for n in names if n.strip()]
+    unknown = [n for n in names if n not in BODIES]
+    if unknown:
+        raise ValueError(f"unknown planets {unknown} (expected some of {BODIES})")
+    return [b for b in BODIES if b in names] if names else list(BODIES)
+
+
+def sample_count(start: np.datetime64, end: np.datetime64, step_minutes: int) -> int:
+    """Number of samples from start to end inclusive"""
+    if end < start:
+        raise ValueError('end must not be before start')
+    return int((end - start) // np.timedelta64(step_minutes, 'm')) + 1
+
+
+def ephemeris_series(start: np.datetime64, end: np.datetime64, step_minutes: int, bodies: list, chunk: int = 1024):
+    """Yield one dict per sample with sidereal longitudes, speeds (deg/day) and sign ingresses.
+
+    Timestamps are evaluated a chunk at a time, so memory stays bounded by the chunk size however
+    long the range is. 'ingress' lists the bodies whose sign changed since the previous sample.
+    """
+    total = sample_count(start, end, step_minutes)
+    # Ketu's real speed is Rahu's; the chart convention of zero speed doesn't belong in a time series
+    calc = bodies + ['Ra'] if 'Ke' in bodies and 'Ra' not in bodies else bodies
+    prev_signs = None
+    for first in range(0, total, chunk):
+        offsets = np.arange(first, min(first + chunk, total)) * step_minutes
+        times = start + offsets.astype('timedelta64[m]')
+        lons, speeds, _, errors = sidereal_positions(utc_julian_days(times), calc)
+        if 'Ke' in bodies:
+            speeds[:, calc.index('Ke')] = speeds[:, calc.index('Ra')]
+        lons, speeds = lons[:, :len(bodies)], speeds[:, :len(bodies)]
+        signs = (lons // 30).astype(int) % 12
+        changed = np.zeros_like(signs, dtype=bool)
+        changed[1:] = signs[1:] != signs[:-1]
+        if prev_signs is not None:
+            changed[0] = signs[0] != prev_signs
+        stamps = np.datetime_as_string(times, unit='m')
+        jds = utc_julian_days(times)
+        for i in range(len(times)):
+            if i in errors:
+                yield {'t': stamps[i] + 'Z', 'error': errors[i]}
+                continue
+            row = {
+                't': stamps[i] + 'Z',
+                'jd': round(float(jds[i]), 6),
+                'lon': {b: round(float(lons[i, j]), 6) for j, b in enumerate(bodies)},
+                'speed': {b: round(float(speeds[i, j]), 6) for j, b in enumerate(bodies)},
+            }
+            if changed[i].any():
+                row['ingress'] = {bodies[j]: SIGNS[signs[i, j]] for j in np.flatnonzero(changed[i])}
+            yield row
+        prev_signs = signs[-1]
+
+
+def ndjson(rows):
+    """Encode dict rows as newline-delimited JSON"""
+    for row in rows:
+        yield json.dumps(row, separators=(',', ':')) + '\n'
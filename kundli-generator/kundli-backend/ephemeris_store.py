@@ -0,0 +1,189 @@
+"""Precomputed ephemeris file, memory-mapped and read by cubic Hermite interpolation.
+
+Build it offline once:
+
+    python ephemeris_store.py build --start 1900-01-01 --end 2100-01-01 --out ephemeris.bin
+
+The file is a 4 KiB JSON header followed by float64 samples at a fixed step. Each sample holds the
+tropical longitude and speed of every PLANETS body, plus the ayanamsa. Speeds are central differences
+of swisseph positions 0.01 day either side rather than swisseph's reported speed, which glitches at some
+instants, so each interval interpolates a cubic matching position and slope at both ends. At the default
+1 day step over 1900-2100 the 99th percentile error against live swisseph is under 0.5" for every body
+(Moon 0.45", everything else under 0.06") and the maximum is about 2" for the inner planets. Without .se1 files swisseph falls back to its Moshier
+series, whose outer-planet positions carry local wiggles of several arcseconds (Saturn ~12", Neptune ~8")
+that the smooth interpolation does not follow. The build measures both bounds and stores them in the
+header ('max_error_arcsec', 'p99_error_arcsec').
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import swisseph as swe
+
+import chart_core
+from chart_core import BODIES, PLANETS, SID_MODE, utc_julian_days
+
+MAGIC = 'kundli-ephemeris'
+FORMAT_VERSION = 1
+HEADER_SIZE = 4096
+_STORED = list(PLANETS)  # Ketu is derived from Rahu
+_SLOPE_DT = 0.01  # days either side of a sample for its central-difference speed
+
+
+class EphemerisStore:
+    """Read-only view of an ephemeris file; the OS page cache is shared by every process that maps it"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            header = json.loads(f.read(HEADER_SIZE).rstrip(b'\0 '))
+        if header.get('format') != MAGIC or header.get('version') != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a version {FORMAT_VERSION} ephemeris file')
+        if header['bodies'] != _STORED:
+            raise ValueError(f"{path} has bodies {header['bodies']}, expected {_STORED}")
+        if header['sid_mode'] != SID_MODE:
+            raise ValueError(f"{path} was built for sidereal mode {header['sid_mode']}, expected {SID_MODE}")
+        self.path = path
+        self.header = header
+        self.start_jd = header['start_jd']
+        self.step = header['step']
+        self.count = header['count']
+        self.end_jd = self.start_jd + (self.count - 1) * self.step
+        # [sample, column]: tropical longitudes, then speeds, then the ayanamsa
+        self.data = np.memmap(path, dtype='<f8', mode='r', offset=HEADER_SIZE,
+                              shape=(self.count, 2 * len(_STORED) + 1))
+
+    def covers(self, jds: np.ndarray) -> np.ndarray:
+        jds = np.asarray(jds, dtype=float)
+        return (jds >= self.start_jd) & (jds < self.end_jd)
+
+    def interpolate(self, jds: np.ndarray):
+        """Tropical (lons[N, 11], speeds[N, 11]) and ayanamsa[N] for Julian days inside the covered range"""
+        n = len(_STORED)
+        pos = (np.asarray(jds, dtype=float) - self.start_jd) / self.step
+        i = np.minimum(pos.astype(np.int64), self.count - 2)
+        t = (pos - i)[:, None]
+        a = self.data[i]
+        b = self.data[i + 1]
+        l0, s0 = a[:, :n], a[:, n:2 * n]
+        l1, s1 = b[:, :n], b[:, n:2 * n]
+        d = (l1 - l0 + 180) % 360 - 180  # unwrap across 0°/360°
+        m0, m1 = s0 * self.step, s1 * self.step
+        t2, t3 = t * t, t * t * t
+        lons = (l0 + (t3 - 2 * t2 + t) * m0 + (3 * t2 - 2 * t3) * d + (t3 - t2) * m1) % 360
+        speeds = ((3 * t2 - 4 * t + 1) * m0 + (6 * t - 6 * t2) * d + (3 * t2 - 2 * t) * m1) / self.step
+        ayanamsa = a[:, -1] + (b[:, -1] - a[:, -1]) * t[:, 0]
+        return lons, speeds, ayanamsa
+
+    def sidereal_positions(self, jds: np.ndarray, bodies=BODIES, sid_mode: int = SID_MODE):
+        """Drop-in for chart_core.swiss_positions; Julian days outside the file fall back to swisseph.
+
+        The file holds the ayanamsa of SID_MODE only; for another mode it comes from swisseph.
+        """
+        jds = np.asarray(jds, dtype=float)
+        inside = self.covers(jds)
+        lons = np.zeros((len(jds), len(bodies)))
+        speeds = np.zeros((len(jds), len(bodies)))
+        ayanamsa = np.zeros(len(jds))
+        errors = {}
+        outside = np.flatnonzero(~inside)
+        if len(outside):
+            lons[outside], speeds[outside], ayanamsa[outside], out_errors = chart_core.swiss_positions(
+                jds[outside], bodies, sid_mode)
+            errors = {int(outside[k]): msg for k, msg in out_errors.items()}
+            if not inside.any():
+                return lons, speeds, ayanamsa, errors
+        trop_lons, trop_speeds, ayan = self.interpolate(jds[inside])
+        if sid_mode != SID_MODE:
+            ayan = chart_core.swiss_ayanamsa(jds[inside], sid_mode)
+        sid_lons = (trop_lons - ayan[:, None]) % 360
+        ayanamsa[inside] = ayan
+        for j, name in enumerate(bodies):
+            if name == 'Ke':
+                lons[inside, j] = (sid_lons[:, _STORED.index('Ra')] + 180) % 360
+                speeds[inside, j] = 0
+            else:
+                lons[inside, j] = sid_lons[:, _STORED.index(name)]
+                speeds[inside, j] = trop_speeds[:, _STORED.index(name)]
+        return lons, speeds, ayanamsa, errors
+
+    def verify(self, samples: int = 2000, seed: int = 0) -> dict:
+        """Max and 99th percentile |interpolated - swisseph| sidereal longitude per body, in arcseconds"""
+        rng = np.random.default_rng(seed)
+        jds = rng.uniform(self.start_jd, self.end_jd, samples)
+        got, _, _, _ = self.sidereal_positions(jds, _STORED)
+        want, _, _, _ = chart_core.swiss_positions(jds, _STORED)
+        err = np.abs((got - want + 180) % 360 - 180) * 3600
+        return {
+            'max_error_arcsec': {name: round(float(e), 4) for name, e in zip(_STORED, err.max(axis=0))},
+            'p99_error_arcsec': {name: round(float(e), 4) for name, e in zip(_STORED, np.percentile(err, 99, axis=0))},
+        }
+
+
+def build(path: str, start: str, end: str, step: float = 1.0, verify_samples: int = 2000) -> dict:
+    """Sample swisseph from start to end (UTC dates) every step days into path; returns the header"""
+    start_jd = float(utc_julian_days(np.datetime64(start, 'D')))
+    end_jd = float(utc_julian_days(np.datetime64(end, 'D')))
+    count = int(np.ceil((end_jd - start_jd) / step)) + 2  # one sample past end so end stays interpolable
+    n = len(_STORED)
+    header = {'format': MAGIC, 'version': FORMAT_VERSION, 'start_jd': start_jd, 'step': step, 'count': count,
+              'bodies': _STORED, 'sid_mode': SID_MODE, 'start': start, 'end': end,
+              'columns': 'tropical lon[bodies], tropical speed deg/day[bodies], ayanamsa'}
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(b'\0' * HEADER_SIZE)
+    out = np.memmap(tmp, dtype='<f8', mode='r+', offset=HEADER_SIZE, shape=(count, 2 * n + 1))
+    with chart_core.swiss_session(SID_MODE):
+        for k in range(count):
+            jd = start_jd + k * step
+            for j, name in enumerate(_STORED):
+                before = swe.calc_ut(jd - _SLOPE_DT, PLANETS[name])[0][0]
+                after = swe.calc_ut(jd + _SLOPE_DT, PLANETS[name])[0][0]
+                out[k, j] = swe.calc_ut(jd, PLANETS[name])[0][0]
+                out[k, n + j] = ((after - before + 180) % 360 - 180) / (2 * _SLOPE_DT)
+            out[k, -1] = swe.get_ayanamsa(jd)
+    out.flush()
+    del out
+    _write_header(tmp, header)
+    os.replace(tmp, path)
+    if verify_samples:
+        header.update(EphemerisStore(path).verify(verify_samples))
+        _write_header(path, header)
+    return header
+
+
+def _write_header(path: str, header: dict):
+    raw = json.dumps(header).encode()
+    if len(raw) > HEADER_SIZE:
+        raise ValueError('ephemeris header too large')
+    with open(path, 'r+b') as f:
+        f.write(raw.ljust(HEADER_SIZE, b' '))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or check the precomputed ephemeris file')
+    sub = parser.add_subparsers(dest='command', required=True)
+    b = sub.add_parser('build', help='sample swisseph into a new ephemeris file')
+    b.add_argument('--start', default='1900-01-01')
+    b.add_argument('--end', default='2100-01-01')
+    b.add_argument('--step', type=float, default=1.0, help='sample step in days')
+    b.add_argument('--out', default=os.path.join(os.path.dirname(__file__), 'ephemeris.bin'))
+    b.add_argument('--verify-samples', type=int, default=2000)
+    c = sub.add_parser('verify', help='measure interpolation error against swisseph')
+    c.add_argument('path')
+    c.add_argument('--samples', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        header = build(args.out, args.start, args.end, args.step, args.verify_samples)
+        print(f"wrote {args.out}: {header['count']} samples, {os.path.getsize(args.out) / 1e6:.1f} MB")
+        if 'max_error_arcsec' in header:
+            print(f"max error (arcsec): {header['max_error_arcsec']}")
+            print(f"p99 error (arcsec): {header['p99_error_arcsec']}")
+    else:
+        print(json.dumps(EphemerisStore(args.path).verify(args.samples)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""Exact astrological events, found once offline and served from an indexed SQLite table.
+
+    python events.py build --start 1900-01-01 --end 2100-01-01 --db events.sqlite
+
+Each body is sampled on a coarse grid suited to its speed. A sign change between two samples
+brackets an event, and Brent's method then solves it to about a tenth of a second. Event kinds:
+
+    ingress             sidereal sign change (detail: the new sign)
+    nakshatra           nakshatra change (detail: the new nakshatra)
+    station_retrograde  speed turns negative
+    station_direct      speed turns positive
+    combust_start       enters its combustion orbit around the Sun
+    combust_end         leaves it
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+
+from chart_core import (BODIES, COMBUST_ORBITS, NAKSHATRA_SPAN, NAKSHATRAS, SID_MODE, SIGNS, julian_day_to_utc,
+                        sidereal_positions, use_ephemeris_store, utc_julian_days)
+
+EVENT_KINDS = ('ingress', 'nakshatra', 'station_retrograde', 'station_direct', 'combust_start', 'combust_end')
+
+# Sampling step in days: small enough that a body can't cross two boundaries between samples
+_SCAN_STEP = {'Mo': 0.25, 'Su': 1, 'Me': 0.5, 'Ve': 1, 'Ma': 1, 'Ju': 2, 'Sa': 2, 'Ra': 2, 'Ke': 2,
+              'Ur': 4, 'Ne': 4, 'Pl': 4}
+# The mean node is always retrograde and the luminaries never are
+_NO_STATIONS = ('Su', 'Mo', 'Ra', 'Ke')
+_XTOL = 1e-6  # days (~0.09 s)
+_CHUNK_DAYS = 3652
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    jd REAL NOT NULL,
+    planet TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    detail TEXT,
+    lon REAL
+);
+CREATE INDEX IF NOT EXISTS events_planet_kind_jd ON events (planet, kind, jd);
+CREATE INDEX IF NOT EXISTS events_jd ON events (jd);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def brent(f, a: float, b: float, fa: float, fb: float, xtol: float = _XTOL, maxiter: int = 100) -> float:
+    """Root of f in [a, b] where fa and fb have opposite signs (Brent's method)"""
+    c, fc = a, fa
+    d = e = b - a
+    for _ in range(maxiter):
+        if fb * fc > 0:
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol = 2 * np.finfo(float).eps * abs(b) + 0.5 * xtol
+        m = 0.5 * (c - b)
+        if abs(m) <= tol or fb == 0:
+            return b
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            s = fb / fa
+            if a == c:
+                p, q = 2 * m * s, 1 - s
+            else:
+                q, r = fa / fc, fb / fc
+                p = s * (2 * m * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            else:
+                p = -p
+            if 2 * p < min(3 * m * q - abs(tol * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = m
+        else:
+            d = e = m
+        a, fa = b, fb
+        b += d if abs(d) > tol else (tol if m > 0 else -tol)
+        fb = f(b)
+    return b
+
+
+def _position(body: str, jd: float):
+    lons, speeds, _, _ = sidereal_positions(np.array([jd]), [body, 'Su'])
+    return lons[0, 0], speeds[0, 0], lons[0, 1]
+
+
+def _wrap(x):
+    return (x + 180) % 360 - 180
+
+
+def _boundary_events(body, jds, lons, span, names, kind):
+    """Crossings of multiples of span (30° signs or 13°20' nakshatras), solved exactly"""
+    count = len(names)
+    idx = (lons // span).astype(int) % count
+    for k in np.flatnonzero(idx[1:] != idx[:-1]):
+        before, after = idx[k], idx[k + 1]
+        if (after - before) % count == 1:
+            boundary = after * span          # moving forward into `after`
+        elif (before - after) % count == 1:
+            boundary = before * span         # moving backward into `after`
+        else:
+            continue  # skipped a division; the scan step is too coarse for this body
+
+        def g(jd, boundary=boundary):
+            return _wrap(_position(body, jd)[0] - boundary)
+        jd = brent(g, jds[k], jds[k + 1], _wrap(lons[k] - boundary), _wrap(lons[k + 1] - boundary))
+        yield jd, body, kind, names[after], _position(body, jd)[0]
+
+
+def _station_events(body, jds, speeds):
+    retro = speeds < 0
+    for k in np.flatnonzero(retro[1:] != retro[:-1]):
+        jd = brent(lambda t: _position(body, t)[1], jds[k], jds[k + 1], speeds[k], speeds[k + 1])
+        kind = 'station_retrograde' if retro[k + 1] else 'station_direct'
+        yield jd, body, kind, '', _position(body, jd)[0]
+
+
+def _combustion_events(body, jds, lons, sun, orbit):
+    gap = np.abs(_wrap(lons - sun)) - orbit
+    inside = gap < 0
+    for k in np.flatnonzero(inside[1:] != inside[:-1]):
+        def g(jd):
+            lon, _, sun_lon = _position(body, jd)
+            return abs(_wrap(lon - sun_lon)) - orbit
+        jd = brent(g, jds[k], jds[k + 1], gap[k], gap[k + 1])
+        yield jd, body, 'combust_start' if inside[k + 1] else 'combust_end', '', _position(body, jd)[0]
+
+
+def find_events(body: str, start_jd: float, end_jd: float):
+    """All events for one body in [start_jd, end_jd), in time order"""
+    step = _SCAN_STEP[body]
+    found = []
+    chunk_start = start_jd
+    while chunk_start < end_jd:
+        chunk_end = min(chunk_start + _CHUNK_DAYS, end_jd)
+        jds = np.arange(chunk_start, chunk_end + step, step)  # overlap one step with the next chunk
+        lons, speeds, _, _ = sidereal_positions(jds, [body, 'Su'])
+        lon, speed, sun = lons[:, 0], speeds[:, 0], lons[:, 1]
+        found.extend(_boundary_events(body, jds, lon, 30, SIGNS, 'ingress'))
+        found.extend(_boundary_events(body, jds, lon, NAKSHATRA_SPAN, NAKSHATRAS, 'nakshatra'))
+        if body not in _NO_STATIONS:
+            found.extend(_station_events(body, jds, speed))
+        if body in COMBUST_ORBITS:
+            found.extend(_combustion_events(body, jds, lon, sun, COMBUST_ORBITS[body]))
+        chunk_start = chunk_end
+    found = [e for e in found if start_jd <= e[0] < end_jd]
+    found.sort()
+    # The chunk overlap can find the same event twice
+    return [e for i, e in enumerate(found) if i == 0 or e[1:3] != found[i - 1][1:3] or e[0] - found[i - 1][0] > 1e-4]
+
+
+def build(db_path: str, start: str, end: str, bodies=BODIES) -> int:
+    """Compute every event from start to end (UTC dates) into a new SQLite file; returns the event count"""
+    start_jd = float(utc_julian_days(np.datetime64(start, 'D')))
+    end_jd = float(utc_julian_days(np.datetime64(end, 'D')))
+    tmp = db_path + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.executescript(SCHEMA)
+    total = 0
+    for body in bodies:
+        rows = find_events(body, start_jd, end_jd)
+        conn.executemany('INSERT INTO events VALUES (?, ?, ?, ?, ?)', rows)
+        total += len(rows)
+        print(f'{body}: {len(rows)} events')
+    conn.executemany('INSERT INTO meta VALUES (?, ?)', [('start_jd', str(start_jd)), ('end_jd', str(end_jd)),
+                                                        ('sid_mode', str(SID_MODE))])
+    conn.commit()
+    conn.close()
+    os.replace(tmp, db_path)
+    return total
+
+
+class EventIndex:
+    """Read-only queries over a built events table (one SQLite connection per thread)"""
+
+    def __init__(self, path: str):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self._local = threading.local()
+        os.register_at_fork(after_in_child=self._forget_connections)
+        meta = dict(self._conn().execute('SELECT key, value FROM meta'))
+        if int(meta.get('sid_mode', SID_MODE)) != SID_MODE:
+            raise ValueError(f"{path} was built for sidereal mode {meta['sid_mode']}, expected {SID_MODE}")
+        self.start_jd = float(meta['start_jd'])
+        self.end_jd = float(meta['end_jd'])
+
+    def _forget_connections(self):
+        self._local = threading.local()  # SQLite connections must not be used across fork()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+            self._local.conn = conn
+        return conn
+
+    def query(self, start_jd: float, end_jd: float, planets=None, kinds=None, limit: int = 1000) -> list:
+        sql = 'SELECT jd, planet, kind, detail, lon FROM events WHERE jd >= ? AND jd < ?'
+        args = [start_jd, end_jd]
+        if planets:
+            sql += f" AND planet IN ({','.join('?' * len(planets))})"
+            args += list(planets)
+        if kinds:
+            sql += f" AND kind IN ({','.join('?' * len(kinds))})"
+            args += list(kinds)
+        sql += ' ORDER BY jd LIMIT ?'
+        args.append(limit)
+        return [_event_dict(row) for row in self._conn().execute(sql, args)]
+
+    def next(self, planet: str, kind: str, after_jd: float):
+        row = self._conn().execute(
+            'SELECT jd, planet, kind, detail, lon FROM events WHERE planet = ? AND kind = ? AND jd > ? ORDER BY jd LIMIT 1',
+            (planet, kind, after_jd)).fetchone()
+        return _event_dict(row) if row else None
+
+
+def _event_dict(row) -> dict:
+    jd, planet, kind, detail, lon = row
+    event = {'time': str(julian_day_to_utc(jd)) + 'Z', 'jd': jd, 'planet': planet, 'type': kind, 'lon': round(lon, 6)}
+    if detail:
+        event['detail'] = detail
+    return event
+
+
+def parse_kinds(value) -> list:
+    kinds = [k.strip() for k in (value or '').split(',') if k.strip()]
+    unknown = [k for k in kinds if k not in EVENT_KINDS]
+    if unknown:
+        raise ValueError(f'unknown event types {unknown} (expected some of {list(EVENT_KINDS)})')
+    return kinds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the astrological event index')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--start', default='1900-01-01')
+    parser.add_argument('--end', default='2100-01-01')
+    parser.add_argument('--db', default=os.path.join(os.path.dirname(__file__), 'events.sqlite'))
+    parser.add_argument('--planets', default='', help='comma-separated subset, default all')
+    parser.add_argument('--ephemeris', help='precomputed ephemeris file to scan with (much faster than swisseph)')
+    args = parser.parse_args(argv)
+    if args.ephemeris:
+        from ephemeris_store import EphemerisStore
+        use_ephemeris_store(EphemerisStore(args.ephemeris))
+    bodies = [b for b in args.planets.split(',') if b] or BODIES
+    total = build(args.db, args.start, args.end, bodies)
+    print(f'wrote {args.db}: {total} events')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,23 @@
+"""Gunicorn settings for the production server (gunicorn -c gunicorn.conf.py wsgi:app).
+
+Chart work is CPU-bound numpy and swisseph, so there is one worker process per core. Each worker also runs
+a few threads: AI requests and server-sent event streams spend most of their time waiting on the model, and
+threads keep those waits from blocking chart requests. Every setting can be overridden from the environment.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_WORKERS', str(multiprocessing.cpu_count())))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '4'))
+# Load the app in the parent before forking, so the dataset and tables are shared copy-on-write
+preload_app = True
+# Longer than AI_WAIT_SECONDS (120), the longest a request waits on an answer
+timeout = int(os.getenv('WEB_TIMEOUT', '150'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+# Restart a worker after this many requests (0 = never), staggered by the jitter
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', '0'))
+accesslog = os.getenv('ACCESS_LOG') or None
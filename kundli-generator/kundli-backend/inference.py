@@ -0,0 +1,212 @@
+"""Long-lived client for one text-generation model, with pooled connections, deadlines and a circuit breaker.
+
+The model is either a Hugging Face model id, served through the hf-inference router, or the URL of a
+text-generation-inference server such as stub_model.py. Both speak the same two routes: POST <url> for
+text generation and POST <url>/v1/chat/completions for chat. The first call finds which one the model
+supports and every later call goes straight to it.
+"""
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HF_INFERENCE_URL = 'https://router.huggingface.co/hf-inference/models'
+# Statuses meaning "this model doesn't serve that route", as opposed to the upstream being unhealthy
+_WRONG_TASK = (400, 404, 405, 422)
+_CONNECT_TIMEOUT = 5.0
+
+
+class InferenceError(Exception):
+    pass
+
+
+class DeadlineExceeded(InferenceError):
+    pass
+
+
+class CircuitOpen(InferenceError):
+    def __init__(self, retry_after: float):
+        super().__init__(f'model circuit open, retry after {retry_after:.0f}s')
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive upstream failures and fails fast for `reset_after` seconds.
+
+    After that a single trial call is let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.short_circuited = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        """Seconds until calls are let through again; 0 while closed or ready for a trial call"""
+        with self._lock:
+            if self.state == 'closed':
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_after - time.monotonic())
+
+    def before_call(self):
+        with self._lock:
+            if self.state == 'closed':
+                return
+            wait = self.opened_at + self.reset_after - time.monotonic()
+            if wait > 0 or self._trial:
+                self.short_circuited += 1
+                raise CircuitOpen(max(wait, 1.0))
+            self.state = 'half_open'
+            self._trial = True
+
+    def success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == 'half_open' or self.failures >= self.threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {'state': self.state, 'failures': self.failures, 'short_circuited': self.short_circuited,
+                'retry_after': round(self.retry_after(), 1)}
+
+
+class InferenceProvider:
+    """One model endpoint; safe to share between threads, with up to pool_size connections kept open"""
+
+    def __init__(self, model: str, token: str = None, text_params: dict = None, chat_params: dict = None,
+                 timeout: float = 60.0, pool_size: int = 4, breaker: CircuitBreaker = None,
+                 base_url: str = HF_INFERENCE_URL):
+        self.model = model
+        self.local = model.startswith(('http://', 'https://'))
+        self.url = model.rstrip('/') if self.local else f'{base_url}/{model}'
+        self.chat_url = self.url + '/v1/chat/completions'
+        self.available = bool(token) or self.local
+        self.text_params = text_params or {}
+        self.chat_params = chat_params or {}
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.task = None  # 'text' or 'chat', learned on the first successful call
+        self.calls = 0
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if token:
+            self.session.headers['Authorization'] = f'Bearer {token}'
+
+    def generate(self, prompt: str) -> str:
+        """Complete generated text"""
+        task, resp, _ = self._post(prompt, stream=False)
+        payload = resp.json()
+        if task == 'chat':
+            return payload['choices'][0]['message']['content']
+        return (payload[0] if isinstance(payload, list) else payload)['generated_text']
+
+    def stream(self, prompt: str):
+        """Generated text pieces as they arrive; closing the iterator closes the connection.
+
+        The whole call, streaming included, has one deadline. A stream that breaks off, stalls or reports
+        an error counts as an upstream failure; one that ends, or that the reader closes, as a success.
+        """
+        task, resp, deadline = self._post(prompt, stream=True)
+        failed = False
+        try:
+            for line in resp.iter_lines(chunk_size=None, decode_unicode=True):
+                if time.monotonic() > deadline:
+                    raise DeadlineExceeded(f'{self.model} did not finish within {self.timeout:.0f}s')
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    return
+                event = json.loads(data)
+                if event.get('error'):
+                    raise InferenceError(event['error'])
+                if task == 'chat':
+                    choices = event.get('choices') or [{}]
+                    text = (choices[0].get('delta') or {}).get('content')
+                else:
+                    token = event.get('token') or {}
+                    text = None if token.get('special') else token.get('text')
+                if text:
+                    yield text
+        except InferenceError:
+            failed = True
+            raise
+        except (requests.RequestException, ValueError) as e:  # connection lost or read timed out; bad event
+            failed = True
+            if time.monotonic() >= deadline:
+                raise DeadlineExceeded(f'{self.model} did not finish within {self.timeout:.0f}s') from None
+            raise InferenceError(f'{self.model} stream broke off: {e}') from None
+        finally:
+            resp.close()
+            if failed:
+                self.breaker.failure()
+            else:
+                self.breaker.success()
+
+    def _post(self, prompt: str, stream: bool):
+        """(task, response, deadline) from the first route the model accepts, within the call's deadline.
+
+        A streamed response is not yet a success for the circuit breaker: stream() records the outcome.
+        """
+        if not self.available:
+            raise InferenceError('Hugging Face token not found. Set HUGGING_FACE_TOKEN in .env')
+        self.breaker.before_call()
+        self.calls += 1
+        deadline = time.monotonic() + self.timeout
+        for task in [self.task] if self.task else ['text', 'chat']:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.breaker.failure()
+                raise DeadlineExceeded(f'{self.model} did not answer within {self.timeout:.0f}s')
+            try:
+                resp = self.session.post(self.url if task == 'text' else self.chat_url,
+                                         json=self._payload(task, prompt, stream), stream=stream,
+                                         timeout=(min(_CONNECT_TIMEOUT, remaining), remaining))
+            except requests.Timeout:
+                self.breaker.failure()
+                raise DeadlineExceeded(f'{self.model} did not answer within {self.timeout:.0f}s') from None
+            except requests.RequestException as e:
+                self.breaker.failure()
+                raise InferenceError(f'{self.model} unreachable: {e}') from None
+            if resp.ok:
+                self.task = task
+                if not stream:
+                    self.breaker.success()
+                return task, resp, deadline
+            detail = resp.text[:200]
+            resp.close()
+            if resp.status_code in _WRONG_TASK and self.task is None:
+                continue  # try the other route
+            if resp.status_code >= 500 or resp.status_code == 429:
+                self.breaker.failure()
+            else:
+                self.breaker.success()  # the upstream is up; the request itself was refused
+            raise InferenceError(f'{self.model} returned {resp.status_code}: {detail}')
+        self.breaker.success()
+        raise InferenceError(f'{self.model} supports neither text generation nor chat')
+
+    def _payload(self, task: str, prompt: str, stream: bool) -> dict:
+        if task == 'chat':
+            return {'model': 'tgi' if self.local else self.model, 'messages': [{'role': 'user', 'content': prompt}],
+                    'stream': stream, **self.chat_params}
+        return {'inputs': prompt, 'parameters': {**self.text_params, 'return_full_text': False}, 'stream': stream}
+
+    def stats(self) -> dict:
+        return {'model': self.model, 'task': self.task, 'calls': self.calls, 'breaker': self.breaker.stats()}
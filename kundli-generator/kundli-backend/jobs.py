@@ -0,0 +1,196 @@
+import math
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+_LATENCY_WINDOW = 1000  # recent jobs kept for latency percentiles
+
+
+class TokenBucket:
+    """`capacity` requests at once, refilled at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Spend a token; returns 0 on success, otherwise the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """One token bucket per client key; the least recently seen clients are dropped past max_clients"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def check(self, client: str) -> float:
+        """0 when the client may proceed, otherwise the seconds it should wait"""
+        with self._lock:
+            bucket = self._buckets.pop(client, None) or TokenBucket(self.rate, self.burst)
+            self._buckets[client] = bucket
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            wait = bucket.take()
+            if wait:
+                self.limited += 1
+            return wait
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f'queue full, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class JobQueue:
+    """Bounded FIFO of jobs run by a fixed pool of worker threads.
+
+    `workers` is the number of handler calls in flight at once, so it caps concurrency toward
+    whatever the handler talks to. submit() raises QueueFull instead of growing past max_queue.
+    Submitting with the key of a job that is still queued or running returns that job instead of
+    queueing a duplicate. Finished jobs are kept for result_ttl seconds so clients can poll for them.
+    """
+
+    def __init__(self, handler, workers: int = 2, max_queue: int = 50, result_ttl: float = 600):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self._start()
+        # A process forked from this one (a preloading server's worker) inherits none of its threads
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        """Empty queue, fresh locks and counters, and `workers` new worker threads"""
+        self._queue = queue.Queue(self.max_queue)
+        self._jobs = {}
+        self._active = {}  # key -> unfinished job
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+        self._wait_times = deque(maxlen=_LATENCY_WINDOW)
+        self._run_times = deque(maxlen=_LATENCY_WINDOW)
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.shared = 0
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True).start()
+
+    def submit(self, payload, key=None, joinable: bool = True) -> dict:
+        """Queue a job; the returned view has 'shared': True when it joined an identical unfinished job.
+
+        A job submitted with joinable=False may itself join one, but later submissions never join it.
+        """
+        job = {'id': uuid.uuid4().hex, 'status': 'queued', 'payload': payload, 'submitted': time.time(), 'key': key}
+        with self._lock:
+            self._expire()
+            if key is not None and key in self._active:
+                self.shared += 1
+                return {**self._view(self._active[key]), 'shared': True}
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.rejected += 1
+                raise QueueFull(self.retry_after()) from None
+            self._jobs[job['id']] = job
+            if key is not None and joinable:
+                self._active[key] = job
+            self.submitted += 1
+            return self._view(job)
+
+    def get(self, job_id: str, wait: float = 0):
+        """Public view of a job, blocking up to `wait` seconds for it to finish; None if unknown"""
+        with self._finished:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if wait > 0:
+                self._finished.wait_for(lambda: job['status'] in ('done', 'failed'), timeout=wait)
+            return self._view(job)
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog is likely to drain, from recent run times"""
+        mean_run = sum(self._run_times) / len(self._run_times) if self._run_times else 1.0
+        return max(1, math.ceil((self._queue.qsize() + self.running) * mean_run / self.workers))
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits, runs = list(self._wait_times), list(self._run_times)
+            return {
+                'workers': self.workers,
+                'queue_depth': self._queue.qsize(),
+                'queue_max': self._queue.maxsize,
+                'running': self.running,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'shared': self.shared,
+                'wait_seconds': {'p50': round(_percentile(waits, 0.5), 3), 'p95': round(_percentile(waits, 0.95), 3)},
+                'run_seconds': {'p50': round(_percentile(runs, 0.5), 3), 'p95': round(_percentile(runs, 0.95), 3)},
+            }
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                job['status'] = 'running'
+                job['started'] = time.time()
+                self.running += 1
+                self._wait_times.append(job['started'] - job['submitted'])
+            try:
+                result, error = self.handler(job['payload']), None
+            except Exception as e:
+                result, error = None, str(e)
+            with self._finished:
+                job['finished'] = time.time()
+                job['status'] = 'failed' if error else 'done'
+                job['result'] = result
+                if error:
+                    job['error'] = error
+                    self.failed += 1
+                else:
+                    self.completed += 1
+                self.running -= 1
+                if self._active.get(job['key']) is job:
+                    del self._active[job['key']]
+                self._run_times.append(job['finished'] - job['started'])
+                self._finished.notify_all()
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [k for k, job in self._jobs.items() if job.get('finished', math.inf) < cutoff]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _view(job: dict) -> dict:
+        view = {k: job[k] for k in ('id', 'status', 'result', 'error') if k in job}
+        end = job.get('finished', time.time())
+        view['elapsed'] = round(end - job['submitted'], 3)
+        return view
@@ -0,0 +1,90 @@
+"""Closed-loop load test of a running server's chart endpoint.
+
+    python loadtest.py http://127.0.0.1:5000 --concurrency 16 --duration 30 --target 150
+
+Each of --concurrency clients posts one seeded birth (bench.births) to /api/kundli at a time, with keep-alive,
+for --duration seconds after a short warmup. Every request is a new birth, so the chart cache does not help.
+Prints requests per second, latency percentiles and errors. With --target, it exits 1 when the server
+managed fewer requests per second than that or answered more than --max-error-rate with errors.
+"""
+import argparse
+import itertools
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+from bench import births
+
+
+def run(url: str, concurrency: int = 16, duration: float = 30.0, warmup: float = 3.0, seed: int = 1,
+        path: str = '/api/kundli', timeout: float = 30.0) -> dict:
+    """Drive the server and return {requests, errors, seconds, rps, latency_ms: {p50, p95, p99, max}}"""
+    source = births(seed)
+    source_lock = threading.Lock()
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def client(k: int):
+        session = requests.Session()
+        while True:
+            with source_lock:
+                birth = next(source)
+            t0 = time.monotonic()
+            if t0 >= stop_at:
+                return
+            try:
+                ok = session.post(url.rstrip('/') + path, json=birth, timeout=timeout).status_code == 200
+            except requests.RequestException:
+                ok = False
+            t1 = time.monotonic()
+            if t0 >= measure_from:
+                latencies[k].append(t1 - t0)
+                errors[k] += not ok
+
+    threads = [threading.Thread(target=client, args=(k,), daemon=True) for k in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    done = np.array(list(itertools.chain.from_iterable(latencies))) * 1000
+    if not len(done):
+        return {'requests': 0, 'errors': 0, 'seconds': duration, 'rps': 0.0, 'latency_ms': {}}
+    return {
+        'requests': len(done), 'errors': sum(errors), 'seconds': duration,
+        'rps': round(len(done) / duration, 1),
+        'latency_ms': {'p50': round(float(np.percentile(done, 50)), 1), 'p95': round(float(np.percentile(done, 95)), 1),
+                       'p99': round(float(np.percentile(done, 99)), 1), 'max': round(float(done.max()), 1)},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test /api/kundli on a running server')
+    parser.add_argument('url', help='server base URL, e.g. http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=16, help='clients with one request in flight each')
+    parser.add_argument('--duration', type=float, default=30.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3.0, help='unmeasured seconds first')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--target', type=float, help='fail below this many requests per second')
+    parser.add_argument('--max-error-rate', type=float, default=0.001, help='fail above this share of errors')
+    args = parser.parse_args(argv)
+    stats = run(args.url, args.concurrency, args.duration, args.warmup, args.seed)
+    lat = stats['latency_ms']
+    print(f"{stats['requests']} requests in {stats['seconds']:.0f}s: {stats['rps']} req/s, {stats['errors']} errors; "
+          f"latency ms p50 {lat.get('p50')} p95 {lat.get('p95')} p99 {lat.get('p99')} max {lat.get('max')}")
+    if args.target is None:
+        return 0
+    error_rate = stats['errors'] / stats['requests'] if stats['requests'] else 1.0
+    if stats['rps'] < args.target or error_rate > args.max_error_rate:
+        print(f'loadtest: below target ({args.target} req/s, at most {args.max_error_rate:.1%} errors)', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
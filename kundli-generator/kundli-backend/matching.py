@@ -0,0 +1,184 @@
+"""Ashtakoota (guna milan) compatibility from the Moon positions of two charts.
+
+Four kootas depend on the Moon's nakshatra (tara, yoni, gana, nadi) and four on its sign (varna, vashya,
+graha maitri, bhakoot). Both are fixed by the Moon's pada (a quarter nakshatra, 3°20'; nine per sign), so
+every koota is precomputed once as a [108, 108] table indexed by (groom pada, bride pada). Scoring one
+profile against many is then a table gather. Points are stored doubled (half points occur) as uint8.
+"""
+import math
+
+import numpy as np
+
+from chart_core import NAKSHATRAS, NAKSHATRA_SPAN, PLANET_FRIENDS, SIGN_RULERS, SIGNS
+from dasha import moon_longitudes
+
+PADAS = 108
+PADA_SPAN = NAKSHATRA_SPAN / 4
+MAX_POINTS = 36
+
+# Varna by sign: 3 Brahmin (water), 2 Kshatriya (fire), 1 Vaishya (earth), 0 Shudra (air)
+_VARNA = [2, 1, 0, 3, 2, 1, 0, 3, 2, 1, 0, 3]
+# Vashya group by sign, taken per whole sign: 0 quadruped, 1 human, 2 water, 3 wild, 4 insect
+_VASHYA = [0, 0, 1, 2, 3, 1, 1, 4, 0, 2, 1, 2]
+_VASHYA_POINTS = [
+    [2, 1, 1, 0.5, 1],
+    [1, 2, 0.5, 0, 1],
+    [1, 0.5, 2, 1, 1],
+    [0.5, 0, 1, 2, 0],
+    [1, 1, 1, 0, 2],
+]
+# Yoni animal per nakshatra and points between animals
+YONI_ANIMALS = ['Horse', 'Elephant', 'Sheep', 'Serpent', 'Dog', 'Cat', 'Rat', 'Cow', 'Buffalo', 'Tiger', 'Deer',
+                'Monkey', 'Mongoose', 'Lion']
+_YONI = [0, 1, 2, 3, 3, 4, 5, 2, 5, 6, 6, 7, 8, 9, 8, 9, 10, 10, 4, 11, 12, 11, 13, 0, 13, 7, 1]
+_YONI_POINTS = [
+    [4, 2, 2, 3, 2, 2, 2, 1, 0, 1, 3, 3, 2, 1],
+    [2, 4, 3, 3, 2, 2, 2, 2, 3, 1, 2, 3, 2, 0],
+    [2, 3, 4, 2, 1, 2, 1, 3, 3, 1, 2, 0, 3, 1],
+    [3, 3, 2, 4, 2, 1, 1, 1, 1, 2, 2, 2, 0, 2],
+    [2, 2, 1, 2, 4, 2, 1, 2, 2, 1, 0, 2, 1, 1],
+    [2, 2, 2, 1, 2, 4, 0, 2, 2, 1, 3, 3, 2, 1],
+    [2, 2, 1, 1, 1, 0, 4, 2, 2, 2, 2, 2, 1, 2],
+    [1, 2, 3, 1, 2, 2, 2, 4, 3, 0, 3, 2, 2, 1],
+    [0, 3, 3, 1, 2, 2, 2, 3, 4, 1, 2, 2, 2, 1],
+    [1, 1, 1, 2, 1, 1, 2, 0, 1, 4, 1, 1, 2, 1],
+    [3, 2, 2, 2, 0, 3, 2, 3, 2, 1, 4, 2, 2, 1],
+    [3, 3, 0, 2, 2, 3, 2, 2, 2, 1, 2, 4, 3, 2],
+    [2, 2, 3, 0, 1, 2, 1, 2, 2, 2, 2, 3, 4, 2],
+    [1, 0, 1, 2, 1, 1, 2, 1, 1, 1, 1, 2, 2, 4],
+]
+# Gana per nakshatra: 0 Deva, 1 Manushya, 2 Rakshasa; points [groom gana][bride gana]
+_GANA = [0, 1, 2, 1, 0, 1, 0, 0, 2, 2, 1, 1, 0, 2, 0, 2, 0, 2, 2, 1, 1, 0, 2, 2, 1, 1, 0]
+_GANA_POINTS = [[6, 6, 1], [5, 6, 0], [1, 0, 6]]
+# Nadi per nakshatra: 0 Adi, 1 Madhya, 2 Antya
+_NADI = [[0, 1, 2, 2, 1, 0][k % 6] for k in range(27)]
+# Graha maitri points by how each sign lord regards the other
+_MAITRI_POINTS = {('friends', 'friends'): 5, ('friends', 'neutral'): 4, ('neutral', 'neutral'): 3,
+                  ('friends', 'enemies'): 1, ('neutral', 'enemies'): 0.5, ('enemies', 'enemies'): 0}
+
+KOOTAS = ['varna', 'vashya', 'tara', 'yoni', 'graha_maitri', 'gana', 'bhakoot', 'nadi']
+KOOTA_MAX = {'varna': 1, 'vashya': 2, 'tara': 3, 'yoni': 4, 'graha_maitri': 5, 'gana': 6, 'bhakoot': 7, 'nadi': 8}
+
+
+def _relation(a: str, b: str) -> str:
+    if a == b:
+        return 'friends'
+    return next(kind for kind in ('friends', 'neutral', 'enemies') if b in PLANET_FRIENDS[a][kind])
+
+
+def _tara_ok(count: int) -> bool:
+    return count % 9 not in (3, 5, 7)
+
+
+def _sign_points(koota: str, groom: int, bride: int) -> float:
+    if koota == 'varna':
+        return 1 if _VARNA[groom] >= _VARNA[bride] else 0
+    if koota == 'vashya':
+        return _VASHYA_POINTS[_VASHYA[groom]][_VASHYA[bride]]
+    if koota == 'graha_maitri':
+        ga, br = SIGN_RULERS[SIGNS[groom]], SIGN_RULERS[SIGNS[bride]]
+        pair = tuple(sorted((_relation(ga, br), _relation(br, ga)), key=('friends', 'neutral', 'enemies').index))
+        return _MAITRI_POINTS[pair]
+    # bhakoot: 2/12, 5/9 and 6/8 sign relationships score nothing
+    apart = {(groom - bride) % 12 + 1, (bride - groom) % 12 + 1}
+    return 0 if apart in ({2, 12}, {5, 9}, {6, 8}) else 7
+
+
+def _nakshatra_points(koota: str, groom: int, bride: int) -> float:
+    if koota == 'tara':
+        return 1.5 * _tara_ok((groom - bride) % 27 + 1) + 1.5 * _tara_ok((bride - groom) % 27 + 1)
+    if koota == 'yoni':
+        return _YONI_POINTS[_YONI[groom]][_YONI[bride]]
+    if koota == 'gana':
+        return _GANA_POINTS[_GANA[groom]][_GANA[bride]]
+    return 0 if _NADI[groom] == _NADI[bride] else 8
+
+
+def _build_tables():
+    """{koota: [27, 27] or [12, 12] points} and the same expanded to [108, 108] doubled points"""
+    small = {}
+    for koota in KOOTAS:
+        if koota in ('tara', 'yoni', 'gana', 'nadi'):
+            small[koota] = np.array([[_nakshatra_points(koota, g, b) for b in range(27)] for g in range(27)])
+        else:
+            small[koota] = np.array([[_sign_points(koota, g, b) for b in range(12)] for g in range(12)])
+    pada = np.arange(PADAS)
+    index = {27: pada // 4, 12: pada // 9}
+    tables = {koota: (2 * t[np.ix_(index[len(t)], index[len(t)])]).astype(np.uint8) for koota, t in small.items()}
+    return small, tables
+
+
+KOOTA_TABLES, _PADA_TABLES = _build_tables()
+# Total doubled points [groom pada, bride pada]
+_TOTAL = sum(t.astype(np.uint16) for t in _PADA_TABLES.values()).astype(np.uint8)
+
+
+def moon_padas(moon_lons) -> np.ndarray:
+    """Pada index 0-107 of sidereal Moon longitudes"""
+    return (np.asarray(moon_lons, dtype=float) % 360 // PADA_SPAN).astype(np.intp) % PADAS
+
+
+def pada_info(pada: int) -> dict:
+    return {'nakshatra': NAKSHATRAS[pada // 4], 'pada': pada % 4 + 1, 'moon_sign': SIGNS[pada // 9]}
+
+
+def score(groom_pada: int, bride_pada: int) -> dict:
+    """Points per koota and the total out of 36"""
+    kootas = {k: float(_PADA_TABLES[k][groom_pada, bride_pada]) / 2 for k in KOOTAS}
+    return {'total': sum(kootas.values()), 'max': MAX_POINTS, 'kootas': kootas}
+
+
+def scores(pada: int, padas: np.ndarray, as_groom: bool = True) -> np.ndarray:
+    """Total points (float) of one profile against many: the profile is the groom, or the bride"""
+    table = _TOTAL[pada] if as_groom else _TOTAL[:, pada]
+    return table[padas] / 2
+
+
+def top_matches(pada: int, padas: np.ndarray, k: int = 10, as_groom: bool = True, min_points: float = 0):
+    """(indices, points) of the k best-scoring profiles, best first; ties keep input order"""
+    table = _TOTAL[pada] if as_groom else _TOTAL[:, pada]
+    doubled = table[padas]
+    if min_points:
+        candidates = np.flatnonzero(doubled >= 2 * min_points)
+    else:
+        candidates = np.arange(len(padas))
+    k = min(k, len(candidates))
+    if k <= 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0)
+    sub = doubled[candidates]
+    if k < len(candidates):
+        # The k-th best score, then everything above it plus the earliest ties
+        cut = np.partition(sub, len(sub) - k)[len(sub) - k]
+        above = np.flatnonzero(sub > cut)
+        ties = np.flatnonzero(sub == cut)[:k - len(above)]
+        chosen = np.concatenate([above, ties])
+    else:
+        chosen = np.arange(len(sub))
+    chosen = chosen[np.lexsort((chosen, -sub[chosen].astype(int)))]
+    return candidates[chosen], sub[chosen] / 2
+
+
+def profile_padas(items: list):
+    """(padas[N], errors) for profiles given as a Moon longitude, {moon_lon} or birth data {date, time, tz}"""
+    lons = np.zeros(len(items))
+    errors = {}
+    births = []
+    for i, item in enumerate(items):
+        try:
+            lon = item if isinstance(item, (int, float)) else item.get('moon_lon') if isinstance(item, dict) else None
+            if lon is None:
+                births.append(i)
+            elif not math.isfinite(float(lon)):
+                raise ValueError(f'moon_lon must be a finite number, not {lon!r}')
+            else:
+                lons[i] = lon
+        except (ValueError, TypeError) as e:
+            errors[i] = f'invalid profile: {e!r}'
+    if births:
+        moon, _, birth_errors = moon_longitudes([items[i] if isinstance(items[i], dict) else {} for i in births])
+        for k, i in enumerate(births):
+            if k in birth_errors:
+                errors[i] = birth_errors[k]
+            else:
+                lons[i] = moon[k]
+    return moon_padas(lons), errors
@@ -0,0 +1,142 @@
+"""Birth-time rectification: how the time-sensitive parts of a chart change across a window of birth times.
+
+Over a day the ascendant goes once round the zodiac and the Moon moves about 13°; every other body moves
+a degree or less, so a day of candidate times shares one set of slow positions. A sweep therefore makes no
+full charts. The Moon is computed at a few nodes (NODE_HOURS apart) and interpolated in between, the
+ascendant comes from swe.houses at each scan point, and every sign, nakshatra or navamsa change found
+between two scan points is solved to a fraction of a second by Brent's method. A day at one-minute steps
+costs about ten Moon positions and a couple of thousand swe.houses calls, which need no ephemeris.
+"""
+import numpy as np
+
+from chart_core import (NAKSHATRA_SPAN, NAKSHATRAS, SIGNS, ascendants, julian_day_to_utc, julian_days, parse_birth,
+                        sidereal_positions)
+from ephemeris import parse_step
+from events import brent
+from varga import varga_longitudes
+
+NODE_HOURS = 6              # spacing of the Moon positions that are interpolated between
+MAX_SCAN_MINUTES = 4        # scan points are at least this close even for coarser steps
+MAX_WINDOW_MINUTES = 3 * 1440
+MAX_LATITUDE = 66.0         # beyond the polar circles the ascendant jumps and cannot be swept
+_NAVAMSA = 30 / 9           # D9 part: 3°20', which divides both signs and nakshatras
+
+# Quantity -> (what it follows, span of one value, names)
+QUANTITIES = {
+    'asc_sign': ('asc', 30, SIGNS),
+    'd9_asc_sign': ('asc', _NAVAMSA, None),
+    'moon_sign': ('moon', 30, SIGNS),
+    'moon_nakshatra': ('moon', NAKSHATRA_SPAN, NAKSHATRAS),
+}
+
+
+def hermite(node_jds: np.ndarray, lons: np.ndarray, speeds: np.ndarray, jds: np.ndarray) -> np.ndarray:
+    """Longitudes at jds from positions and daily speeds at sorted nodes (cubic Hermite, wrapped to 0-360)"""
+    i = np.clip(np.searchsorted(node_jds, jds, side='right') - 1, 0, len(node_jds) - 2)
+    h = node_jds[i + 1] - node_jds[i]
+    t = (jds - node_jds[i]) / h
+    d = (lons[i + 1] - lons[i] + 180) % 360 - 180
+    m0, m1 = speeds[i] * h, speeds[i + 1] * h
+    t2, t3 = t * t, t * t * t
+    return (lons[i] + (t3 - 2 * t2 + t) * m0 + (3 * t2 - 2 * t3) * d + (t3 - t2) * m1) % 360
+
+
+def _crossings(jds: np.ndarray, lons: np.ndarray, parts: list, value_at):
+    """(jd, longitude) of every crossing of a multiple of a span in parts, solved with value_at(jd).
+
+    lons must move forward by less than 180° between samples, as the ascendant and the Moon do.
+    """
+    unwrapped = lons[0] + np.concatenate([[0], np.cumsum((np.diff(lons) + 180) % 360 - 180)])
+    found = []
+    for k in np.flatnonzero(np.diff(np.floor(unwrapped / _NAVAMSA)) != 0):
+        first, last = int(np.floor(unwrapped[k] / _NAVAMSA)) + 1, int(np.floor(unwrapped[k + 1] / _NAVAMSA))
+        for m in range(first, last + 1):
+            boundary = m * _NAVAMSA
+            if not any(abs(boundary / span - round(boundary / span)) < 1e-9 for span in parts):
+                continue
+
+            def g(jd, boundary=boundary):
+                return (value_at(jd) - boundary + 180) % 360 - 180
+            found.append((brent(g, jds[k], jds[k + 1], unwrapped[k] - boundary, unwrapped[k + 1] - boundary),
+                          boundary % 360))
+    return found
+
+
+def _label(quantity: str, lon: float) -> str:
+    _, span, names = QUANTITIES[quantity]
+    lon = lon + 1e-9  # a value exactly on a boundary belongs to the part it starts
+    if names is None:  # D9 ascendant
+        return SIGNS[int(varga_longitudes(lon, 9) // 30) % 12]
+    return names[int(lon // span) % len(names)]
+
+
+def parse_request(data: dict) -> dict:
+    """Window from {date, start: 'HH:MM', window: '24h', step: '1m', lat, lon, tz[, ayanamsa]}"""
+    birth = parse_birth({**data, 'time': data.get('start', '00:00')})
+    step = parse_step(data.get('step', '1m'))
+    window = parse_step(data.get('window', '24h'))
+    if window > MAX_WINDOW_MINUTES:
+        raise ValueError(f'window too long ({window} > {MAX_WINDOW_MINUTES} minutes)')
+    if step > window:
+        raise ValueError('step is longer than the window')
+    if abs(birth['lat']) > MAX_LATITUDE:
+        raise ValueError(f'latitude beyond ±{MAX_LATITUDE:g}°: the ascendant is not continuous there')
+    return {**birth, 'step': step, 'window': window}
+
+
+def sweep(window: dict, steps: bool = False) -> dict:
+    """Segments of constant ascendant sign, D9 ascendant sign, Moon sign and Moon nakshatra over the window.
+
+    Segment times are local ('YYYY-MM-DDTHH:MM:SS'); a segment ends where the next one starts. With steps,
+    the values at every step of the window are added as columns.
+    """
+    start_jd = float(julian_days(np.array([window['date']]), np.array([window['minutes']]),
+                                 np.array([window['tz']]))[0])
+    end_jd = start_jd + window['window'] / 1440
+    per_step = -(-window['step'] // MAX_SCAN_MINUTES)
+    on_grid = window['window'] // window['step'] * per_step + 1
+    scan = start_jd + np.arange(on_grid) * (window['step'] / per_step / 1440)
+    if scan[-1] < end_jd - 1e-9:
+        scan = np.append(scan, end_jd)
+
+    node_count = int(np.ceil(window['window'] / (NODE_HOURS * 60))) + 1
+    nodes = start_jd + np.arange(node_count) * (NODE_HOURS / 24)
+    node_lons, node_speeds, node_ayanamsa, errors = sidereal_positions(nodes, ['Mo'], window['sid_mode'])
+    if errors:
+        raise ValueError(next(iter(errors.values())))
+    ayanamsa = lambda jds: np.interp(jds, nodes, node_ayanamsa)
+    lat, lon, mode = np.array([window['lat']]), np.array([window['lon']]), window['sid_mode']
+
+    def asc_at(jd):
+        return float(ascendants(np.array([jd]), lat, lon, ayanamsa(np.array([jd])))[0])
+
+    def moon_at(jd):
+        return float(sidereal_positions(np.array([jd]), ['Mo'], mode)[0][0, 0])
+
+    values = {'asc': ascendants(scan, np.full(len(scan), lat[0]), np.full(len(scan), lon[0]), ayanamsa(scan)),
+              'moon': hermite(nodes, node_lons[:, 0], node_speeds[:, 0], scan)}
+    solve = {'asc': asc_at, 'moon': moon_at}
+    local = lambda jds: [str(t) for t in julian_day_to_utc(np.asarray(jds) + window['tz'] / 24)]
+
+    segments = {}
+    for follows in ('asc', 'moon'):
+        names = [q for q, (f, _, _) in QUANTITIES.items() if f == follows]
+        changes = sorted(_crossings(scan, values[follows], [QUANTITIES[q][1] for q in names], solve[follows]))
+        for q in names:
+            span = QUANTITIES[q][1]
+            cuts = [(jd, at) for jd, at in changes if abs(at / span - round(at / span)) < 1e-9]
+            starts = [start_jd] + [jd for jd, _ in cuts]
+            labels = [_label(q, values[follows][0])] + [_label(q, at) for _, at in cuts]
+            times = local(starts + [end_jd])
+            segments[q] = [{'value': label, 'start': times[k], 'end': times[k + 1]} for k, label in enumerate(labels)]
+
+    result = {'start': local([start_jd])[0], 'end': local([end_jd])[0], 'step_minutes': window['step'],
+              'segments': segments}
+    if steps:
+        at = slice(0, on_grid, per_step)
+        asc, moon = values['asc'][at], values['moon'][at]
+        result['steps'] = {
+            'time': local(scan[at]), 'asc': np.round(asc, 4).tolist(), 'moon': np.round(moon, 4).tolist(),
+            **{q: [_label(q, x) for x in (asc if f == 'asc' else moon)] for q, (f, _, _) in QUANTITIES.items()},
+        }
+    return result
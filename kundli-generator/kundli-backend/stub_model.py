@@ -0,0 +1,136 @@
+"""Local stand-in for a text-generation-inference server, for exercising the AI endpoints without Hugging Face.
+
+    python stub_model.py --port 8089 --delay 2
+    HF_MODEL=http://127.0.0.1:8089 python app.py
+
+It answers POST / (text generation) and POST /v1/chat/completions (chat) with a canned reading that
+ends in a follow-up turn, so the response cleaning is exercised too. --task limits it to one of the two
+so the chat fallback can be tested, and --fail-rate makes a share of requests return 503. Requests with
+"stream": true get the reply as server-sent events, one word per --token-delay; `tokens_sent` counts
+what was actually written, which shows whether a client stopped generation early.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = ("Your chart shows a steady Ascendant lord, which gives you patience when others rush.\n"
+         "Jupiter's aspect on your tenth house favours work that teaches or advises.\n"
+         "[USER] What about marriage?\n"
+         "ASSISTANT: Venus suggests...")
+
+
+class StubModel(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, delay: float = 0.0, fail_rate: float = 0.0, task: str = 'both',
+                 token_delay: float = 0.02):
+        super().__init__(address, _Handler)
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.task = task
+        self.token_delay = token_delay
+        self.requests = 0
+        self.paths = Counter()  # requests per route, to check which task a client probes
+        self.tokens_sent = 0
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_port}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, and chunked streams like a real server
+    disable_nagle_algorithm = True  # small writes go out at once instead of waiting on delayed ACKs
+
+    def do_POST(self):
+        server = self.server
+        server.requests += 1
+        server.paths[self.path] += 1
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(server.delay)
+        if random.random() < server.fail_rate:
+            return self._send(503, {'error': 'stub model overloaded'})
+        chat = self.path.rstrip('/').endswith('/chat/completions')
+        if server.task != 'both' and server.task != ('chat' if chat else 'text'):
+            return self._send(400, {'error': f'model does not support this task ({self.path})'})
+        if body.get('stream'):
+            return self._stream(chat)
+        if chat:
+            return self._send(200, {
+                'id': 'stub', 'object': 'chat.completion', 'created': int(time.time()), 'model': 'stub',
+                'system_fingerprint': 'stub',
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': REPLY}}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+            })
+        self._send(200, [{'generated_text': REPLY}])
+
+    def _stream(self, chat: bool):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for i, token in enumerate(re.findall(r'\S+\s*', REPLY)):
+                time.sleep(self.server.token_delay)
+                if chat:
+                    event = {'id': 'stub', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'stub',
+                             'system_fingerprint': 'stub',
+                             'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': token}}]}
+                else:
+                    event = {'index': i, 'token': {'id': i, 'text': token, 'logprob': 0.0, 'special': False},
+                             'generated_text': None, 'details': None}
+                self._chunk(f'data:{json.dumps(event)}\n\n'.encode())
+                self.server.tokens_sent += 1
+            self._chunk(b'data: [DONE]\n\n')
+            self._chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped reading
+        self.close_connection = True
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _send(self, status: int, payload):
+        raw = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        try:
+            self.wfile.write(raw)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int = 0, **options) -> StubModel:
+    """Start a stub in a background thread (port 0 picks a free one) at its .url"""
+    server = StubModel(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stub text-generation server for local testing')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds before each response')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of requests answered with 503')
+    parser.add_argument('--task', choices=['both', 'text', 'chat'], default='both')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='seconds between streamed tokens')
+    args = parser.parse_args(argv)
+    server = StubModel(('127.0.0.1', args.port), args.delay, args.fail_rate, args.task, args.token_delay)
+    print(f'stub model on http://127.0.0.1:{args.port}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
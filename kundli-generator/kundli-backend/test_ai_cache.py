@@ -0,0 +1,39 @@
+from ai_cache import ResponseCache, ResponseStore, response_key
+from cache import LRUCache
+from test_jobs import ANSWER, question
+
+
+def test_answer_survives_a_restart(client, app_module, monkeypatch, stub, tmp_path):
+    path = str(tmp_path / 'answers.sqlite')
+    monkeypatch.setattr(app_module, 'ai_cache', ResponseCache(LRUCache(), ResponseStore(path)))
+    assert client.post('/api/ai-analysis', json=question('career?')).get_json()['response'] == ANSWER
+
+    # A new process: empty memory tier, the same file on disk
+    monkeypatch.setattr(app_module, 'ai_cache', ResponseCache(LRUCache(), ResponseStore(path)))
+    again = client.post('/api/ai-analysis', json=question('  career?\n')).get_json()
+    assert again == {'response': ANSWER, 'cached': True}
+    assert stub.requests == 1
+    assert app_module.ai_cache.stats()['disk']['hits'] == 1
+
+
+def test_key_ignores_whitespace_but_not_model_or_params():
+    key = response_key('What  about\nmy career?', 'model-a', {'max_new_tokens': 300})
+    assert key == response_key(' What about my career? ', 'model-a', {'max_new_tokens': 300})
+    assert key != response_key('What about my career?', 'model-b', {'max_new_tokens': 300})
+    assert key != response_key('What about my career?', 'model-a', {'max_new_tokens': 400})
+
+
+def test_store_evicts_least_recently_used_past_its_byte_bound(tmp_path):
+    store = ResponseStore(str(tmp_path / 'answers.sqlite'), max_bytes=1000)
+    for k in range(3):
+        store.put(f'k{k}', 'model', 'x' * 300)
+    assert store.get('k0') is not None  # k1 is now the least recently used
+    store.put('k3', 'model', 'y' * 300)
+    assert store.bytes <= 1000 * 0.9
+    assert store.get('k1') is None
+    assert [store.get(k) is not None for k in ('k0', 'k2', 'k3')] == [True, True, True]
+    assert store.stats()['evictions'] == 1
+
+    # The byte count is rebuilt from the table when the store is reopened
+    reopened = ResponseStore(store.path, max_bytes=1000)
+    assert reopened.bytes == store.bytes == 900
@@ -0,0 +1,51 @@
+import json
+
+from ai import clean_response
+from stub_model import REPLY
+from test_jobs import question
+
+ANSWER = clean_response(REPLY)
+
+
+def events(body: str) -> list:
+    """[(event name or None, data)] of a text/event-stream body"""
+    parsed = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        parsed.append((fields.get('event'), json.loads(fields['data'])))
+    return parsed
+
+
+def test_stream_relays_pieces_then_done(client):
+    resp = client.post('/api/ai-analysis/stream', json=question('career?'))
+    assert resp.mimetype == 'text/event-stream'
+    got = events(resp.get_data(as_text=True))
+    assert got[0][0] == 'queued'
+    assert got[-1] == ('done', {'response': ANSWER})
+    assert ''.join(data['text'] for name, data in got[1:-1]) == ANSWER
+
+
+def test_stream_reports_a_lost_job(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module.ai_jobs, 'get', lambda job_id, wait=0: None)
+    got = events(client.post('/api/ai-analysis/stream', json=question('family?')).get_data(as_text=True))
+    assert got[-1][0] == 'error'
+    assert 'error' in got[-1][1]
+
+
+def test_request_alongside_a_disconnected_stream_gets_the_whole_answer(client, app_module, stub):
+    stub.token_delay = 0.05
+    body = question('children?')
+    stream = client.post('/api/ai-analysis/stream', json=body, buffered=False)
+    chunks = iter(stream.response)
+    received = b''
+    while b'"text"' not in received:
+        received += next(chunks)  # the model is streaming to this client now
+
+    # An identical question while the stream runs, then the streaming client goes away
+    waiting = client.post('/api/ai-analysis/jobs', json=body).get_json()
+    assert waiting['job_id'] != events(received.decode().split('\n\n', 1)[0])[0][1]['job_id']
+    stream.close()
+
+    final = app_module.ai_jobs.get(waiting['job_id'], wait=10)
+    assert final['status'] == 'done'
+    assert final['result'] == ANSWER
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from chart_store import ChartStore
+from wire import PACKED_MIMETYPE
+
+BIRTH = {'date': '1990-05-15', 'time': '10:30', 'lat': 28.6, 'lon': 77.2, 'tz': 5.5}
+
+
+@pytest.fixture
+def store(app_module, monkeypatch, tmp_path):
+    store = ChartStore(str(tmp_path / 'charts.db'))
+    monkeypatch.setattr(app_module, 'chart_store', store)
+    return store
+
+
+def stored(store) -> dict:
+    """{ref: (lons, asc_sign)} of every stored chart"""
+    charts = {}
+    for refs, lons, asc, _ in store.scan():
+        charts.update({ref: (lons[k], int(asc[k])) for k, ref in enumerate(refs)})
+    return charts
+
+
+def test_kundli_stores_its_ref_in_every_format(client, store):
+    assert client.post('/api/kundli', json=dict(BIRTH, ref='json')).status_code == 200
+    resp = client.post('/api/kundli', json=dict(BIRTH, ref='packed'), headers={'Accept': PACKED_MIMETYPE})
+    assert resp.status_code == 200
+    assert resp.mimetype == PACKED_MIMETYPE
+    # Without D1 in the answer the store still gets the D1 chart
+    resp = client.post('/api/kundli', json=dict(BIRTH, ref='packed-d9', chart_type='D9'),
+                       headers={'Accept': PACKED_MIMETYPE})
+    assert resp.status_code == 200
+
+    charts = stored(store)
+    assert sorted(charts) == ['json', 'packed', 'packed-d9']
+    for ref in ('packed', 'packed-d9'):
+        np.testing.assert_array_equal(charts[ref][0], charts['json'][0])
+        assert charts[ref][1] == charts['json'][1]
+
+
+def test_failed_binary_chart_is_not_stored(client, store):
+    resp = client.post('/api/kundli', json=dict(BIRTH, ref='bad', date='1990-13-40'),
+                       headers={'Accept': PACKED_MIMETYPE})
+    assert resp.status_code == 400
+    assert stored(store) == {}
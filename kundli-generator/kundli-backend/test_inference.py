@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from inference import CircuitBreaker, CircuitOpen, DeadlineExceeded, InferenceError, InferenceProvider
+from stub_model import REPLY
+
+
+def test_learns_the_task_and_skips_the_failing_route(stub):
+    stub.task = 'chat'
+    provider = InferenceProvider(stub.url, timeout=10)
+    assert provider.generate('first') == REPLY
+    assert provider.task == 'chat'
+    assert stub.paths == {'/': 1, '/v1/chat/completions': 1}
+    assert provider.generate('second') == REPLY
+    assert ''.join(provider.stream('third')) == REPLY
+    assert stub.paths == {'/': 1, '/v1/chat/completions': 3}
+
+
+def test_generate_deadline(stub):
+    stub.delay = 1.0
+    provider = InferenceProvider(stub.url, timeout=0.3)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        provider.generate('slow')
+    assert time.monotonic() - started < 0.8
+    assert provider.breaker.failures == 1
+
+
+def test_stream_deadline_covers_the_whole_call(stub):
+    # Headers take most of the budget; streaming gets only what is left of the same deadline
+    stub.delay = 0.4
+    stub.token_delay = 0.05
+    provider = InferenceProvider(stub.url, timeout=0.6)
+    started = time.monotonic()
+    pieces = []
+    with pytest.raises(DeadlineExceeded):
+        for text in provider.stream('slow'):
+            pieces.append(text)
+    assert time.monotonic() - started < 0.9
+    assert 0 < len(pieces) < len(REPLY.split())
+    assert provider.breaker.failures == 1
+
+
+def test_stalled_stream_opens_the_breaker(stub):
+    stub.token_delay = 2.0
+    provider = InferenceProvider(stub.url, timeout=0.3, breaker=CircuitBreaker(threshold=1, reset_after=60))
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        list(provider.stream('stalls after the headers'))
+    assert time.monotonic() - started < 1.0
+    assert provider.breaker.state == 'open'
+
+
+def test_breaker_opens_fails_fast_then_recovers(stub):
+    stub.fail_rate = 1.0
+    provider = InferenceProvider(stub.url, timeout=10, breaker=CircuitBreaker(threshold=2, reset_after=0.3))
+    for _ in range(2):
+        with pytest.raises(InferenceError, match='503'):
+            provider.generate('down')
+    assert provider.breaker.state == 'open'
+    calls = stub.requests
+    with pytest.raises(CircuitOpen):
+        provider.generate('fails fast')
+    assert stub.requests == calls
+
+    time.sleep(0.35)
+    stub.fail_rate = 0.0
+    assert provider.generate('trial') == REPLY  # the half-open trial call
+    assert provider.breaker.state == 'closed'
+    assert ''.join(provider.stream('again')) == REPLY
+    assert provider.breaker.state == 'closed'
+
+
+def test_failed_trial_reopens_the_breaker(stub):
+    stub.fail_rate = 1.0
+    provider = InferenceProvider(stub.url, timeout=10, breaker=CircuitBreaker(threshold=1, reset_after=0.2))
+    with pytest.raises(InferenceError):
+        provider.generate('down')
+    time.sleep(0.25)
+    with pytest.raises(InferenceError, match='503'):
+        provider.generate('trial')
+    assert provider.breaker.state == 'open'
+    with pytest.raises(CircuitOpen):
+        provider.generate('fails fast')
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from ai import clean_response
+from inference import InferenceProvider
+from jobs import JobQueue, QueueFull, RateLimiter
+from stub_model import REPLY
+
+ANSWER = clean_response(REPLY)
+
+
+def question(text: str) -> dict:
+    return {'question': text, 'user_name': 'Asha', 'kundli_data': {'asc_sign': 'Leo', 'sign_planets': {}}}
+
+
+def test_rate_limited_client_gets_429_with_retry_after(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'ai_rate_limiter', RateLimiter(rate=1 / 30, burst=1))
+    assert client.post('/api/ai-analysis', json=question('career?')).status_code == 200
+    resp = client.post('/api/ai-analysis', json=question('marriage?'))
+    assert resp.status_code == 429
+    assert 1 <= int(resp.headers['Retry-After']) <= 30
+    assert resp.get_json()['cooldown'] == int(resp.headers['Retry-After'])
+
+
+def test_full_queue_refuses_new_jobs():
+    release = threading.Event()
+    jobs = JobQueue(lambda payload: release.wait(5), workers=1, max_queue=1)
+    first = jobs.submit('a')
+    deadline = time.monotonic() + 5
+    while jobs.get(first['id'])['status'] != 'running' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    jobs.submit('b')  # waits in the queue
+    with pytest.raises(QueueFull) as refused:
+        jobs.submit('c')
+    assert refused.value.retry_after >= 1
+    assert jobs.stats()['rejected'] == 1
+    release.set()
+
+
+def test_full_queue_answers_429(client, app_module, monkeypatch, stub):
+    stub.delay = 0.5
+    jobs = JobQueue(app_module._run_ai_job, workers=1, max_queue=1)
+    monkeypatch.setattr(app_module, 'ai_jobs', jobs)
+    responses = [client.post('/api/ai-analysis/jobs', json=question('question 0'))]
+    deadline = time.monotonic() + 5
+    while jobs.stats()['running'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    responses += [client.post('/api/ai-analysis/jobs', json=question(f'question {k}')) for k in (1, 2)]
+    assert [r.status_code for r in responses] == [202, 202, 429]
+    assert int(responses[2].headers['Retry-After']) >= 1
+    for r in responses[:2]:
+        assert jobs.get(r.get_json()['job_id'], wait=5)['status'] == 'done'
+
+
+def test_workers_cap_concurrent_model_calls(stub):
+    stub.delay = 0.1
+    provider = InferenceProvider(stub.url, timeout=10)
+    lock = threading.Lock()
+    in_flight = [0, 0]  # now, most seen
+
+    def handler(prompt):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        try:
+            return provider.generate(prompt)
+        finally:
+            with lock:
+                in_flight[0] -= 1
+
+    jobs = JobQueue(handler, workers=2, max_queue=10)
+    ids = [jobs.submit(f'prompt {k}')['id'] for k in range(6)]
+    results = [jobs.get(job_id, wait=10) for job_id in ids]
+    assert [r['status'] for r in results] == ['done'] * 6
+    assert in_flight[1] == 2
+    assert stub.requests == 6
+
+
+def test_submit_and_poll(client, stub):
+    stub.delay = 0.2
+    resp = client.post('/api/ai-analysis/jobs', json=question('health?'))
+    assert resp.status_code == 202
+    job = resp.get_json()
+    assert job['status'] in ('queued', 'running')
+    assert resp.headers['Location'] == f"/api/ai-analysis/jobs/{job['job_id']}"
+    polled = client.get(resp.headers['Location'] + '?wait=5').get_json()
+    assert polled['status'] == 'done'
+    assert polled['response'] == ANSWER
+    # Asked again, the answer comes from the cache without a model call
+    again = client.post('/api/ai-analysis', json=question('health?')).get_json()
+    assert again == {'response': ANSWER, 'cached': True}
+    assert stub.requests == 1
+
+
+def test_identical_questions_share_one_job(client, app_module, stub):
+    stub.delay = 0.3
+    answers = []
+
+    def ask():
+        answers.append(app_module.app.test_client().post('/api/ai-analysis', json=question('wealth?')).get_json())
+
+    askers = [threading.Thread(target=ask) for _ in range(2)]
+    for t in askers:
+        t.start()
+    for t in askers:
+        t.join()
+    assert [a['response'] for a in answers] == [ANSWER, ANSWER]
+    assert answers[0]['job_id'] == answers[1]['job_id']
+    assert app_module.ai_jobs.stats()['shared'] == 1
+    assert stub.requests == 1
+
+
+def test_lost_job_answers_503(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module.ai_jobs, 'get', lambda job_id, wait=0: None)
+    resp = client.post('/api/ai-analysis', json=question('travel?'))
+    assert resp.status_code == 503
+    assert 'error' in resp.get_json()
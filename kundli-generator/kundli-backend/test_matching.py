@@ -0,0 +1,17 @@
+import math
+
+from matching import profile_padas
+
+
+def test_non_finite_moon_longitudes_are_invalid_profiles():
+    padas, errors = profile_padas([{'moon_lon': math.nan}, math.inf, {'moon_lon': 45.0}, -math.inf])
+    assert sorted(errors) == [0, 1, 3]
+    assert all('finite' in e for e in errors.values())
+    assert int(padas[2]) == 13  # 45° is the second pada of Rohini
+
+
+def test_match_answers_400_for_nan(client):
+    resp = client.post('/api/match', data='{"groom": {"moon_lon": NaN}, "bride": {"moon_lon": 45}}',
+                       content_type='application/json')
+    assert resp.status_code == 400
+    assert resp.get_json()['error'].startswith('groom: ')
@@ -0,0 +1,181 @@
+"""Transit overlays: the sky at one moment laid over many natal charts.
+
+    python transit.py overlay --db charts.sqlite --at 2026-10-18T00:00 --out transits.jsonl
+
+Transit positions are the same for everyone, so they are computed once per time bucket (TransitSnapshot)
+and cached. Most of an overlay depends only on the natal ascendant sign: the natal house each transiting
+body occupies, the houses its aspects fall on and the house strengths of the transit chart read from that
+ascendant. A snapshot works these out for all 12 ascendants up front, so a natal chart costs one table
+lookup plus a comparison of its own longitudes with the transit signs, done for thousands of charts at once.
+Houses, aspects and strengths follow the same rules as /api/kundli.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from aspects import ASPECT_RULES, aspect_table, house_aspects
+from chart_core import (BODIES, SID_MODE, SIGNS, classify_status, house_strength_scores, julian_day_to_utc,
+                        sidereal_positions, status_names, utc_julian_days)
+
+DEFAULT_BUCKET_MINUTES = 60
+_ASPECTS = aspect_table(BODIES, ASPECT_RULES)  # [body, offset]
+_NB = len(BODIES)
+# Overlay lines are written from pre-encoded pieces: '"Sa":["Mo","Ve"]' for every body and bitmask of bodies
+_MASK_BODIES = [[b for j, b in enumerate(BODIES) if mask >> j & 1] for mask in range(1 << _NB)]
+_BODY_MASK_JSON = [[f'"{b}":' + json.dumps(names, separators=(',', ':')) for names in _MASK_BODIES] for b in BODIES]
+
+
+def bucket_start(jd: float, minutes: int) -> float:
+    """Start of the time bucket holding jd, buckets being whole multiples of `minutes` since the epoch (UTC)"""
+    return float(np.floor(jd * 1440 / minutes + 1e-9) * minutes / 1440)
+
+
+class TransitSnapshot:
+    """Transit positions at one instant, and everything about them that depends only on the natal ascendant"""
+
+    def __init__(self, jd: float, sid_mode: int = SID_MODE):
+        lons, speeds, _, errors = sidereal_positions(np.array([jd]), sid_mode=sid_mode)
+        if errors:
+            raise ValueError(errors[0])
+        self.jd = jd
+        self.sid_mode = sid_mode
+        self.lons = lons[0]
+        self.flags = classify_status(lons, speeds)[0]
+        self.sign = (self.lons // 30).astype(int) % 12
+        asc = np.arange(12)
+        # [natal ascendant sign, body]: natal house (1-12) each transiting body is in
+        self.houses = ((self.sign[None, :] - asc[:, None]) % 12 + 1).astype(np.uint8)
+        # [natal ascendant sign, body]: bitmask of natal houses (bit h-1) aspected by each transiting body
+        hits = house_aspects(self.houses.astype(int) - 1, _ASPECTS)
+        self.house_aspects = (hits * (1 << np.arange(12))).sum(axis=-1).astype(np.uint16)
+        # [natal ascendant sign, house]: strength of the transit chart's houses read from that ascendant
+        self.strengths = house_strength_scores(np.repeat(lons, 12, axis=0), np.repeat(self.flags[None], 12, axis=0),
+                                               asc * 30.0)
+
+    def describe(self) -> dict:
+        return {'time': str(julian_day_to_utc(self.jd)), 'jd': self.jd,
+                'positions': {b: float(self.lons[j]) for j, b in enumerate(BODIES)},
+                'signs': {b: SIGNS[self.sign[j]] for j, b in enumerate(BODIES)},
+                'status': {b: status_names(int(self.flags[j])) for j, b in enumerate(BODIES)}}
+
+
+def snapshot(jd: float, sid_mode: int = SID_MODE, bucket_minutes: int = DEFAULT_BUCKET_MINUTES, cache=None):
+    """The TransitSnapshot of the bucket holding jd, from cache (an LRUCache) when it has one"""
+    start = bucket_start(jd, bucket_minutes)
+    key = (start, sid_mode)
+    snap = cache.get(key) if cache is not None else None
+    if snap is None:
+        snap = TransitSnapshot(start, sid_mode)
+        if cache is not None:
+            cache.put(key, snap)
+    return snap
+
+
+def overlay(snap: TransitSnapshot, lons: np.ndarray, asc_sign: np.ndarray) -> dict:
+    """Arrays for N natal charts (lons[N, BODIES], asc_sign[N]) under one transit snapshot:
+
+    houses[N, body]        natal house (1-12) of each transiting body
+    house_aspects[N, body] bitmask of natal houses aspected by each transiting body
+    aspects[N, body]       bitmask of natal bodies (BODIES order) each transiting body aspects, sign to sign
+    conjunctions[N, body]  bitmask of natal bodies in the same sign as each transiting body
+    strengths[N, house]    house strengths of the transit chart from the natal ascendant, houses by sign from Aries
+    """
+    asc_sign = np.asarray(asc_sign, dtype=int)
+    natal_sign = (np.asarray(lons) // 30).astype(int) % 12
+    # [N, transit body, natal body]: sign offset of each natal body from each transiting one
+    offsets = (natal_sign[:, None, :] - snap.sign[None, :, None]) % 12
+    bits = np.uint16(1) << np.arange(_NB, dtype=np.uint16)
+    aspects = _ASPECTS[np.arange(_NB)[None, :, None], offsets]
+    return {
+        'houses': snap.houses[asc_sign],
+        'house_aspects': snap.house_aspects[asc_sign],
+        'aspects': (aspects * bits).sum(axis=-1, dtype=np.uint16),
+        'conjunctions': ((offsets == 0) * bits).sum(axis=-1, dtype=np.uint16),
+        'strengths': snap.strengths[asc_sign],
+    }
+
+
+def overlay_lines(refs: list, result: dict):
+    """One NDJSON line per natal chart from overlay() arrays:
+
+    {"ref", "houses": {body: house}, "house_aspects": {body: [houses]}, "aspects": {body: [natal bodies]},
+     "conjunctions": {body: [natal bodies]}, "strengths": [12]}, leaving out bodies with no aspects or conjunctions.
+    A million lines are a large share of an overlay run, so they are joined from pieces encoded once: the
+    parts that depend only on the ascendant, and each body's list for every bitmask.
+    """
+    shared = {}
+    for n in np.unique(result['houses'][:, 0], return_index=True)[1]:
+        houses = result['houses'][n].tolist()
+        shared[houses[0]] = ',' + json.dumps({
+            'houses': dict(zip(BODIES, houses)),
+            'house_aspects': {b: [h + 1 for h in range(12) if m >> h & 1]
+                              for b, m in zip(BODIES, result['house_aspects'][n].tolist()) if m},
+        }, separators=(',', ':'))[1:-1] + ',"strengths":' + json.dumps(np.round(result['strengths'][n], 3).tolist(),
+                                                                       separators=(',', ':'))
+    pieces = list(enumerate(_BODY_MASK_JSON))
+    for ref, house, aspects, conjunctions in zip(refs, result['houses'][:, 0].tolist(), result['aspects'].tolist(),
+                                                 result['conjunctions'].tolist()):
+        yield (f'{{"ref":{json.dumps(ref)},"aspects":{{{",".join([p[aspects[j]] for j, p in pieces if aspects[j]])}}},'
+               f'"conjunctions":{{{",".join([p[conjunctions[j]] for j, p in pieces if conjunctions[j]])}}}'
+               f'{shared[house]}}}\n')
+
+
+def store_overlay(store, jd: float, where=None, bucket_minutes: int = DEFAULT_BUCKET_MINUTES, cache=None,
+                  chunk: int = 20000):
+    """overlay_lines() for the charts in a chart_store.ChartStore (all, or those matching where), in row order"""
+    for refs, lons, asc, modes in store.scan(where, chunk):
+        if len(modes) and (modes == modes[0]).all():
+            yield from overlay_lines(refs, overlay(snapshot(jd, int(modes[0]), bucket_minutes, cache), lons, asc))
+            continue
+        # Charts under other ayanamsas use other snapshots; their lines go back to their own rows
+        lines = [None] * len(refs)
+        for mode in np.unique(modes):
+            sel = np.flatnonzero(modes == mode)
+            snap = snapshot(jd, int(mode), bucket_minutes, cache)
+            for k, line in zip(sel, overlay_lines([refs[k] for k in sel], overlay(snap, lons[sel], asc[sel]))):
+                lines[k] = line
+        yield from lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Overlay transits on every chart in the chart store')
+    sub = parser.add_subparsers(dest='command', required=True)
+    ov = sub.add_parser('overlay', help='write one JSON line per stored chart')
+    ov.add_argument('--db', default='charts.sqlite')
+    ov.add_argument('--at', help="UTC time 'YYYY-MM-DD[THH:MM]' (default now)")
+    ov.add_argument('--bucket', type=int, default=DEFAULT_BUCKET_MINUTES, help='minutes per transit snapshot')
+    ov.add_argument('--out', default='-', help="JSONL file ('-' for stdout)")
+    ov.add_argument('--ephemeris', help='precomputed ephemeris file to read positions from')
+    args = parser.parse_args(argv)
+
+    from chart_store import ChartStore
+    from ephemeris import time_or_now
+    if args.ephemeris:
+        from chart_core import use_ephemeris_store
+        from ephemeris_store import EphemerisStore
+        use_ephemeris_store(EphemerisStore(args.ephemeris))
+    try:
+        at = time_or_now(args.at)
+    except ValueError as e:
+        parser.error(str(e))
+    jd = float(utc_julian_days(at))
+    started = time.monotonic()
+    out = sys.stdout if args.out == '-' else open(args.out, 'w')
+    count = 0
+    try:
+        for line in store_overlay(ChartStore(args.db), jd, bucket_minutes=args.bucket):
+            out.write(line)
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.monotonic() - started
+    print(f'{count} charts overlaid in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f}/s)', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
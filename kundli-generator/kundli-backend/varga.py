@@ -0,0 +1,82 @@
+import numpy as np
+
+# Supported divisional charts (Parashari vargas)
+DIVISIONS = (1, 2, 3, 4, 7, 9, 10, 12, 16, 20, 24, 27, 30, 40, 45, 60)
+
+_SIGN = np.arange(12)
+_ODD = _SIGN % 2 == 0          # Aries, Gemini, ... are odd signs
+_MODALITY = _SIGN % 3          # 0 movable, 1 fixed, 2 dual
+_ELEMENT = _SIGN % 4           # 0 fire, 1 earth, 2 air, 3 water
+
+# Equal divisions: varga sign of part k in sign s is (start[s] + k * step[s]) % 12
+_RULES = {
+    1: (_SIGN, 1),
+    2: (np.where(_ODD, 4, 3), np.where(_ODD, -1, 1)),   # hora: odd Leo then Cancer, even Cancer then Leo
+    3: (_SIGN, 4),                                      # drekkana: the sign, its 5th, its 9th
+    4: (_SIGN, 3),                                      # chaturthamsa: the sign and its kendras
+    7: (np.where(_ODD, _SIGN, _SIGN + 6), 1),           # saptamsa: even signs start from the 7th
+    9: (_SIGN * 9, 1),                                  # navamsa: fire Aries, earth Capricorn, air Libra, water Cancer
+    10: (np.where(_ODD, _SIGN, _SIGN + 8), 1),          # dasamsa: even signs start from the 9th
+    12: (_SIGN, 1),                                     # dwadasamsa
+    16: (np.choose(_MODALITY, [0, 4, 8]), 1),           # shodasamsa: Aries / Leo / Sagittarius
+    20: (np.choose(_MODALITY, [0, 8, 4]), 1),           # vimsamsa: Aries / Sagittarius / Leo
+    24: (np.where(_ODD, 4, 3), 1),                      # chaturvimsamsa: odd Leo, even Cancer
+    27: (_ELEMENT * 3, 1),                              # bhamsa: Aries / Cancer / Libra / Capricorn
+    40: (np.where(_ODD, 0, 6), 1),                      # khavedamsa: odd Aries, even Libra
+    45: (np.choose(_MODALITY, [0, 4, 8]), 1),           # akshavedamsa: Aries / Leo / Sagittarius
+    60: (_SIGN, 1),                                     # shashtiamsa
+}
+# [n] -> table[sign, part] of varga sign indices, built once
+_TABLES = {n: (np.broadcast_to(start, 12)[:, None] + np.arange(n)[None, :] * np.broadcast_to(step, 12)[:, None]) % 12
+           for n, (start, step) in _RULES.items()}
+
+# Trimsamsa: unequal parts on whole-degree boundaries, (end degree, sign) per part
+_D30_PARTS = {
+    True: [(5, 0), (10, 10), (18, 8), (25, 2), (30, 6)],    # odd: Aries, Aquarius, Sagittarius, Gemini, Libra
+    False: [(5, 1), (12, 5), (20, 11), (25, 9), (30, 7)],   # even: Taurus, Virgo, Pisces, Capricorn, Scorpio
+}
+_D30_SIGN = np.zeros((12, 30), dtype=int)
+_D30_START = np.zeros((12, 30))
+_D30_WIDTH = np.zeros((12, 30))
+for _s in range(12):
+    _start = 0
+    for _end, _sign in _D30_PARTS[bool(_ODD[_s])]:
+        _D30_SIGN[_s, _start:_end] = _sign
+        _D30_START[_s, _start:_end] = _start
+        _D30_WIDTH[_s, _start:_end] = _end - _start
+        _start = _end
+
+
+def parse_division(chart_type) -> int:
+    """'regular' / 'd9' / 'D10' / 10 -> 10; raises ValueError for unsupported charts"""
+    if chart_type == 'regular':
+        return 1
+    name = str(chart_type).upper()
+    try:
+        n = int(name[1:] if name.startswith('D') else name)
+    except ValueError:
+        raise ValueError(f"unknown chart '{chart_type}'") from None
+    if n not in DIVISIONS:
+        raise ValueError(f"unsupported divisional chart '{chart_type}' (supported: D{', D'.join(map(str, DIVISIONS))})")
+    return n
+
+
+def varga_longitudes(lons: np.ndarray, n: int) -> np.ndarray:
+    """Longitudes in the D-n chart for an array of D1 sidereal longitudes (any shape).
+
+    The varga sign comes from the division's table; the degree inside it is the position
+    within the part scaled up to a full 30° sign.
+    """
+    lons = np.asarray(lons, dtype=float)
+    if n == 1:
+        return lons.copy()
+    sign_idx = (lons // 30).astype(int) % 12
+    deg_in_sign = lons % 30
+    if n == 30:
+        whole = np.minimum(deg_in_sign.astype(int), 29)
+        start = _D30_START[sign_idx, whole]
+        width = _D30_WIDTH[sign_idx, whole]
+        return _D30_SIGN[sign_idx, whole] * 30 + (deg_in_sign - start) / width * 30
+    scaled = deg_in_sign * n / 30
+    part = np.minimum(scaled.astype(int), n - 1)
+    return _TABLES[n][sign_idx, part] * 30 + (scaled - part) * 30
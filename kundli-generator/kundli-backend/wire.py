@@ -0,0 +1,148 @@
+"""Compact chart responses and response compression.
+
+Besides JSON, the chart endpoints answer in two binary formats chosen by the Accept header:
+
+- application/vnd.kundli.packed: a little-endian uint32 header length, a JSON header, then one fixed-size
+  record per chart laid out as RECORD_DTYPE. A client reads it with a single struct or numpy view.
+- application/msgpack: the same records as MessagePack columns (requires the msgpack package).
+
+Both are built straight from the chart pipeline's records (chart_core.CHART_DTYPE), less the speeds, signs
+and houses. There are no per-planet dicts, sign names, house descriptions or colors, which the client
+derives from BODIES, the status bits and the strength thresholds in the header. A birth's primary chart
+comes first, then its extra 'charts', each tagged with the birth's index and the division.
+"""
+import gzip
+import json
+import struct
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # optional: Content-Encoding br is offered only when installed
+    brotli = None
+try:
+    import msgpack
+except ImportError:  # optional: application/msgpack is offered only when installed
+    msgpack = None
+
+from chart_core import BODIES, STATUS_FLAGS, birth_points, division_records, julian_days, parse_birth
+from yogas import YOGAS, yoga_bits
+
+JSON_MIMETYPE = 'application/json'
+PACKED_MIMETYPE = 'application/vnd.kundli.packed'
+MSGPACK_MIMETYPE = 'application/msgpack'
+FORMAT_VERSION = 1
+
+RECORD_DTYPE = np.dtype([
+    ('index', '<u4'),                    # position of the birth in the request
+    ('division', 'u1'),                  # 1 for D1, 9 for D9, ...
+    ('asc', '<f8'),                      # sidereal ascendant longitude in this division
+    ('lon', '<f8', (len(BODIES),)),      # sidereal longitudes in BODIES order
+    ('flags', 'u1', (len(BODIES),)),     # status bits, see STATUS_FLAGS
+    ('strength', '<f4', (12,)),          # average strength per house, houses 1-12 by sign from Aries
+    ('yogas', '<u2'),                    # bit k set when the k-th yoga of YOGAS is present
+])
+_YOGA_NAMES = list(YOGAS)
+# Compress only bodies at least this large; below it the headers outweigh the savings
+MIN_COMPRESS_BYTES = 1024
+
+
+def chart_records(items: list):
+    """(records[M] of RECORD_DTYPE, {birth index: error}) for birth dicts, without rendering any chart"""
+    errors = {}
+    births = []
+    for i, item in enumerate(items):
+        try:
+            births.append((i, parse_birth(item)))
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            errors[i] = f'invalid birth data: {e!r}'
+    if not births:
+        return np.zeros(0, RECORD_DTYPE), errors
+
+    idx = np.array([i for i, _ in births])
+    b = [birth for _, birth in births]
+    jds = julian_days(np.array([x['date'] for x in b]), np.array([x['minutes'] for x in b]),
+                      np.array([x['tz'] for x in b]))
+    points, speeds, point_errors = birth_points(jds, b)
+    for k, msg in point_errors.items():
+        errors[int(idx[k])] = msg
+
+    # Per birth: the primary division first, then its extra charts in request order
+    wanted = [list(dict.fromkeys([x['division']] + x['charts'])) if k not in point_errors else []
+              for k, x in enumerate(b)]
+    parts = []
+    for n in sorted({n for w in wanted for n in w}):
+        sel = np.array([n in w for w in wanted], dtype=bool)
+        charts = division_records(points[sel], speeds[sel], n)
+        rec = np.zeros(len(charts), RECORD_DTYPE)
+        rec['index'] = idx[sel]
+        for name in ('division', 'asc', 'lon', 'flags', 'strength'):
+            rec[name] = charts[name]
+        rec['yogas'] = yoga_bits(charts['lon'], (charts['asc'] // 30).astype(int) % 12)
+        parts.append((rec, np.array([w.index(n) for w, s in zip(wanted, sel) if s])))
+    if not parts:
+        return np.zeros(0, RECORD_DTYPE), errors
+    records = np.concatenate([rec for rec, _ in parts])
+    rank = np.concatenate([r for _, r in parts])
+    return records[np.lexsort((rank, records['index']))], errors
+
+
+def header(records: np.ndarray, errors: dict) -> dict:
+    return {
+        'format': 'kundli-charts', 'version': FORMAT_VERSION, 'count': len(records),
+        'bodies': BODIES, 'status_flags': dict(STATUS_FLAGS), 'yogas': _YOGA_NAMES,
+        'strength_labels': {'strong': 0.2, 'weak': -0.2},
+        'fields': [[name, RECORD_DTYPE.fields[name][0].base.str, list(RECORD_DTYPE.fields[name][0].shape)]
+                   for name in RECORD_DTYPE.names],
+        'record_size': RECORD_DTYPE.itemsize,
+        'errors': {str(i): msg for i, msg in sorted(errors.items())},
+    }
+
+
+def encode_packed(records: np.ndarray, errors: dict) -> bytes:
+    head = json.dumps(header(records, errors), separators=(',', ':')).encode()
+    return struct.pack('<I', len(head)) + head + records.astype(RECORD_DTYPE, copy=False).tobytes()
+
+
+def decode_packed(data: bytes):
+    """(header, records) from encode_packed() output"""
+    (size,) = struct.unpack_from('<I', data)
+    head = json.loads(data[4:4 + size])
+    return head, np.frombuffer(data, RECORD_DTYPE, offset=4 + size, count=head['count'])
+
+
+def encode_msgpack(records: np.ndarray, errors: dict) -> bytes:
+    head = header(records, errors)
+    del head['fields'], head['record_size']
+    head['charts'] = {name: records[name].tolist() for name in RECORD_DTYPE.names}
+    return msgpack.packb(head, use_single_float=False)
+
+
+def response_format(accept) -> str:
+    """Mimetype to answer with for a werkzeug Accept header, or None when none of them is acceptable.
+
+    JSON wins ties, so '*/*' and a missing header keep the JSON response.
+    """
+    offers = [JSON_MIMETYPE, PACKED_MIMETYPE] + ([MSGPACK_MIMETYPE, 'application/x-msgpack']
+                                                 if msgpack is not None else [])
+    if not accept:
+        return JSON_MIMETYPE
+    best = accept.best_match(offers)
+    return MSGPACK_MIMETYPE if best == 'application/x-msgpack' else best
+
+
+def encode(records: np.ndarray, errors: dict, mimetype: str) -> bytes:
+    return encode_packed(records, errors) if mimetype == PACKED_MIMETYPE else encode_msgpack(records, errors)
+
+
+def choose_encoding(accept_encodings) -> str:
+    """'br', 'gzip' or None for a werkzeug Accept-Encoding header; br only when the brotli package is installed"""
+    offers = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return accept_encodings.best_match(offers) if accept_encodings else None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
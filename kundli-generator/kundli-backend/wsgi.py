@@ -0,0 +1,16 @@
+"""WSGI entry point for production servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module builds everything the app shares read-only: the parsed dataset, the chart, yoga and
+matching tables, and the memory-mapped ephemeris store and event index. A server that preloads the app (see
+gunicorn.conf.py) does this once in the parent, and forked workers share those pages copy-on-write.
+Anything that cannot cross a fork (AI worker threads, SQLite connections) is reopened in each worker.
+"""
+import gc
+
+from app import app  # noqa: F401  (the WSGI callable)
+
+# Objects built at import live as long as the process. Freezing them keeps the collector from writing to
+# their headers in every worker, which would turn shared pages into private copies.
+gc.freeze()
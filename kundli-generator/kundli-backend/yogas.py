@@ -0,0 +1,259 @@
+"""Yoga detection as compiled rules evaluated over many charts at once.
+
+A chart is reduced to sidereal longitudes per body and the ascendant sign, read from its Chart record
+(record_yogas) or, for charts a client sends back, from the rendered dict (chart_arrays). Each yoga in YOGAS is
+built once at import from a few rule primitives, with house sets and body sets turned into bitmasks. It is then
+a function of the precomputed features returning (hit[N], bodies[N]): whether each chart has the yoga, and a
+bitmask of the bodies forming it.
+"""
+import numpy as np
+
+from aspects import aspect_table, conjunctions, planet_aspects
+from chart_core import (BENEFICS, BODIES, BODY_INDEX, EXALTATION_DEBILITATION, PLANET_FULL_NAMES, SIGN_RULERS, SIGNS,
+                        Chart, render_objects)
+from metrics import stage
+
+KENDRA = [1, 4, 7, 10]
+TRIKONA = [1, 5, 9]
+DUSTHANA = [6, 8, 12]
+UPACHAYA = [3, 6, 10, 11]
+CLASSICAL = ['Su', 'Mo', 'Ma', 'Me', 'Ju', 'Ve', 'Sa']
+
+_RULER = np.array([BODY_INDEX[SIGN_RULERS[s]] for s in SIGNS])  # body index per sign
+_EXALT = np.full(len(BODIES), -1)
+_DEBIL = np.full(len(BODIES), -1)
+for _name, ((_exalt, _), (_debil, _)) in EXALTATION_DEBILITATION.items():
+    _EXALT[BODY_INDEX[_name]] = SIGNS.index(_exalt)
+    _DEBIL[BODY_INDEX[_name]] = SIGNS.index(_debil)
+_ASPECTS = aspect_table(BODIES)
+_ONE = np.uint16(1)
+
+
+def _house_mask(houses) -> np.uint16:
+    return np.uint16(sum(1 << (h - 1) for h in set(houses)))
+
+
+def _body_mask(bodies) -> np.uint16:
+    return np.uint16(sum(1 << BODY_INDEX[b] for b in set(bodies)))
+
+
+def _bodies_in(mask: int) -> list:
+    return [b for j, b in enumerate(BODIES) if mask >> j & 1]
+
+
+def chart_arrays(charts: list):
+    """(lons[N, body], asc_sign[N]) from rendered charts (the /api/kundli shape) in BODIES order"""
+    lons = np.array([[c['positions'][b] for b in BODIES] for c in charts], dtype=float).reshape(-1, len(BODIES))
+    asc = np.array([SIGNS.index(c['asc_sign']) for c in charts], dtype=int)
+    return lons, asc
+
+
+class Features:
+    """Per-chart arrays shared by every rule; built once per batch"""
+
+    def __init__(self, lons: np.ndarray, asc: np.ndarray):
+        self.lons = lons
+        self.sign = (lons // 30).astype(int) % 12
+        self.house = (self.sign - asc[:, None]) % 12  # 0-based, from the ascendant
+        self.house_bits = _ONE << self.house.astype(np.uint16)
+        moon_house = (self.sign - self.sign[:, BODY_INDEX['Mo'], None]) % 12
+        self.moon_house_bits = _ONE << moon_house.astype(np.uint16)
+        self.dignified = (_RULER[self.sign] == np.arange(len(BODIES))) | (self.sign == _EXALT)
+        self.debilitated = self.sign == _DEBIL
+        # lord[n, h]: body ruling house h + 1
+        self.lord = _RULER[(asc[:, None] + np.arange(12)) % 12]
+        # assoc[n, j]: bitmask of bodies conjunct with, aspecting, aspected by or in sign exchange with body j
+        aspects = planet_aspects(lons, _ASPECTS)
+        linked = conjunctions(lons) | aspects | aspects.swapaxes(1, 2)
+        ruler = _RULER[self.sign]
+        exchange = (ruler[:, :, None] == np.arange(len(BODIES))) & (ruler[:, None, :] == np.arange(len(BODIES))[:, None])
+        linked |= exchange & ~np.eye(len(BODIES), dtype=bool)
+        self.assoc = (linked.astype(np.uint16) << np.arange(len(BODIES), dtype=np.uint16)).sum(axis=2, dtype=np.uint16)
+
+    def lords_mask(self, houses) -> np.ndarray:
+        """[N] bitmask of the bodies ruling any of the houses"""
+        mask = np.zeros(len(self.lord), dtype=np.uint16)
+        for h in houses:
+            mask |= _ONE << self.lord[:, h - 1].astype(np.uint16)
+        return mask
+
+
+# Rule primitives: each returns a compiled rule f(Features) -> (hit[N] bool, bodies[N] uint16)
+
+def placed(bodies, houses, ref: str = 'asc', need=1, dignified: bool = False):
+    """`need` of the bodies ('all' for every one) in the houses counted from the ascendant or the Moon"""
+    cols = [BODY_INDEX[b] for b in ([bodies] if isinstance(bodies, str) else bodies)]
+    houses_mask = _house_mask(houses)
+    need = len(cols) if need == 'all' else need
+
+    def rule(f: Features):
+        bits = (f.moon_house_bits if ref == 'moon' else f.house_bits)[:, cols]
+        ok = (bits & houses_mask) != 0
+        if dignified:
+            ok &= f.dignified[:, cols]
+        members = (ok.astype(np.uint16) << np.array(cols, dtype=np.uint16)).sum(axis=1, dtype=np.uint16)
+        return ok.sum(axis=1) >= need, members
+    return rule
+
+
+def lords_associated(houses_a, houses_b):
+    """A lord of houses_a and a different lord of houses_b in conjunction, aspect or sign exchange"""
+    rulers = sorted(set(_RULER))
+
+    def rule(f: Features):
+        lords_a, lords_b = f.lords_mask(houses_a), f.lords_mask(houses_b)
+        members = np.zeros(len(lords_a), dtype=np.uint16)
+        for j in rulers:
+            bit = _ONE << np.uint16(j)
+            partners = f.assoc[:, j] & lords_b & ~bit
+            members |= np.where(((lords_a & bit) != 0) & (partners != 0), partners | bit, 0).astype(np.uint16)
+        return members != 0, members
+    return rule
+
+
+def lords_placed(lord_houses, houses, or_debilitated: bool = False):
+    """A lord of lord_houses placed in the houses (or debilitated)"""
+    houses_mask = _house_mask(houses)
+
+    def rule(f: Features):
+        members = np.zeros(len(f.lord), dtype=np.uint16)
+        rows = np.arange(len(f.lord))
+        for h in lord_houses:
+            j = f.lord[:, h - 1]
+            ok = (f.house_bits[rows, j] & houses_mask) != 0
+            if or_debilitated:
+                ok |= f.debilitated[rows, j]
+            members |= np.where(ok, _ONE << j.astype(np.uint16), 0).astype(np.uint16)
+        return members != 0, members
+    return rule
+
+
+def conjunct(a: str, b: str):
+    """Both bodies in the same sign"""
+    i, j = BODY_INDEX[a], BODY_INDEX[b]
+    pair = _body_mask([a, b])
+
+    def rule(f: Features):
+        hit = f.sign[:, i] == f.sign[:, j]
+        return hit, np.where(hit, pair, 0).astype(np.uint16)
+    return rule
+
+
+def hemmed_by_nodes(bodies=CLASSICAL):
+    """Every one of the bodies on the same side of the Rahu-Ketu axis"""
+    cols = [BODY_INDEX[b] for b in bodies]
+    nodes = _body_mask(['Ra', 'Ke'])
+
+    def rule(f: Features):
+        side = (f.lons[:, cols] - f.lons[:, BODY_INDEX['Ra'], None]) % 360 < 180
+        hit = side.all(axis=1) | ~side.any(axis=1)
+        return hit, np.where(hit, nodes, 0).astype(np.uint16)
+    return rule
+
+
+def debilitation_cancelled():
+    """A debilitated planet whose debilitation sign's lord, or the planet exalted there, is in a kendra
+    from the ascendant or the Moon"""
+    kendra = _house_mask(KENDRA)
+    cancellers = {j: sorted({_RULER[_DEBIL[j]], *np.flatnonzero(_EXALT == _DEBIL[j])})
+                  for j in range(len(BODIES)) if _DEBIL[j] >= 0}
+
+    def rule(f: Features):
+        in_kendra = ((f.house_bits | f.moon_house_bits) & kendra) != 0
+        members = np.zeros(len(f.sign), dtype=np.uint16)
+        for j, cols in cancellers.items():
+            ok = f.debilitated[:, j] & in_kendra[:, cols].any(axis=1)
+            members |= np.where(ok, _ONE << np.uint16(j), 0).astype(np.uint16)
+        return members != 0, members
+    return rule
+
+
+def all_of(*rules):
+    def rule(f: Features):
+        results = [r(f) for r in rules]
+        hit = np.logical_and.reduce([h for h, _ in results])
+        members = np.bitwise_or.reduce([m for _, m in results])
+        return hit, np.where(hit, members, 0).astype(np.uint16)
+    return rule
+
+
+def any_of(*rules):
+    def rule(f: Features):
+        results = [r(f) for r in rules]
+        hit = np.logical_or.reduce([h for h, _ in results])
+        members = np.bitwise_or.reduce([np.where(h, m, 0).astype(np.uint16) for h, m in results])
+        return hit, members
+    return rule
+
+
+# Keyed like dataset.json's 'yogas', which holds the condition and effect text
+_JU_VE_ME = ['Ju', 'Ve', 'Me']
+YOGAS = {
+    'RajYog': lords_associated(KENDRA, TRIKONA),
+    'GajKesariYog': placed('Ju', KENDRA, ref='moon'),
+    'DhanYog': lords_associated([2, 5, 9, 11], [2, 5, 9, 11]),
+    'KalSarpYog': hemmed_by_nodes(),
+    'PanchaMahapurushaYog': placed(['Me', 'Ve', 'Ma', 'Ju', 'Sa'], KENDRA, dignified=True),
+    'ViparitRajYog': lords_associated(DUSTHANA, DUSTHANA),
+    'NeechBhangRajYog': debilitation_cancelled(),
+    'ChandraMangalYog': conjunct('Mo', 'Ma'),
+    'AmalaYog': any_of(placed(BENEFICS, [10]), placed(BENEFICS, [10], ref='moon')),
+    'AdhiYog': any_of(placed(_JU_VE_ME, [6, 7, 8], ref='moon', need='all'),
+                      placed(_JU_VE_ME, [6, 7, 8], need='all')),
+    'SaraswatiYog': all_of(placed(_JU_VE_ME, KENDRA + TRIKONA, need='all'),
+                           placed(_JU_VE_ME, KENDRA + TRIKONA, dignified=True)),
+    'VasumathiYog': placed(_JU_VE_ME, UPACHAYA, ref='moon', need='all'),
+    'DaridraYog': lords_placed([11, 2], DUSTHANA, or_debilitated=True),
+    'ShakatYog': placed('Ju', [6, 8, 12], ref='moon'),
+}
+
+
+def evaluate(lons: np.ndarray, asc: np.ndarray, names=None) -> dict:
+    """{yoga: (hit[N], bodies[N])} for the named yogas (default all) over N charts"""
+    f = Features(lons, asc)
+    return {name: YOGAS[name](f) for name in (names or YOGAS)}
+
+
+def yoga_bits(lons: np.ndarray, asc: np.ndarray) -> np.ndarray:
+    """uint16[N] with bit k set when a chart has the k-th yoga of YOGAS"""
+    bits = np.zeros(len(lons), dtype=np.uint16)
+    for k, (hit, _) in enumerate(evaluate(lons, asc).values()):
+        bits |= hit.astype(np.uint16) << np.uint16(k)
+    return bits
+
+
+def record_yogas(records: np.ndarray) -> list:
+    """Detected yogas per chart_core.CHART_DTYPE record: [{'name', 'planets', 'details'}, ...] in YOGAS order"""
+    if not len(records):
+        return []
+    results = evaluate(records['lon'], (records['asc'] // 30).astype(int) % 12)
+    house, sign = records['house'], records['sign']
+    found = [[] for _ in records]
+    for name, (hit, members) in results.items():
+        for n in np.flatnonzero(hit):
+            planets = _bodies_in(int(members[n]))
+            details = ', '.join(f"{PLANET_FULL_NAMES[b]} in House {house[n, BODY_INDEX[b]]} "
+                                f"({SIGNS[sign[n, BODY_INDEX[b]]]})" for b in planets)
+            found[n].append({'name': name, 'planets': planets, 'details': details})
+    return found
+
+
+def render_with_yogas(results: list) -> list:
+    """chart_objects() results rendered like compute_charts(), with 'yogas' added to each chart and to each
+    divisional chart under 'charts'. Yogas are found from the Chart records of the whole list in one pass.
+    """
+    targets = []  # (result index, division or None, Chart)
+    for i, r in enumerate(results):
+        if 'error' in r:
+            continue
+        targets.append((i, None, r['chart']))
+        targets.extend((i, name, c) for name, c in r.get('charts', {}).items())
+    with stage('yogas'):
+        found = record_yogas(Chart.records([c for _, _, c in targets]))
+    out = render_objects(results)
+    for (i, name, _), yogas in zip(targets, found):
+        if name is None:
+            out[i]['yogas'] = yogas
+        else:
+            out[i]['charts'][name]['yogas'] = yogas
+    return out
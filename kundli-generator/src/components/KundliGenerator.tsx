@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useEffect, useState } from "react";
 import "../App.css";
 import HouseAnalysis from "./HouseAnalysis";
 import YogaAnalysis from "./YogaAnalysis";
@@ -165,7 +165,9 @@ const KundliFace: React.FC = () => {
   const [ascSign, setAscSign] = useState<string>("Aries");
   const [houseDescriptions, setHouseDescriptions] = useState<Record<number, string>>({});
   const [houseStrengths, setHouseStrengths] = useState<Record<number, {strength: string, color: string}>>({});
+  const [yogas, setYogas] = useState<Array<{name: string, planets: string[], details: string}>>([]);
   const [dataset, setDataset] = useState<any>({});
+  const [divisionalCharts, setDivisionalCharts] = useState<Record<string, any>>({});
   const [modal, setModal] = useState<{open: boolean, house: number|null}>({open: false, house: null});
   const [chartType, setChartType] = useState<'regular' | 'd9'>('regular');
   const [showDetailedAnalysis, setShowDetailedAnalysis] = useState(false);
@@ -189,39 +191,43 @@ const KundliFace: React.FC = () => {
     setForm(f => ({ ...f, tz: parseFloat(e.target.value) }));
   };
 
+  // Interpretation dataset is fetched once; the browser revalidates it by ETag
+  useEffect(() => {
+    fetch("http://localhost:5000/api/dataset")
+      .then(res => res.json())
+      .then(setDataset)
+      .catch(() => setDataset({}));
+  }, []);
+
+  const showChartData = (chart: any) => {
+    setSignPlanets(chart.sign_planets);
+    setAscSign(chart.asc_sign);
+    setHouseDescriptions(chart.house_descriptions);
+    setHouseStrengths(chart.house_strengths || {});
+    setYogas(chart.yogas || []);
+  };
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
-    // Call backend
+    // Call backend once for both D1 and D9
     const res = await fetch("http://localhost:5000/api/kundli", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({...form, chart_type: chartType})
+      body: JSON.stringify({...form, chart_type: chartType, charts: ['D1', 'D9'], dataset: 'version'})
     });
     const data = await res.json();
-    setSignPlanets(data.sign_planets);
-    setAscSign(data.asc_sign);
-    setHouseDescriptions(data.house_descriptions);
-    setHouseStrengths(data.house_strengths || {});
-    setDataset(data.dataset || {});
+    setDivisionalCharts(data.charts || {});
+    showChartData(data);
     setShowChart(true);
   };
 
-  const handleChartTypeChange = async () => {
+  const handleChartTypeChange = () => {
     const newType = chartType === 'regular' ? 'd9' : 'regular';
     setChartType(newType);
-    
-    if (showChart) {
-      const res = await fetch("http://localhost:5000/api/kundli", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({...form, chart_type: newType})
-      });
-      const data = await res.json();
-      setSignPlanets(data.sign_planets);
-      setAscSign(data.asc_sign);
-      setHouseDescriptions(data.house_descriptions);
-      setHouseStrengths(data.house_strengths || {});
-      setDataset(data.dataset || {});
+
+    const chart = divisionalCharts[newType === 'regular' ? 'D1' : 'D9'];
+    if (showChart && chart) {
+      showChartData(chart);
     }
   };
 
@@ -230,7 +236,7 @@ const KundliFace: React.FC = () => {
     
     setAiLoading(true);
     try {
-      const res = await fetch("http://localhost:5000/api/ai-analysis", {
+      const res = await fetch("http://localhost:5000/api/ai-analysis/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
@@ -244,8 +250,41 @@ const KundliFace: React.FC = () => {
           }
         })
       });
-      const data = await res.json();
-      setAiResponse(data.response || 'No response from AI');
+      if (!res.ok || !res.body) {
+        // Rate limited or queue full: the JSON body explains how long to wait
+        const data = await res.json();
+        setAiResponse(data.response || data.error || 'No response from AI');
+        return;
+      }
+      // Server-sent events: show the answer as it is generated
+      setAiResponse('');
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let text = '';
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop() || '';
+        for (const event of events) {
+          const lines = event.split('\n');
+          const eventLine = lines.find(line => line.startsWith('event: '));
+          const dataLine = lines.find(line => line.startsWith('data: '));
+          if (!dataLine) continue;
+          const data = JSON.parse(dataLine.slice(6));
+          if (eventLine?.slice(7) === 'error' || data.error) {
+            // The job was lost: say so instead of leaving a partial or empty answer
+            setAiResponse(data.error || 'The AI service could not finish this answer. Please ask again.');
+          } else if (data.text) {
+            text += data.text;
+            setAiResponse(text);
+          } else if (data.response) {
+            setAiResponse(data.response);
+          }
+        }
+      }
     } catch (error) {
       setAiResponse('Error connecting to AI service. Please try again.');
     } finally {
@@ -573,8 +612,7 @@ const KundliFace: React.FC = () => {
             
             {/* Yoga Analysis Section */}
             <YogaAnalysis
-              signPlanets={signPlanets}
-              ascSign={ascSign}
+              yogas={yogas}
               dataset={dataset}
             />
             